@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Stock, Watchlist, WatchlistStock
+from .models import Portfolio, Stock, Strategy, Watchlist, WatchlistStock
 
 # Register your models here.
 
@@ -9,4 +9,6 @@ class WatchlistAdmin(admin.ModelAdmin):
 
 admin.site.register(Stock)
 admin.site.register(Watchlist, WatchlistAdmin)
-admin.site.register(WatchlistStock)
\ No newline at end of file
+admin.site.register(WatchlistStock)
+admin.site.register(Strategy)
+admin.site.register(Portfolio)
@@ -0,0 +1,85 @@
+import io
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from django.core.management.base import BaseCommand
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from analytics.utils.portfolio_visualization import DOWNSAMPLE_METHODS, _chart_payload, downsample_series
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare raw and downsampled multi-year hourly chart series: JSON payload size, "
+        "plotly HTML size, downsampling time and Agg render time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--years", type=int, default=10)
+        parser.add_argument("--tickers", type=int, default=5)
+        parser.add_argument("--points", type=int, default=1200, help="Target width in pixels.")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per step (best is reported).")
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        rows = options["years"] * 252 * 7  # ~7 hourly bars per trading day
+        index = pd.date_range("2000-01-03 14:30", periods=rows, freq="h")
+        columns = {
+            f"T{i}": 100 * np.cumprod(1 + rng.normal(0, 0.003, rows)) for i in range(options["tickers"])
+        }
+        self.stdout.write(f"{options['tickers']} series × {rows:,} hourly points, target width {options['points']}px\n")
+
+        self.stdout.write(
+            f"{'method':<8}{'points/series':>15}{'json KB':>10}{'html KB':>10}"
+            f"{'reduce ms':>11}{'render ms':>11}{'max |err|':>11}"
+        )
+        for method in (None, *DOWNSAMPLE_METHODS):
+            points = options["points"] if method else None
+            payload, reduce_ms = self.best(
+                options["repeat"], lambda: _chart_payload("bench", "Price", index, columns, points, method or "lttb")
+            )
+            body = json.dumps(payload, separators=(",", ":")).encode()
+            traces = [
+                (np.asarray(s.get("x", payload.get("x"))), np.asarray(s["y"], dtype="float64"))
+                for s in payload["series"]
+            ]
+            html = self.plotly_html(traces)
+            _, render_ms = self.best(options["repeat"], lambda: self.render_png(traces))
+            self.stdout.write(
+                f"{method or 'raw':<8}{len(traces[0][0]):>15,}{len(body) / 1024:>10.0f}{len(html) / 1024:>10.0f}"
+                f"{reduce_ms:>11.1f}{render_ms:>11.1f}{self.extreme_error(columns, traces):>11.4f}"
+            )
+
+    # ---------- Helpers ----------
+    def best(self, repeat, func):
+        timings, result = [], None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return result, min(timings)
+
+    def plotly_html(self, traces):
+        fig = go.Figure([go.Scatter(x=x, y=y, mode="lines") for x, y in traces])
+        return pio.to_html(fig, full_html=False, include_plotlyjs=False)
+
+    def render_png(self, traces):
+        fig = Figure(figsize=(12, 5), dpi=100)
+        ax = fig.add_subplot()
+        for x, y in traces:
+            ax.plot(x, y, linewidth=0.8)
+        buffer = io.BytesIO()
+        FigureCanvasAgg(fig).print_png(buffer)
+        return buffer.getvalue()
+
+    def extreme_error(self, columns, traces):
+        """Largest gap between a series' true min/max and what the chart shows."""
+        worst = 0.0
+        for y, (_, shown) in zip(columns.values(), traces):
+            worst = max(worst, abs(y.max() - shown.max()), abs(y.min() - shown.min()))
+        return worst
@@ -0,0 +1,120 @@
+import itertools
+import random
+import statistics
+import string
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+
+from analytics.utils import market_data, price_matrix, quotes_api
+from analytics.utils.exchange_rates_api import FX
+from analytics.utils.history_store import HISTORY
+from analytics.utils.market_data import SUFFIXES, SyntheticProvider
+from analytics.utils.quote_cache import LRUCache
+from analytics.utils.symbol_index import SymbolIndex
+from analytics.utils.upstream import UPSTREAM, TokenBucket
+
+
+class Command(BaseCommand):
+    help = (
+        "Offline throughput benchmark: concurrent watchlist quote lookups (cold, then warm cache) "
+        "and price-matrix builds, served by the synthetic provider with simulated latency. "
+        "Uses temporary caches; nothing touches the network or data/cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tickers", type=int, default=500, help="Size of the ticker universe.")
+        parser.add_argument("--watchlist", type=int, default=25, help="Tickers per lookup request.")
+        parser.add_argument("--users", default="1,10,50", help="Comma-separated concurrent user counts.")
+        parser.add_argument("--requests", type=int, default=10, help="Requests per user and phase.")
+        parser.add_argument("--latency", type=float, default=0.05, help="Provider latency per call, seconds.")
+        parser.add_argument("--jitter", type=float, default=0.02, help="Extra random latency, up to seconds.")
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument("--rate", type=float, default=1000, help="Upstream token-bucket rate (calls/s).")
+        parser.add_argument("--history-tickers", type=int, default=20)
+        parser.add_argument("--years", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        provider = SyntheticProvider(
+            seed=options["seed"], latency=options["latency"],
+            jitter=options["jitter"], error_rate=options["error_rate"],
+        )
+        universe = self.universe(options["tickers"], options["seed"])
+        with tempfile.TemporaryDirectory() as tmp, ExitStack() as stack:
+            root = Path(tmp)
+            previous = market_data.set_provider(provider)
+            stack.callback(market_data.set_provider, previous)
+            stack.enter_context(mock.patch.object(quotes_api, "SYMBOLS", SymbolIndex(root / "symbols.sqlite3")))
+            stack.enter_context(mock.patch.object(HISTORY, "root", root / "history"))
+            stack.enter_context(mock.patch.object(FX, "_rates", {}))
+            stack.enter_context(mock.patch.object(UPSTREAM, "bucket", TokenBucket(options["rate"], int(options["rate"]))))
+
+            self.stdout.write(
+                f"synthetic provider: {options['latency'] * 1000:.0f}+{options['jitter'] * 1000:.0f} ms per call, "
+                f"error rate {options['error_rate']:.0%}; {len(universe)} tickers, {options['watchlist']} per request\n"
+            )
+            self.bench_quotes(provider, universe, options)
+            self.bench_history(provider, universe[: options["history_tickers"]], options["years"])
+            self.stdout.write(f"\nupstream: {UPSTREAM.metrics()}")
+
+    def universe(self, size, seed):
+        """Letter-only synthetic tickers; one in five is listed abroad (FX conversion)."""
+        names = ["".join(p) for p in itertools.product(string.ascii_uppercase, repeat=3)]
+        random.Random(seed).shuffle(names)
+        abroad = [s for s in SUFFIXES if s]
+        return [name + (abroad[i % len(abroad)] if i % 5 == 4 else "") for i, name in enumerate(names[:size])]
+
+    # ---------- Quotes ----------
+    def bench_quotes(self, provider, universe, options):
+        self.stdout.write(
+            f"{'users':>6}{'phase':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'info calls':>12}{'coalesced':>11}"
+        )
+        for users in [int(u) for u in options["users"].split(",")]:
+            # Each user count starts from an empty quote cache
+            with mock.patch.object(quotes_api, "CACHE", LRUCache(max_entries=len(universe) * 2)):
+                for phase in ("cold", "warm"):
+                    calls, shared = provider.calls["info"], quotes_api.INFLIGHT.stats()["shared"]
+                    start = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=users) as pool:
+                        timings = sum(pool.map(
+                            lambda user: self.user_session(user, universe, options), range(users)
+                        ), [])
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f"{users:>6}{phase:>7}{len(timings) / elapsed:>9.1f}"
+                        f"{statistics.median(timings):>9.1f}{statistics.quantiles(timings, n=20)[-1]:>9.1f}"
+                        f"{provider.calls['info'] - calls:>12}{quotes_api.INFLIGHT.stats()['shared'] - shared:>11}"
+                    )
+
+    def user_session(self, user, universe, options):
+        rng = random.Random(f"{options['seed']}:{user}")
+        timings = []
+        for _ in range(options["requests"]):
+            watchlist = rng.sample(universe, options["watchlist"])
+            start = time.perf_counter()
+            quotes_api.lookup_many(watchlist)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    # ---------- History ----------
+    def bench_history(self, provider, tickers, years):
+        end = time.strftime("%Y-%m-%d")
+        start = f"{int(end[:4]) - years}{end[4:]}"
+        self.stdout.write(f"\nprice matrix: {len(tickers)} tickers × {years} years, daily")
+        self.stdout.write(f"{'store':>14}{'ms':>9}{'history calls':>15}")
+        with mock.patch.object(price_matrix, "MATRICES", LRUCache(max_entries=4, ttl=3600)) as matrices:
+            for label in ("empty", "filled", "matrix cached"):
+                if label == "filled":
+                    matrices.clear()
+                calls = provider.calls["history"]
+                begin = time.perf_counter()
+                price_matrix.build_price_matrix(tickers, start, end, "1d")
+                self.stdout.write(
+                    f"{label:>14}{(time.perf_counter() - begin) * 1000:>9.1f}{provider.calls['history'] - calls:>15}"
+                )
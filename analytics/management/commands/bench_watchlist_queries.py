@@ -0,0 +1,136 @@
+import random
+import statistics
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from analytics.models import Stock, Watchlist, WatchlistStock
+from analytics.utils.config import CACHE_DIR
+
+ALIAS = "bench"
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a separate SQLite database with users, watchlists and watchlist rows, then time "
+        "the watchlist hot-path queries without (migration 0001) and with (latest) the indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--rows", type=int, default=1_000_000, help="WatchlistStock rows to seed.")
+        parser.add_argument("--stocks", type=int, default=5_000)
+        parser.add_argument("--per-user", type=int, default=10, help="Watchlists per user.")
+        parser.add_argument("--repeat", type=int, default=500, help="Timed runs per query.")
+        parser.add_argument("--path", default=str(CACHE_DIR / "bench.sqlite3"))
+        parser.add_argument("--reseed", action="store_true", help="Drop and reseed the benchmark database.")
+
+    def handle(self, *args, **options):
+        self.setup_database(options["path"], options["reseed"])
+        if not User.objects.using(ALIAS).exists():
+            self.seed(options)
+
+        before = self.run_queries(options["repeat"], migration="0001")
+        after = self.run_queries(options["repeat"], migration=None)
+
+        self.stdout.write(f"\n{'query':<24}{'before p50':>12}{'after p50':>12}{'before p95':>12}{'after p95':>12}  (ms, SQL only)")
+        for name in before:
+            b, a = before[name], after[name]
+            self.stdout.write(f"{name:<24}{b[0]:>12.3f}{a[0]:>12.3f}{b[1]:>12.3f}{a[1]:>12.3f}")
+
+    # ---------- Database ----------
+    def setup_database(self, path, reseed):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if reseed:
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{path}{suffix}").unlink(missing_ok=True)
+        connections.settings[ALIAS] = {**connections.settings["default"], "NAME": path}
+        call_command("migrate", database=ALIAS, verbosity=0)
+
+    def seed(self, options):
+        rng = random.Random(0)
+        users, per_user = options["users"], options["per_user"]
+        self.stdout.write(f"Seeding {users} users, {users * per_user} watchlists, {options['rows']} rows...")
+
+        User.objects.using(ALIAS).bulk_create(
+            [User(username=f"user{i}", password="!") for i in range(users)], batch_size=5000
+        )
+        user_ids = list(User.objects.using(ALIAS).values_list("id", flat=True))
+        Stock.objects.using(ALIAS).bulk_create(
+            [Stock(ticker=f"T{i:05d}") for i in range(options["stocks"])], batch_size=5000
+        )
+        stock_ids = list(Stock.objects.using(ALIAS).values_list("id", flat=True))
+        Watchlist.objects.using(ALIAS).bulk_create(
+            [Watchlist(name=f"list{j}", user_id=u) for u in user_ids for j in range(per_user)],
+            batch_size=5000,
+        )
+        watchlists = list(Watchlist.objects.using(ALIAS).values_list("id", "user_id"))
+
+        # Spread rows evenly over watchlists, each with distinct stocks
+        per_list = max(1, options["rows"] // len(watchlists))
+        batch = []
+        for wid, uid in watchlists:
+            for sid in rng.sample(stock_ids, min(per_list, len(stock_ids))):
+                batch.append(WatchlistStock(watchlist_id=wid, stock_id=sid, user_id=uid))
+            if len(batch) >= 20_000:
+                WatchlistStock.objects.using(ALIAS).bulk_create(batch)
+                batch = []
+        WatchlistStock.objects.using(ALIAS).bulk_create(batch)
+        connections[ALIAS].cursor().execute("ANALYZE")
+
+    # ---------- Timing ----------
+    def run_queries(self, repeat, migration):
+        if migration:
+            call_command("migrate", "analytics", migration, database=ALIAS, verbosity=0)
+        else:
+            call_command("migrate", "analytics", database=ALIAS, verbosity=0)
+        connections[ALIAS].cursor().execute("ANALYZE")
+
+        rng = random.Random(1)
+        watchlists = list(Watchlist.objects.using(ALIAS).values_list("id", "user_id", "name")[:5000])
+        samples = [rng.choice(watchlists) for _ in range(repeat)]
+        stock_of = dict(
+            WatchlistStock.objects.using(ALIAS)
+            .filter(watchlist_id__in=[w for w, _, _ in samples]).values_list("watchlist_id", "stock_id")
+        )
+
+        # Querysets mirror views/watchlist.py; only SQL execution is timed, not the ORM
+        lists = Watchlist.objects.using(ALIAS)
+        links = WatchlistStock.objects.using(ALIAS)
+        queries = {
+            "watchlist list": lambda w, u, n: [
+                lists.filter(user=u).order_by("-last_modified").values_list("id", "name", "last_modified")
+            ],
+            "watchlist select": lambda w, u, n: [
+                links.filter(watchlist_id=w, watchlist__user_id=u)
+                .order_by("id").values_list("stock_id", "stock__ticker")
+            ],
+            "watchlist data": lambda w, u, n: [
+                lists.filter(id=w, user_id=u).values_list("last_modified", flat=True)[:1],
+                links.filter(watchlist_id=w).order_by("id").values_list("stock_id", "stock__ticker"),
+            ],
+            "stock data": lambda w, u, n: [
+                Stock.objects.using(ALIAS).filter(id=stock_of.get(w), user=u)[:1]
+            ],
+            "name exists": lambda w, u, n: [lists.filter(name=n, user_id=u).values("id")[:1]],
+        }
+
+        cursor = connections[ALIAS].cursor()
+        results = {}
+        for name, query in queries.items():
+            compiled = [[qs.query.sql_with_params() for qs in query(*s)] for s in samples]
+            timings = []
+            for statements in compiled + compiled:  # first pass warms the page cache
+                start = time.perf_counter()
+                for sql, params in statements:
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings = sorted(timings[len(compiled):])
+            results[name] = (statistics.median(timings), timings[int(len(timings) * 0.95) - 1])
+        return results
@@ -0,0 +1,76 @@
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from pytz import utc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.models import WatchlistStock
+from analytics.utils.exchange_calendar import CALENDARS
+from analytics.utils.exchange_rates_api import EXCHANGES
+from analytics.utils.quote_cache import SnapshotCache, SQLiteCache
+from analytics.utils.quotes_api import CACHE, QUOTE_FRESHNESS, check_market_status, check_stocks, lookup_many, symbol_metadata
+from analytics.utils.upstream import UPSTREAM
+
+
+class Command(BaseCommand):
+    help = (
+        "Keep quotes for every watchlisted ticker warm while its exchange is open, "
+        "refresh once more at close, then idle until a market opens again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=QUOTE_FRESHNESS.total_seconds() / 2,
+            help="Seconds between refreshes while any market is open.",
+        )
+        parser.add_argument(
+            "--idle-interval", type=float, default=300,
+            help="Longest sleep while every market is closed (wakes earlier for the next open).",
+        )
+        parser.add_argument("--once", action="store_true", help="Run a single cycle and exit.")
+
+    def handle(self, *args, **options):
+        # Quotes written to a per-process cache would never reach the web workers
+        if not isinstance(CACHE, (SnapshotCache, SQLiteCache)):
+            raise CommandError('refresh_quotes needs a shared QUOTE_CACHE backend: "snapshot" or "sqlite".')
+        was_open = {}
+        while True:
+            any_open = self.cycle(was_open)
+            if options["once"]:
+                return
+            time.sleep(options["interval"] if any_open else self.idle_seconds(options["idle_interval"]))
+
+    def idle_seconds(self, cap):
+        """Sleep until the earliest next open of any exchange, at most `cap` seconds."""
+        now = datetime.now(utc)
+        next_open = min(calendar.next_open(now) for calendar in CALENDARS.values())
+        return max(1.0, min(cap, (next_open - now).total_seconds()))
+
+    def cycle(self, was_open):
+        """Refresh open exchanges (and those that just closed); return whether any is open."""
+        by_exchange = defaultdict(list)
+        tickers = list(WatchlistStock.objects.values_list("stock__ticker", flat=True).distinct())
+        # Answered from the symbol index; only tickers never seen go upstream, and
+        # unknown ones are negatively cached instead of being fetched every cycle
+        valid = check_stocks(tickers)
+        for ticker in tickers:
+            if not valid[ticker]:
+                continue
+            code = symbol_metadata(ticker).get("exchange")
+            if code in EXCHANGES:
+                by_exchange[code].append(ticker)
+
+        due = []
+        for code, exchange_tickers in by_exchange.items():
+            is_open = check_market_status(code)["market_open"]
+            # Open markets stay warm; a market that just closed gets its closing quotes
+            if is_open or was_open.get(code):
+                due.extend(exchange_tickers)
+            was_open[code] = is_open
+
+        if due:
+            lookup_many(due, refresh=True)
+            self.stdout.write(f"Refreshed {len(due)} tickers (upstream: {UPSTREAM.metrics()})")
+        return any(was_open.values())
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='watchlist',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='watchliststock',
+            name='watchlist',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='analytics.watchlist'),
+        ),
+        migrations.AddIndex(
+            model_name='watchlist',
+            index=models.Index(fields=['user', '-last_modified'], name='watchlist_user_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watchliststock',
+            index=models.Index(fields=['stock', 'user'], name='watchliststock_stock_user_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_watchlist_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Strategy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='strategies', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Portfolio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticker', models.CharField(max_length=10)),
+                ('shares', models.FloatField()),
+                ('strategy', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='holdings', to='analytics.strategy')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='strategy',
+            constraint=models.UniqueConstraint(fields=('name', 'user'), name='unique_strategy_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='portfolio',
+            constraint=models.UniqueConstraint(fields=('strategy', 'ticker'), name='unique_portfolio_ticker'),
+        ),
+    ]
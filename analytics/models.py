@@ -18,7 +18,7 @@ class Stock(models.Model):
 
 class Watchlist(models.Model):
     name = models.CharField(max_length=100)
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False) # covered by the indexes below
     stocks = models.ManyToManyField(Stock, through='WatchlistStock')
     last_modified = models.DateTimeField(auto_now=True) # format: YYYY-MM-DD HH:MM:SS, default timezone is UTC
 
@@ -29,10 +29,14 @@ class Watchlist(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['name', 'user'], name='unique_watchlist_per_user')
         ]
+        indexes = [
+            # A user's watchlists, most recently modified first
+            models.Index(fields=['user', '-last_modified'], name='watchlist_user_modified_idx'),
+        ]
 
 
 class WatchlistStock(models.Model):
-    watchlist = models.ForeignKey(Watchlist, on_delete=models.CASCADE)
+    watchlist = models.ForeignKey(Watchlist, on_delete=models.CASCADE, db_index=False) # covered by unique_watchlist_stock
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='watchlist_stocks')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='watchlist_stock_user')
 
@@ -43,5 +47,34 @@ class WatchlistStock(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['watchlist', 'stock'], name='unique_watchlist_stock')
         ]
+        indexes = [
+            # Stock ownership checks (Stock.user goes through this table)
+            models.Index(fields=['stock', 'user'], name='watchliststock_stock_user_idx'),
+        ]
+
+
+class Strategy(models.Model):
+    name = models.CharField(max_length=100)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='strategies')
 
-# class Portfolio(models.Model):
\ No newline at end of file
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'user'], name='unique_strategy_per_user')
+        ]
+
+
+class Portfolio(models.Model):
+    strategy = models.ForeignKey(Strategy, on_delete=models.CASCADE, db_index=False, related_name='holdings') # covered by unique_portfolio_ticker
+    ticker = models.CharField(max_length=10)
+    shares = models.FloatField()
+
+    def __str__(self):
+        return f"{self.strategy.name} - {self.ticker}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['strategy', 'ticker'], name='unique_portfolio_ticker')
+        ]
\ No newline at end of file
@@ -1,7 +1,7 @@
 import { formatUSD, formatPercent, formatIntegerComma } from "./formatting.js";
 import { handleOverlay, setCoordinates } from "../../../../static/js/helpers.js";
 import {
-    fetchWatchlists, fetchWatchlistData, fetchCreateWatchlist, fetchDeleteWatchlist, fetchRenameWatchlist,
+    fetchWatchlists, fetchWatchlistData, openWatchlistStream, fetchCreateWatchlist, fetchDeleteWatchlist, fetchRenameWatchlist,
     fetchAddStockToWatchlist, fetchRemoveStockFromWatchlist
 } from "./watchlist_api.js";
 
@@ -105,9 +105,10 @@ const AppState = {
 };
 
 
-async function populateWatchlistTable(watchlistId) {
-    const response = await fetchWatchlistData(watchlistId);
-    const data = await response.json();
+let activeStream = null;
+
+// Draw one row per [stockId, quote]; quotes without a price show as placeholders
+function drawWatchlistTable(rows, length, lastModified) {
     const stockTableBody = document.querySelector("#stock-table-body");
     const metaData = document.querySelector("#meta-data");
 
@@ -115,20 +116,63 @@ async function populateWatchlistTable(watchlistId) {
     stockTableBody.innerHTML = "";
     metaData.innerHTML = "";
 
-    if (data.quotes.length === 0) {
+    if (length === 0) {
         const emptyRow = document.createElement("tr");
         emptyRow.innerHTML = `<td colspan="8" style="font-style: italic;">No stocks currently inside this watchlist.</td>`;
         stockTableBody.appendChild(emptyRow);
     } else {
-        data.quotes.forEach((quote) => {
+        rows.forEach((row) => {
             const stockRow = document.createElement("tr");
-            stockRow.innerHTML = addStockRow(quote);
+            stockRow.innerHTML = addStockRow(row);
             stockTableBody.appendChild(stockRow);
-            stockRow.id = quote[0];
+            stockRow.id = row[0];
         });
     }
     metaData.innerHTML = `
-    COUNT : &nbsp; ${data.meta_data.length} <br> LAST MODIFIED : &nbsp; ${data.meta_data.last_modified}`;
+    COUNT : &nbsp; ${length} <br> LAST MODIFIED : &nbsp; ${lastModified}`;
+}
+
+// One-shot JSON load, used when the event stream cannot be opened
+async function loadWatchlistTable(watchlistId) {
+    const response = await fetchWatchlistData(watchlistId);
+    const data = await response.json();
+    drawWatchlistTable(data.quotes, data.meta_data.length, data.meta_data.last_modified);
+}
+
+// Resolves once the table skeleton is drawn; quotes then fill in (and update) row by row
+function populateWatchlistTable(watchlistId) {
+    if (activeStream) activeStream.close();
+    activeStream = null;
+    if (typeof EventSource === "undefined") return loadWatchlistTable(watchlistId);
+
+    const stream = openWatchlistStream(watchlistId);
+    activeStream = stream;
+    const stockTableBody = document.querySelector("#stock-table-body");
+    let drawn = false;
+
+    return new Promise((resolve) => {
+        stream.addEventListener("meta", (event) => {
+            const data = JSON.parse(event.data);
+            drawWatchlistTable(data.stocks.map(([stockId, ticker]) => [stockId, { ticker }]), data.length, data.last_modified);
+            if (data.length === 0) stream.close();
+            drawn = true;
+            resolve();
+        });
+
+        stream.addEventListener("quote", (event) => {
+            const quote = JSON.parse(event.data);
+            const stockRow = stockTableBody.querySelector(`tr[id="${quote[0]}"]`);
+            if (stockRow) stockRow.innerHTML = addStockRow(quote);
+        });
+
+        stream.onerror = () => {
+            // Once drawn, EventSource reconnects on its own; before that, fall back to JSON
+            if (drawn) return;
+            stream.close();
+            if (activeStream === stream) activeStream = null;
+            loadWatchlistTable(watchlistId).finally(resolve);
+        };
+    });
 }
 
 // =============================================================
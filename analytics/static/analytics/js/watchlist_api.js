@@ -13,6 +13,11 @@ export async function fetchWatchlistData(watchlistId) {
     return await fetch(`/api/dashboard/watchlist/data/${watchlistId}/`);
 }
 
+// Server-Sent Events: "meta" once, then "quote" events as quotes resolve or change
+export function openWatchlistStream(watchlistId) {
+    return new EventSource(`/api/dashboard/watchlist/stream/${watchlistId}/`);
+}
+
 export async function fetchCreateWatchlist(watchlistName) {
     return await fetch(`/api/dashboard/watchlist/create/`, {
         method: "POST",
@@ -60,6 +65,19 @@ export async function fetchAddStockToWatchlist(ticker, id) {
     });
 }
 
+// `text` is a pasted list or CSV of tickers; the response lists added, already_present, invalid
+// and unavailable (not checked because the market data provider could not be reached)
+export async function fetchAddStocksToWatchlist(text, id) {
+    return await fetch(`/api/dashboard/watchlist/add/stocks/`, {
+        method: "POST",
+        headers: {
+            "Content-Type": "application/json",
+            "X-CSRFToken": getCookie("csrftoken"),
+        },
+        body: JSON.stringify({ text, watchlist_id: id }),
+    });
+}
+
 export async function fetchRemoveStockFromWatchlist(stockId, watchlistId) {
     return await fetch(
         `/api/dashboard/watchlist/remove/stock/${stockId}/${watchlistId}/`,
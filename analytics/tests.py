@@ -1,3 +1,1331 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from multiprocessing import shared_memory
+from concurrent.futures import Future
+from datetime import datetime, time
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .management.commands import refresh_quotes
+from .models import Portfolio, Stock, Strategy, Watchlist, WatchlistStock
+from .utils import chart_renderer, history_store, market_data, portfolio_visualization, quote_cache, quotes_api
+from .utils.chart_renderer import ImageCache, spec_key
+from .utils.exchange_calendar import ExchangeCalendar, build_calendars
+from .utils.exchange_rates_api import EXCHANGES, FXRateService, align_rates, get_historical_exchange_rate
+from .utils.portfolio_visualization import (
+    _portfolio_frame, downsample_series, lttb_indices, minmax_indices, portfolio_chart_data,
+)
+from .utils.price_matrix import PriceMatrix
+from .utils.quote_cache import LRUCache, SnapshotCache, SQLiteCache
+from .utils.symbol_index import SymbolIndex
+from .utils import rebalancing_sweep
+from .utils.rebalancing_logic import backtest, rebalance
+from .utils.portfolio_metrics import (
+    compute_metrics, compute_metrics_batch, compute_metrics_frame, load_positions, load_transactions,
+)
+from .utils import risk_metrics
+from .utils.risk_metrics import rolling_drawdown, rolling_return
+from .utils.upstream import CircuitBreaker, CircuitOpenError, RateLimitedError, UpstreamClient, UpstreamError
+
+
+async def fake_quotes(tickers, refresh=False):
+    return [{"ticker": t, "price": 1.0} for t in tickers]
+
+
+async def fake_quote(ticker):
+    return {"ticker": ticker, "price": 1.0}
+
+
+def fake_check_stocks(tickers):
+    return {t: None if t.startswith("DOWN") else not t.startswith("BAD") for t in tickers}
+
+
+def read_stream(response):
+    if response.is_async:
+        return async_to_sync(_read_async_stream)(response)
+    return b"".join(response.streaming_content)
+
+
+async def _read_async_stream(response):
+    return b"".join([chunk async for chunk in response.streaming_content])
+
+
+# ============================================================
+# QUERY-COUNT REGRESSION TESTS
+# ============================================================
+@mock.patch("analytics.views.watchlist.check_stock", lambda ticker: True)
+@mock.patch("analytics.views.watchlist.check_stocks", fake_check_stocks)
+@mock.patch("analytics.views.watchlist.async_lookup", fake_quote)
+@mock.patch("analytics.views.watchlist.async_lookup_many", fake_quotes)
+class WatchlistQueryCountTests(TestCase):
+    """Each watchlist endpoint must run a fixed number of queries, whatever the watchlist size."""
+
+    SIZES = (1, 40)
+
+    # Includes the session and user lookups made by the auth middleware
+    BUDGETS = {
+        "watchlist": 3,
+        "watchlist_select": 3,
+        "watchlist_data": 4,
+        "watchlist_stream": 4,
+        "stock_data": 3,
+        "watchlist_rename": 5,
+        "watchlist_create": 4,
+        "watchlist_delete": 5,
+        "watchlist_add": 10,
+        "watchlist_add_bulk": 10,
+        "watchlist_remove": 6,
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user("alice", password="secret")
+        self.client.force_login(self.user)
+
+    def make_watchlist(self, size, name=None):
+        watchlist = Watchlist.objects.create(name=name or f"list-{size}", user=self.user)
+        stocks = Stock.objects.bulk_create(
+            [Stock(ticker=f"S{size}X{i}") for i in range(size)]
+        )
+        WatchlistStock.objects.bulk_create(
+            [WatchlistStock(watchlist=watchlist, stock=s, user=self.user) for s in stocks]
+        )
+        return watchlist, stocks
+
+    def count_queries(self, method, url, body=None):
+        kwargs = {"content_type": "application/json"}
+        if body is not None:
+            kwargs["data"] = json.dumps(body)
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLess(response.status_code, 300, response.content)
+        return len(ctx.captured_queries)
+
+    def assert_flat(self, name, counts):
+        """Same query count for every size, and within the endpoint's budget."""
+        self.assertEqual(len(set(counts)), 1, f"{name} query count grows with size: {counts}")
+        self.assertLessEqual(counts[0], self.BUDGETS[name], f"{name} ran {counts[0]} queries")
+
+    # ---------- Read endpoints ----------
+    def test_watchlist_list(self):
+        counts = []
+        for size in self.SIZES:
+            for i in range(size):
+                Watchlist.objects.create(name=f"w{size}-{i}", user=self.user)
+            counts.append(self.count_queries("get", reverse("analytics:watchlist")))
+        self.assert_flat("watchlist", counts)
+
+    def test_watchlist_select(self):
+        counts = []
+        for size in self.SIZES:
+            watchlist, _ = self.make_watchlist(size)
+            url = reverse("analytics:watchlist_select", args=[watchlist.id])
+            counts.append(self.count_queries("get", url))
+        self.assert_flat("watchlist_select", counts)
+
+    def test_watchlist_data(self):
+        counts = []
+        for size in self.SIZES:
+            watchlist, _ = self.make_watchlist(size)
+            url = reverse("analytics:watchlist_data", args=[watchlist.id])
+            counts.append(self.count_queries("get", url))
+        self.assert_flat("watchlist_data", counts)
+
+    @mock.patch("analytics.views.watchlist.STREAM_LIFETIME", 0)
+    def test_watchlist_stream(self):
+        counts = []
+        for size in self.SIZES:
+            watchlist, _ = self.make_watchlist(size)
+            url = reverse("analytics:watchlist_stream", args=[watchlist.id])
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+                read_stream(response)
+            counts.append(len(ctx.captured_queries))
+        self.assert_flat("watchlist_stream", counts)
+
+    def test_stock_data(self):
+        counts = []
+        for size in self.SIZES:
+            _, stocks = self.make_watchlist(size)
+            url = reverse("analytics:stock_data", args=[stocks[-1].id])
+            counts.append(self.count_queries("get", url))
+        self.assert_flat("stock_data", counts)
+
+    # ---------- Write endpoints ----------
+    def test_watchlist_rename(self):
+        counts = []
+        for size in self.SIZES:
+            watchlist, _ = self.make_watchlist(size)
+            url = reverse("analytics:watchlist_rename", args=[watchlist.id])
+            counts.append(self.count_queries("put", url, {"name": f"renamed-{size}"}))
+        self.assert_flat("watchlist_rename", counts)
+
+    def test_watchlist_create(self):
+        counts = []
+        for size in self.SIZES:
+            self.make_watchlist(size)
+            url = reverse("analytics:watchlist_create")
+            counts.append(self.count_queries("post", url, {"name": f"new-{size}"}))
+        self.assert_flat("watchlist_create", counts)
+
+    def test_watchlist_delete(self):
+        counts = []
+        for size in self.SIZES:
+            watchlist, _ = self.make_watchlist(size)
+            url = reverse("analytics:watchlist_delete", args=[watchlist.id])
+            counts.append(self.count_queries("delete", url))
+        self.assert_flat("watchlist_delete", counts)
+
+    def test_watchlist_add_stock(self):
+        counts = []
+        for size in self.SIZES:
+            watchlist, _ = self.make_watchlist(size)
+            url = reverse("analytics:watchlist_add")
+            body = {"ticker": f"NEW{size}", "watchlist_id": watchlist.id}
+            counts.append(self.count_queries("post", url, body))
+        self.assert_flat("watchlist_add", counts)
+
+    def test_watchlist_add_stocks(self):
+        counts = []
+        for size in self.SIZES:
+            watchlist, stocks = self.make_watchlist(size)
+            tickers = [s.ticker for s in stocks[:5]] + [f"BULK{size}X{i}" for i in range(size)]
+            url = reverse("analytics:watchlist_add_bulk")
+            body = {"text": ",".join(tickers), "watchlist_id": watchlist.id}
+            counts.append(self.count_queries("post", url, body))
+        self.assert_flat("watchlist_add_bulk", counts)
+
+    def test_watchlist_remove_stock(self):
+        counts = []
+        for size in self.SIZES:
+            watchlist, stocks = self.make_watchlist(size)
+            url = reverse("analytics:watchlist_remove", args=[stocks[0].id, watchlist.id])
+            counts.append(self.count_queries("delete", url))
+        self.assert_flat("watchlist_remove", counts)
+
+    # ---------- Behaviour ----------
+    def test_select_and_data_payloads(self):
+        watchlist, stocks = self.make_watchlist(3)
+        response = self.client.get(reverse("analytics:watchlist_select", args=[watchlist.id]))
+        self.assertEqual(response.json(), [{"id": s.id, "ticker": s.ticker} for s in stocks])
+
+        response = self.client.get(reverse("analytics:watchlist_data", args=[watchlist.id]))
+        payload = response.json()
+        self.assertEqual(payload["meta_data"]["length"], 3)
+        self.assertEqual([q[0] for q in payload["quotes"]], [s.id for s in stocks])
+
+    @mock.patch("analytics.views.watchlist.STREAM_LIFETIME", 0)
+    def test_stream_sends_meta_then_each_quote(self):
+        watchlist, stocks = self.make_watchlist(3)
+        response = self.client.get(reverse("analytics:watchlist_stream", args=[watchlist.id]))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = read_stream(response).decode().strip().split("\n\n")
+
+        self.assertTrue(events[0].startswith("event: meta"))
+        quotes = [json.loads(e.split("data: ", 1)[1]) for e in events[1:]]
+        self.assertEqual(sorted(q[0] for q in quotes), sorted(s.id for s in stocks))
+
+    @mock.patch("analytics.views.watchlist.STREAM_LIFETIME", 600)
+    def test_stream_is_not_buffered_under_wsgi(self):
+        watchlist, _ = self.make_watchlist(2)
+        response = self.client.get(reverse("analytics:watchlist_stream", args=[watchlist.id]))
+        self.assertFalse(response.is_async)
+        chunks = iter(response.streaming_content)
+        # meta and both quotes arrive long before the stream's lifetime is up
+        events = [next(chunks).decode() for _ in range(3)]
+        response.close()
+        self.assertEqual([e.split("\n", 1)[0] for e in events], ["event: meta", "event: quote", "event: quote"])
+
+    def test_bulk_add_reports_added_present_and_invalid(self):
+        watchlist, stocks = self.make_watchlist(2)
+        text = f"Ticker\n{stocks[0].ticker}\nmsft; aapl\nBADX, ???, DOWNX\nAAPL"
+        response = self.client.post(
+            reverse("analytics:watchlist_add_bulk"),
+            data=json.dumps({"text": text, "watchlist_id": watchlist.id}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.json(), {
+            "added": ["MSFT", "AAPL"],
+            "already_present": [stocks[0].ticker],
+            "invalid": ["BADX", "???"],
+            "unavailable": ["DOWNX"],
+        })
+        self.assertEqual(watchlist.stocks.count(), 4)
+
+    def test_bulk_add_rejects_malformed_tickers(self):
+        watchlist, _ = self.make_watchlist(1)
+        for body in ({"tickers": "AAPL"}, {"tickers": {"AAPL": 1}}, {"tickers": 7}, {"tickers": ["AAPL", 7]}, {"text": ["AAPL"]}):
+            response = self.client.post(
+                reverse("analytics:watchlist_add_bulk"),
+                data=json.dumps({**body, "watchlist_id": watchlist.id}),
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(watchlist.stocks.count(), 1)
+
+    def test_data_for_foreign_watchlist_is_not_found(self):
+        other = User.objects.create_user("bob", password="secret")
+        watchlist = Watchlist.objects.create(name="private", user=other)
+        response = self.client.get(reverse("analytics:watchlist_data", args=[watchlist.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+# ============================================================
+# UPSTREAM CLIENT
+# ============================================================
+class FakeClock:
+    """Monotonic clock whose sleep just moves time forward."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeProvider:
+    """Fails the first `failures` calls with `error`, then answers."""
+
+    def __init__(self, failures=0, error=ConnectionError("provider down")):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self, ticker):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return {"ticker": ticker}
+
+
+class UpstreamClientTests(SimpleTestCase):
+    def make_client(self, **kwargs):
+        self.clock = FakeClock()
+        options = {"rate": 1000, "burst": 1000, "retries": 2, "backoff": 1.0, "failure_threshold": 2, "reset_timeout": 30}
+        return UpstreamClient("fake", clock=self.clock, sleep=self.clock.sleep, **{**options, **kwargs})
+
+    def test_retries_with_jittered_backoff_then_succeeds(self):
+        client, provider = self.make_client(), FakeProvider(failures=2)
+        self.assertEqual(client.call(provider, "AAPL"), {"ticker": "AAPL"})
+        self.assertEqual(provider.calls, 3)
+        self.assertTrue(0 <= self.clock.sleeps[0] <= 1.0 and 0 <= self.clock.sleeps[1] <= 2.0)
+        self.assertEqual(client.metrics()["retries"], 2)
+        self.assertEqual(client.metrics()["circuit"], "closed")
+
+    def test_permanent_errors_are_not_retried(self):
+        client = self.make_client(permanent=(KeyError,))
+        provider = FakeProvider(failures=5, error=KeyError("no such ticker"))
+        with self.assertRaises(KeyError):
+            client.call(provider, "NOPE")
+        self.assertEqual(provider.calls, 1)
+        self.assertEqual(client.metrics()["failures"], 0)
+
+    def test_circuit_opens_then_recovers_after_reset(self):
+        client, provider = self.make_client(), FakeProvider(failures=6)
+        for _ in range(2):
+            with self.assertRaises(UpstreamError):
+                client.call(provider, "AAPL")
+        self.assertEqual(client.metrics()["circuit"], "open")
+
+        with self.assertRaises(CircuitOpenError):
+            client.call(provider, "AAPL")
+        self.assertEqual(provider.calls, 6)  # rejected without calling the provider
+
+        self.clock.now += 30
+        self.assertEqual(client.call(provider, "AAPL"), {"ticker": "AAPL"})
+        metrics = client.metrics()
+        self.assertEqual((metrics["circuit"], metrics["failures"], metrics["rejected"]), ("closed", 2, 1))
+
+    def test_circuit_half_opens_exactly_at_reset_timeout(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(threshold=1, reset_timeout=30, clock=clock)
+        clock.now = 2.3  # (2.3 + 30) - 2.3 < 30 in floating point
+        breaker.failure()
+        clock.now += 30
+        self.assertEqual(breaker.state, "half-open")
+        self.assertTrue(breaker.allow())
+
+    def test_token_bucket_spaces_calls_and_sheds_excess(self):
+        client, provider = self.make_client(rate=2, burst=2, max_wait=1.0), FakeProvider()
+        for _ in range(4):
+            client.call(provider, "AAPL")
+        self.assertEqual(self.clock.sleeps, [0.5, 0.5])  # burst of 2, then 2 calls per second
+
+        client.bucket.acquire(max_wait=10), client.bucket.acquire(max_wait=10)  # reserved by other threads
+        with self.assertRaises(RateLimitedError):
+            client.call(provider, "AAPL")
+        self.assertEqual((client.metrics()["throttled"], client.metrics()["shed"]), (2, 1))
+
+    def test_empty_download_is_retried_as_a_failure(self):
+        client, provider = self.make_client(), market_data.YFinanceProvider()
+        with mock.patch.object(market_data.yf, "download", return_value=pd.DataFrame()) as download:
+            with self.assertRaises(UpstreamError):
+                client.call(provider.history, "AAPL", pd.Timestamp("2024-01-01"), pd.Timestamp("2024-02-01"), "1d")
+            self.assertEqual(download.call_count, 3)
+            # A weekend holds no bars: empty is a valid answer
+            weekend = client.call(provider.history, "AAPL", pd.Timestamp("2024-01-06"), pd.Timestamp("2024-01-08"), "1d")
+        self.assertTrue(weekend.empty)
+
+    def test_empty_download_over_a_holiday_is_not_a_failure(self):
+        client, provider = self.make_client(), market_data.YFinanceProvider()
+        christmas = (pd.Timestamp("2024-12-25"), pd.Timestamp("2024-12-26"), "1d")
+        with mock.patch.object(market_data.yf, "download", return_value=pd.DataFrame()) as download:
+            for _ in range(6):
+                self.assertTrue(client.call(provider.history, "AAPL", *christmas).empty)
+            frames = client.call(provider.history_many, ["AAPL", "MSFT"], *christmas)
+            # London is open on Christmas Eve: no rows there is a failure
+            with self.assertRaises(UpstreamError):
+                client.call(provider.history, "VOD.L", pd.Timestamp("2024-12-24"), pd.Timestamp("2024-12-25"), "1d")
+        self.assertEqual(list(frames), ["AAPL", "MSFT"])
+        self.assertEqual(download.call_count, 7 + 3)
+        self.assertEqual((client.metrics()["failures"], client.metrics()["circuit"]), (1, "closed"))
+
+    def test_shed_validation_is_unavailable_not_invalid(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        client, index = self.make_client(rate=0.001, burst=1, max_wait=0), SymbolIndex(Path(tmp.name) / "symbols.sqlite3")
+        with mock.patch("builtins.print"), mock.patch.object(quotes_api, "UPSTREAM", client), mock.patch.object(quotes_api, "SYMBOLS", index), \
+                mock.patch.object(quotes_api, "CACHE", LRUCache()), \
+                mock.patch.object(market_data, "PROVIDER", market_data.SyntheticProvider()):
+            self.assertTrue(quotes_api.check_stock("AAPL"))
+            self.assertIsNone(quotes_api.check_stock("MSFT"))  # no call slot left
+        self.assertEqual(client.metrics()["shed"], 1)
+        self.assertIsNone(index.validity("MSFT"))  # not negatively cached
+
+    def test_unavailable_provider_serves_stale_quote(self):
+        cache, client = LRUCache(), self.make_client()
+        cache.set("AAPL", {"exchange": "NMS", "timestamp": None, "data": {"price": 10.0}}, ttl=-1)
+        with mock.patch.object(quotes_api, "CACHE", cache), mock.patch.object(quotes_api, "UPSTREAM", client):
+            quote = quotes_api._quote_from_info("AAPL", None)
+            missing = quotes_api._quote_from_info("MSFT", None)
+        self.assertEqual((quote["price"], quote["stale"]), (10.0, True))
+        self.assertIn("error", missing)
+        self.assertEqual(client.metrics()["served_stale"], 1)
+
+
+# ============================================================
+# HISTORY STORE
+# ============================================================
+def fake_history(symbol, start, end, interval):
+    """One business-day bar per day in [start, end), closing at the day of month."""
+    index = pd.bdate_range(start, end - pd.Timedelta(seconds=1), name="Date")
+    return pd.DataFrame({c: index.day.astype(float) for c in history_store.COLUMNS}, index=index)
+
+
+def day(date):
+    return history_store._to_seconds(date)
+
+
+class HistoryStoreTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.fetch = mock.Mock(side_effect=fake_history)
+        self.fetch_many = mock.Mock(side_effect=lambda symbols, *args: {s: fake_history(s, *args) for s in symbols})
+        self.store = history_store.HistoryStore(Path(tmp.name), fetch=self.fetch, fetch_many=self.fetch_many)
+
+    def coverage(self, symbol):
+        return self.store._load_coverage(self.store._dir(symbol, "1d"))
+
+    def test_fetches_only_uncovered_ranges(self):
+        january = self.store.read("AAPL", "2024-01-01", "2024-02-01")
+        self.assertEqual(len(january), 23)
+        self.store.read("AAPL", "2024-01-10", "2024-01-20")
+        self.assertEqual(self.fetch.call_count, 1)
+
+        # Partial overlap: only February goes upstream
+        both = self.store.read("AAPL", "2024-01-15", "2024-03-01")
+        self.assertEqual(self.fetch.call_args.args[1:3], (pd.Timestamp("2024-02-01"), pd.Timestamp("2024-03-01")))
+        self.assertEqual((both.index[0], both.index[-1]), (pd.Timestamp("2024-01-15"), pd.Timestamp("2024-02-29")))
+        self.assertEqual(self.coverage("AAPL"), [(day("2024-01-01"), day("2024-03-01"))])
+
+    def test_empty_response_for_a_closed_range_is_covered(self):
+        self.fetch.side_effect = lambda *args: pd.DataFrame(columns=history_store.COLUMNS)
+        for _ in range(3):
+            self.assertTrue(self.store.read("AAPL", "2024-12-25", "2024-12-26").empty)
+        self.assertEqual(self.fetch.call_count, 1)
+        self.assertEqual(self.coverage("AAPL"), [(day("2024-12-25"), day("2024-12-26"))])
+
+        # Around the covered holiday, only the new days go upstream
+        self.fetch.side_effect = fake_history
+        self.assertEqual(len(self.store.read("AAPL", "2024-12-23", "2024-12-28")), 4)
+        self.assertEqual(self.fetch.call_count, 3)
+
+    def test_failed_fetch_serves_stored_rows(self):
+        self.store.read("AAPL", "2024-01-01", "2024-02-01")
+        self.fetch.side_effect = UpstreamError("provider down")
+        with mock.patch.object(history_store, "UPSTREAM", mock.Mock()):
+            rows = self.store.read("AAPL", "2024-01-01", "2024-03-01")
+        self.assertEqual(len(rows), 23)
+        self.assertEqual(self.coverage("AAPL"), [(day("2024-01-01"), day("2024-02-01"))])
+
+    def test_batch_records_each_symbols_own_gaps(self):
+        self.store.read("AAPL", "2024-01-01", "2024-02-01")
+        self.fetch_many.side_effect = lambda symbols, *args: {"AAPL": fake_history("AAPL", *args)}  # only AAPL answers
+        frames = self.store.read_many(["AAPL", "MSFT", "SAP.DE"], "2023-12-01", "2024-03-01")
+
+        symbols, start, end, _ = self.fetch_many.call_args.args
+        self.assertEqual((symbols, start, end), (["AAPL", "MSFT", "SAP.DE"], pd.Timestamp("2023-12-01"), pd.Timestamp("2024-03-01")))
+        self.assertEqual(len(frames["AAPL"]), 21 + 23 + 21)
+        self.assertTrue(frames["MSFT"].empty)
+        self.assertEqual(self.coverage("AAPL"), [(day("2023-12-01"), day("2024-03-01"))])
+        self.assertEqual(self.coverage("MSFT"), [])
+        self.assertEqual(self.coverage("SAP.DE"), [])
+
+
+# ============================================================
+# CHART ENDPOINTS
+# ============================================================
+def fake_price_matrix(tickers, start, end, freq="1d"):
+    index = pd.bdate_range("2024-01-01", periods=30)
+    values = np.linspace(1.0, 2.0, len(index))[:, None] * np.arange(1, len(tickers) + 1)
+    return PriceMatrix(index, tuple(tickers), values, np.ones(values.shape, dtype=bool))
+
+
+def fake_submit_render(spec):
+    future = Future()
+    future.set_result((spec_key(spec), b"fake-png"))
+    return future
+
+
+@mock.patch("analytics.views.charts.build_price_matrix", fake_price_matrix)
+@mock.patch("analytics.views.charts.submit_render", fake_submit_render)
+class ChartViewTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch("analytics.views.charts.PAYLOADS", LRUCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user("alice", password="secret")
+        self.client.force_login(self.user)
+        self.strategy = self.make_strategy(self.user, {"AAPL": 10, "MSFT": 5})
+
+    def make_strategy(self, user, holdings):
+        strategy = Strategy.objects.create(name="growth", user=user)
+        Portfolio.objects.bulk_create([Portfolio(strategy=strategy, ticker=t, shares=s) for t, s in holdings.items()])
+        return strategy
+
+    def test_chart_data_etag_round_trip(self):
+        url = reverse("analytics:chart_data", args=[self.strategy.id])
+        response = self.client.get(url, {"kind": "stocks", "start": "2024-01-01", "end": "2024-03-01"})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([s["name"] for s in response.json()["series"]], ["AAPL", "MSFT"])
+
+        again = self.client.get(
+            url, {"kind": "stocks", "start": "2024-01-01", "end": "2024-03-01"}, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual((again.status_code, again["ETag"]), (304, response["ETag"]))
+
+    def test_chart_image_etag_round_trip(self):
+        url = reverse("analytics:chart_image", args=[self.strategy.id])
+        response = self.client.get(url, {"format": "png"})
+        self.assertEqual((response.status_code, response["Content-Type"]), (200, "image/png"))
+        self.assertEqual(response.content, b"fake-png")
+
+        again = self.client.get(url, {"format": "png"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+    def test_foreign_strategy_is_not_found(self):
+        other = self.make_strategy(User.objects.create_user("bob", password="secret"), {"TSLA": 1})
+        for name in ("chart_data", "chart_image"):
+            response = self.client.get(reverse(f"analytics:{name}", args=[other.id]))
+            self.assertEqual(response.status_code, 404, name)
+
+    def test_anonymous_requests_are_redirected_to_login(self):
+        self.client.logout()
+        for name in ("chart_data", "chart_image"):
+            response = self.client.get(reverse(f"analytics:{name}", args=[self.strategy.id]))
+            self.assertEqual(response.status_code, 302, name)
+
+    def test_bad_parameters_are_rejected(self):
+        bad = [{"end": "garbage"}, {"start": "2024-02-01", "end": "2024-01-01"}, {"freq": "2m"},
+               {"method": "spline"}, {"points": "-5"}, {"kind": "bonds"}]
+        for name in ("chart_data", "chart_image"):
+            for params in bad:
+                response = self.client.get(reverse(f"analytics:{name}", args=[self.strategy.id]), params)
+                self.assertEqual(response.status_code, 400, (name, params))
+        response = self.client.get(reverse("analytics:chart_image", args=[self.strategy.id]), {"format": "gif"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ImageCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.images = ImageCache(Path(tmp.name), max_entries=2, max_age=3600)
+
+    def put(self, key, age):
+        """Store a 1-byte image for `key` last used `age` seconds ago."""
+        key = key * 64
+        self.images.put(key, "png", b"x")
+        path = self.images.path(key, "png")
+        then = path.stat().st_mtime - age
+        os.utime(path, (then, then))
+        return key
+
+    def test_least_recently_used_images_are_pruned(self):
+        a, b = self.put("a", 30), self.put("b", 20)
+        self.assertEqual(self.images.get(a, "png"), b"x")  # a is now the most recently used
+        c = self.put("c", 10)
+        self.assertIsNone(self.images.get(b, "png"))
+        self.assertFalse(self.images.path(b, "png").exists())
+        self.assertEqual((self.images.get(a, "png"), self.images.get(c, "png")), (b"x", b"x"))
+
+    def test_images_unused_for_max_age_are_misses_and_pruned(self):
+        old = self.put("a", 3601)
+        self.assertIsNone(self.images.get(old, "png"))
+        fresh = self.put("b", 0)
+        self.assertFalse(self.images.path(old, "png").exists())
+        self.assertEqual(self.images.get(fresh, "png"), b"x")
+
+        then = self.images.path(fresh, "png").stat().st_mtime - 3601
+        os.utime(self.images.path(fresh, "png"), (then, then))
+        self.assertEqual(self.images.prune(), 1)
+
+
+# ============================================================
+# QUOTE LOOKUP
+# ============================================================
+class QuoteLookupTests(SimpleTestCase):
+    """lookup_many against the offline provider, whose `calls` count every upstream request."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.provider = market_data.SyntheticProvider()
+        patches = [
+            mock.patch.object(market_data, "PROVIDER", self.provider),
+            mock.patch.object(quotes_api, "SYMBOLS", SymbolIndex(Path(tmp.name) / "symbols.sqlite3")),
+            mock.patch.object(quotes_api, "CACHE", LRUCache()),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_results_keep_input_order_and_duplicates_are_fetched_once(self):
+        tickers = ["MSFT", "AAPL", "MSFT", "NVDA", "AAPL"]
+        quotes = quotes_api.lookup_many(tickers)
+        self.assertEqual([q["ticker"] for q in quotes], tickers)
+        self.assertEqual(quotes[0], quotes[2])
+        self.assertEqual(self.provider.calls["info"], 3)
+
+    def test_cache_hits_make_no_provider_calls(self):
+        first = quotes_api.lookup_many(["AAPL", "MSFT"])
+        calls = dict(self.provider.calls)
+        again = quotes_api.lookup_many(["MSFT", "AAPL", "MSFT"])
+        self.assertEqual(self.provider.calls, calls)
+        self.assertEqual([q["cached"] for q in again], [True, True, True])
+        self.assertEqual([q["price"] for q in again], [first[1]["price"], first[0]["price"], first[1]["price"]])
+
+        quotes_api.lookup_many(["AAPL"], refresh=True)
+        self.assertEqual(self.provider.calls["info"], calls["info"] + 1)
+
+    def test_concurrent_lookups_of_one_ticker_share_one_fetch(self):
+        self.provider.latency = 0.2  # long enough for every thread to arrive mid-fetch
+        start, quotes = threading.Barrier(8), []
+
+        def lookup():
+            start.wait()
+            quotes.append(quotes_api.lookup("AAPL"))
+
+        threads = [threading.Thread(target=lookup) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.provider.calls["info"], 1)
+        self.assertEqual({q["price"] for q in quotes}, {quotes[0]["price"]})
+        self.assertEqual(len(quotes), 8)
+
+
+# ============================================================
+# SYNTHETIC PROVIDER
+# ============================================================
+class SyntheticProviderTests(SimpleTestCase):
+    def test_quotes_and_fx_are_those_of_the_given_day(self):
+        provider = market_data.SyntheticProvider()
+        bars = provider.history("AAPL", "2024-06-01", "2024-07-01", "1d")
+        self.assertEqual(provider.info("AAPL")["regularMarketPrice"], bars.loc["2024-06-28", "Close"])
+        self.assertEqual(provider.info("AAPL"), market_data.SyntheticProvider().info("AAPL"))
+        self.assertEqual(provider.fx_rates(["EUR", "JPY"]), market_data.SyntheticProvider().fx_rates(["EUR", "JPY"]))
+
+        days = iter(["2024-06-27", "2024-06-28"])
+        moving = market_data.SyntheticProvider(today=lambda: next(days))
+        self.assertEqual(moving.info("AAPL")["regularMarketPrice"], bars.loc["2024-06-27", "Close"])
+        self.assertEqual(moving.info("AAPL")["regularMarketPrice"], bars.loc["2024-06-28", "Close"])
+
+
+# ============================================================
+# CROSS-PROCESS SINGLE FLIGHT
+# ============================================================
+class CrossProcessFetchTests(SimpleTestCase):
+    INFO = {"quoteType": "EQUITY", "exchange": "NMS", "regularMarketPrice": 10.0, "regularMarketOpen": 9.0}
+
+    def test_waiting_worker_reuses_the_quote_the_other_worker_wrote(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / "quotes.snapshot.sqlite3"
+        first, second = SnapshotCache(path), SnapshotCache(path)  # two workers, one snapshot file
+        second.get("AAPL")  # the second worker has already loaded its snapshot
+
+        safe_info = mock.Mock(return_value=self.INFO)
+        with mock.patch.multiple(quotes_api, CROSS_PROCESS_LOCK=True, LOCK_DIR=Path(tmp.name) / "locks",
+                                 safe_info=safe_info, get_exchange_rate=lambda code: 1.0):
+            with mock.patch.object(quotes_api, "CACHE", first):
+                info, fetched = quotes_api._fetch_quote("AAPL", None)
+            with mock.patch.object(quotes_api, "CACHE", second):
+                reused_info, reused = quotes_api._fetch_quote("AAPL", None)
+
+        self.assertEqual(safe_info.call_count, 1)
+        self.assertEqual((info, reused_info), (self.INFO, None))
+        self.assertEqual((fetched["price"], reused["price"], reused["cached"]), (10.0, 10.0, True))
+
+
+# ============================================================
+# PORTFOLIO CHARTS
+# ============================================================
+class PortfolioFrameTests(SimpleTestCase):
+    def matrix(self, values):
+        values = np.array(values, dtype="float64")
+        index = pd.bdate_range("2024-01-01", periods=len(values))
+        return PriceMatrix(index, ("^GSPC", "AAPL", "NEW"), values, ~np.isnan(values))
+
+    def test_starts_at_first_row_where_every_position_has_a_price(self):
+        nan = float("nan")
+        matrix = self.matrix([[100, 10, nan], [101, 11, nan], [102, 12, 5], [103, 13, 6]])
+        frame, index_data = _portfolio_frame(matrix, {"AAPL": 2, "NEW": 1}, "^GSPC")
+        self.assertEqual(list(frame.index), list(matrix.index[2:]))
+        self.assertEqual(frame["total"].tolist(), [29.0, 32.0])
+        self.assertEqual(index_data.tolist(), [102.0, 103.0])
+
+        payload = portfolio_chart_data(matrix, {"AAPL": 2, "NEW": 1}, "^GSPC")
+        self.assertEqual(len(payload["x"]), 2)
+        self.assertEqual(payload["series"][1]["y"][0], 100.0)
+
+    def test_raises_only_for_tickers_without_any_price(self):
+        nan = float("nan")
+        matrix = self.matrix([[100, 10, nan], [101, 11, nan]])
+        with self.assertRaisesMessage(ValueError, "['NEW']"):
+            _portfolio_frame(matrix, {"AAPL": 1, "NEW": 1}, "^GSPC")
+
+    def test_display_helpers_return_the_rendered_image(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        db = sqlite3.connect(":memory:")
+        db.row_factory = sqlite3.Row
+        db.execute("CREATE TABLE portfolio (strategy_id INTEGER, ticker TEXT, shares REAL)")
+        db.executemany("INSERT INTO portfolio VALUES (1, ?, ?)", [("AAPL", 2), ("NEW", 1)])
+        matrix = self.matrix([[100, 10, 4], [101, 11, 5], [102, 12, 6]])
+
+        images = ImageCache(Path(tmp.name))
+        with mock.patch.object(chart_renderer, "IMAGES", images), mock.patch.object(portfolio_visualization, "IMAGES", images):
+            frame, portfolio_image = portfolio_visualization.display_portfolio(db, 1, "^GSPC", None, None, "1d", matrix=matrix)
+            prices, stocks_image = portfolio_visualization.display_stocks(db, 1, None, None, "1d", matrix=matrix, fmt="svg")
+
+        self.assertEqual(frame["total"].tolist(), [24.0, 27.0, 30.0])
+        self.assertEqual(sorted(prices), ["AAPL", "NEW"])
+        self.assertTrue(portfolio_image.read_bytes().startswith(b"\x89PNG"))
+        self.assertEqual(stocks_image.suffix, ".svg")
+        self.assertTrue(stocks_image.exists())
+
+
+# ============================================================
+# ASYNC QUOTE PIPELINE
+# ============================================================
+class AsyncLookupTests(SimpleTestCase):
+    def test_cache_reads_run_off_the_event_loop(self):
+        threads = {}
+
+        def split_cached(tickers, refresh):
+            threads["split"] = threading.current_thread()
+            return {t: {"ticker": t, "cached": True} for t in tickers}, []
+
+        def split_validity(tickers):
+            threads["validity"] = threading.current_thread()
+            return {t: True for t in tickers}, []
+
+        async def run():
+            threads["loop"] = threading.current_thread()
+            quotes = await quotes_api.async_lookup_many(["AAPL", "MSFT"])
+            valid = await quotes_api.async_check_stocks(["AAPL"])
+            return quotes, valid
+
+        with mock.patch.multiple(quotes_api, _split_cached=split_cached, _split_validity=split_validity):
+            quotes, valid = asyncio.run(run())
+        self.assertEqual(([q["ticker"] for q in quotes], valid), (["AAPL", "MSFT"], {"AAPL": True}))
+        self.assertNotEqual(threads["split"], threads["loop"])
+        self.assertNotEqual(threads["validity"], threads["loop"])
+
+
+# ============================================================
+# QUOTE CACHE BACKENDS
+# ============================================================
+class QuoteCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+
+    def use_clock(self):
+        clock = FakeClock()
+        clock.now = 1000.0
+        patcher = mock.patch.object(quote_cache, "time", mock.Mock(time=clock))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return clock
+
+    def test_snapshot_survives_a_restart(self):
+        path = self.root / "quotes.snapshot.sqlite3"
+        before = SnapshotCache(path, ttl=60)
+        before.set("AAPL", {"price": 10.0})
+        before.set("MSFT", {"price": 20.0}, ttl=-1)  # expired, still a stale fallback
+        before.set("TSLA", {"price": 30.0})
+        before.delete("TSLA")
+
+        after = SnapshotCache(path, ttl=60)  # a restarted worker
+        self.assertEqual(after.get("AAPL"), {"price": 10.0})
+        self.assertIsNone(after.get("MSFT"))
+        self.assertEqual(after.get("MSFT", stale=True), {"price": 20.0})
+        self.assertIsNone(after.get("TSLA", stale=True))
+
+        after.clear()
+        self.assertEqual(len(SnapshotCache(path, ttl=60)), 0)
+
+    def test_snapshot_sees_another_processes_writes(self):
+        path = self.root / "quotes.snapshot.sqlite3"
+        worker, refresher = SnapshotCache(path, ttl=60), SnapshotCache(path, ttl=60)
+        worker.set("MSFT", {"price": 1.0}, ttl=-1)
+        self.assertIsNone(worker.get("AAPL"))  # loaded, then missed
+
+        refresher.set("AAPL", {"price": 10.0})
+        refresher.set("MSFT", {"price": 20.0})
+        self.assertEqual(worker.get("AAPL"), {"price": 10.0})
+        self.assertEqual(worker.get("MSFT"), {"price": 20.0})  # expired locally, fresh on file
+        self.assertEqual(worker.stats()["hits"], 2)
+
+    def test_unreadable_snapshot_degrades_to_memory_only(self):
+        path = self.root / "quotes.snapshot.sqlite3"
+        path.write_bytes(b"not a sqlite database" * 100)
+        cache = SnapshotCache(path)
+        with mock.patch("builtins.print"):
+            cache.set("AAPL", {"price": 10.0})
+            self.assertEqual(cache.get("AAPL"), {"price": 10.0})
+            cache.delete("AAPL")
+            cache.clear()
+        self.assertIsNone(cache.get("AAPL", stale=True))
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2, ttl=60)
+        cache.set("AAPL", 1)
+        cache.set("MSFT", 2)
+        cache.get("AAPL")  # MSFT is now the least recently used
+        cache.set("TSLA", 3)
+        self.assertIsNone(cache.get("MSFT", stale=True))
+        self.assertEqual((cache.get("AAPL"), cache.get("TSLA")), (1, 3))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_sqlite_evicts_least_recently_accessed(self):
+        clock = self.use_clock()
+        cache = SQLiteCache(self.root / "quotes.sqlite3", max_entries=2, ttl=60)
+        for key in ("AAPL", "MSFT"):
+            cache.set(key, key.lower())
+            clock.sleep(1)
+        cache.get("AAPL")
+        clock.sleep(1)
+        cache.set("TSLA", "tsla")
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("MSFT", stale=True))
+        self.assertEqual(cache.get("AAPL"), "aapl")
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entries_expire_after_their_ttl(self):
+        clock = self.use_clock()
+        for cache in (LRUCache(ttl=60), SQLiteCache(self.root / "ttl.sqlite3", ttl=60)):
+            with self.subTest(backend=type(cache).__name__):
+                cache.set("AAPL", 1)
+                cache.set("MSFT", 2, ttl=600)
+                clock.sleep(59)
+                self.assertEqual(cache.get("AAPL"), 1)
+                clock.sleep(1)
+                self.assertIsNone(cache.get("AAPL"))
+                self.assertEqual(cache.get("AAPL", stale=True), 1)  # expired, not evicted
+                self.assertEqual(cache.get("MSFT"), 2)
+
+
+# ============================================================
+# RISK METRICS
+# ============================================================
+class RollingDrawdownTests(SimpleTestCase):
+    def test_matches_pandas_rolling_max(self):
+        rng = np.random.default_rng(0)
+        values = pd.Series(100 * np.cumprod(1 + rng.normal(0, 0.02, 1000)))
+        values.iloc[[10, 500]] = np.nan
+        for window in (1, 2, 7, 63, 999, 1000, 5000):
+            expected = values / values.rolling(window, min_periods=1).max() - 1
+            pd.testing.assert_series_equal(rolling_drawdown(values, window), expected, check_names=False)
+
+    def test_short_series_and_bad_window(self):
+        self.assertTrue(rolling_drawdown(pd.Series([], dtype="float64"), 5).empty)
+        self.assertEqual(rolling_drawdown(pd.Series([2.0, 1.0]), 5).tolist(), [0.0, -0.5])
+        with self.assertRaises(ValueError):
+            rolling_drawdown(pd.Series([1.0]), 0)
+
+    def test_rolling_return_matches_pandas_and_validates_its_window(self):
+        values = pd.Series([100.0, 110.0, 99.0, 120.0, 90.0])
+        for window in (1, 2, 4, 5, 9):
+            pd.testing.assert_series_equal(rolling_return(values, window), values.pct_change(window), check_names=False)
+        for window in (0, -2):
+            with self.assertRaises(ValueError):
+                rolling_return(values, window)
+
+
+class RiskMetricsTests(SimpleTestCase):
+    """Every metric against a plain pandas computation of its definition."""
+
+    RF, PERIODS, WINDOW = 0.03, 252, 21
+
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        index = pd.bdate_range("2020-01-01", periods=400)
+        self.values = pd.Series(100 * np.cumprod(1 + rng.normal(0.0004, 0.015, len(index))), index=index)
+        self.benchmark = pd.Series(100 * np.cumprod(1 + rng.normal(0.0003, 0.01, len(index))), index=index)
+        self.returns = self.values.pct_change().dropna()
+        self.excess = self.returns - self.RF / self.PERIODS
+        self.bench_excess = self.benchmark.pct_change().dropna() - self.RF / self.PERIODS
+
+    def assert_series(self, result, expected):
+        pd.testing.assert_series_equal(result, expected, check_names=False, rtol=1e-8)
+
+    def test_full_period_metrics(self):
+        ex, bx, p = self.excess, self.bench_excess, self.PERIODS
+        beta = ex.cov(bx) / bx.var()
+        years = (self.values.index[-1] - self.values.index[0]).days / 365.25
+        expected = {
+            "cagr": (self.values.iloc[-1] / self.values.iloc[0]) ** (1 / years) - 1,
+            "volatility": self.returns.std() * np.sqrt(p),
+            "max_drawdown": (self.values / self.values.cummax() - 1).min(),
+            "sharpe": ex.mean() / ex.std() * np.sqrt(p),
+            "sortino": ex.mean() / np.sqrt((ex.clip(upper=0) ** 2).mean()) * np.sqrt(p),
+            "alpha": (ex.mean() - beta * bx.mean()) * p,
+            "beta": beta,
+        }
+        report = risk_metrics.risk_report(self.values, self.benchmark, "1d", risk_free=self.RF)
+        self.assertEqual(set(report), set(expected))
+        for name, value in expected.items():
+            self.assertAlmostEqual(report[name], value, places=10, msg=name)
+
+        # The benchmark is aligned onto the portfolio's dates first
+        shifted = risk_metrics.risk_report(self.values, self.benchmark.iloc[100:], "1d", risk_free=self.RF)
+        clipped = risk_metrics.risk_report(self.values.iloc[100:], self.benchmark.iloc[100:], "1d", risk_free=self.RF)
+        self.assertEqual(shifted, clipped)
+
+    def test_degenerate_inputs_are_nan(self):
+        flat = pd.Series([100.0] * 5, index=pd.bdate_range("2024-01-01", periods=5))
+        self.assertTrue(np.isnan(risk_metrics.sharpe_ratio(flat.pct_change().dropna())))
+        self.assertTrue(np.isnan(risk_metrics.sortino_ratio(pd.Series([0.01, 0.02]))))
+        self.assertTrue(np.isnan(risk_metrics.alpha_beta(pd.Series([0.01, 0.02]), pd.Series([0.0, 0.0]))).all())
+        self.assertTrue(np.isnan(risk_metrics.cagr(flat.iloc[:1])))
+
+    def test_rolling_metrics_match_pandas_rolling(self):
+        r, ex, bx = self.returns, self.excess, self.bench_excess
+        w, p, rf = self.WINDOW, self.PERIODS, self.RF
+        self.assert_series(risk_metrics.rolling_volatility(r, w, p), r.rolling(w).std() * np.sqrt(p))
+        self.assert_series(
+            risk_metrics.rolling_sharpe(r, w, rf, p), ex.rolling(w).mean() / ex.rolling(w).std() * np.sqrt(p)
+        )
+        self.assert_series(
+            risk_metrics.rolling_sortino(r, w, rf, p),
+            ex.rolling(w).mean() / np.sqrt((ex.clip(upper=0) ** 2).rolling(w).mean()) * np.sqrt(p),
+        )
+        frame = risk_metrics.rolling_alpha_beta(r, self.benchmark.pct_change().dropna(), w, rf, p)
+        beta = ex.rolling(w).cov(bx) / bx.rolling(w).var()
+        self.assert_series(frame["beta"], beta)
+        self.assert_series(frame["alpha"], (ex.rolling(w).mean() - beta * bx.rolling(w).mean()) * p)
+
+        with self.assertRaises(ValueError):
+            risk_metrics.rolling_volatility(r, 1)
+
+
+# ============================================================
+# EXCHANGE RATES
+# ============================================================
+class FXRateServiceTests(SimpleTestCase):
+    CURRENCIES = {row["currency"] for row in EXCHANGES.values()} - {"USD"}
+
+    def test_first_miss_loads_every_currency_in_one_batch(self):
+        fetch = mock.Mock(side_effect=lambda currencies: {c: 2.0 for c in currencies})
+        service = FXRateService(refresh_interval=300, fetch=fetch)
+        self.assertEqual(service.rate("USD"), 1.0)
+        self.assertEqual((service.rate("EUR"), service.rate("GBP"), service.rate("JPY")), (2.0, 2.0, 2.0))
+        fetch.assert_called_once()
+        self.assertEqual(set(fetch.call_args.args[0]), self.CURRENCIES)
+
+    def test_concurrent_first_access_shares_one_load(self):
+        def fetch(currencies):
+            threading.Event().wait(0.2)
+            return {c: 2.0 for c in currencies}
+
+        fetch = mock.Mock(side_effect=fetch)
+        service, start, rates = FXRateService(refresh_interval=300, fetch=fetch), threading.Barrier(8), []
+
+        def rate(currency):
+            start.wait()
+            rates.append(service.rate(currency))
+
+        threads = [threading.Thread(target=rate, args=(c,)) for c in ["EUR", "GBP", "JPY", "CAD"] * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(rates, [2.0] * 8)
+
+    def test_stale_rate_is_served_while_refreshing_in_the_background(self):
+        release, fetches = threading.Event(), []
+
+        def fetch(currencies):
+            fetches.append(currencies)
+            if len(fetches) > 1:
+                release.wait(5)
+            return {c: 1.0 if len(fetches) == 1 else 1.5 for c in currencies}
+
+        service = FXRateService(refresh_interval=0, fetch=fetch)
+        self.assertEqual(service.rate("EUR"), 1.0)
+        self.assertEqual(service.rate("EUR"), 1.0)  # stale: answered at once, refresh started
+        self.assertEqual(service.rate("EUR"), 1.0)  # still refreshing: no second refresh
+        release.set()
+        for thread in threading.enumerate():
+            if thread.name == "fx-refresh":
+                thread.join(5)
+        self.assertEqual(len(fetches), 2)
+        self.assertEqual(service.rate("EUR"), 1.5)
+
+
+class HistoricalExchangeRateTests(SimpleTestCase):
+    def test_usd_exchange_gets_a_series_of_ones(self):
+        rates = get_historical_exchange_rate("NYQ", "2024-01-05", "2024-01-09")
+        self.assertIsInstance(rates, pd.Series)
+        self.assertEqual(list(rates.index), list(pd.date_range("2024-01-05", "2024-01-08")))
+        self.assertTrue((rates == 1.0).all())
+
+        hours = pd.date_range("2024-01-08 14:30", periods=3, freq="h", tz="UTC")
+        aligned = align_rates(get_historical_exchange_rate("NYQ", hours[0], hours[-1]), hours)
+        self.assertEqual(aligned.tolist(), [1.0, 1.0, 1.0])
+
+
+# ============================================================
+# EXCHANGE CALENDAR
+# ============================================================
+class ExchangeCalendarTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / "holidays.csv"
+        path.write_text("code,date,close\nNYQ,2024-07-03,13:00\nNYQ,2024-07-04,\n")
+        self.nyse = build_calendars(path)["NYQ"]  # July: New York is UTC-4
+
+    def test_session_boundaries_are_inclusive(self):
+        self.assertFalse(self.nyse.is_open(datetime(2024, 7, 5, 13, 29, 59)))
+        self.assertTrue(self.nyse.is_open(datetime(2024, 7, 5, 13, 30)))
+        self.assertTrue(self.nyse.is_open(datetime(2024, 7, 5, 20, 0)))
+        self.assertFalse(self.nyse.is_open(datetime(2024, 7, 5, 20, 0, 1)))
+
+    def test_holiday_is_closed(self):
+        self.assertFalse(self.nyse.is_trading_day(datetime(2024, 7, 4).date()))
+        self.assertFalse(self.nyse.is_open(datetime(2024, 7, 4, 15, 0)))
+        self.assertEqual(self.nyse.next_open(datetime(2024, 7, 3, 18, 0)).isoformat(), "2024-07-05T09:30:00-04:00")
+        self.assertEqual(self.nyse.previous_close(datetime(2024, 7, 5, 12, 0)).isoformat(), "2024-07-03T13:00:00-04:00")
+
+    def test_half_day_closes_early(self):
+        self.assertTrue(self.nyse.is_open(datetime(2024, 7, 3, 17, 0)))
+        self.assertFalse(self.nyse.is_open(datetime(2024, 7, 3, 17, 1)))
+        self.assertEqual(self.nyse.next_close(datetime(2024, 7, 3, 14, 0)).isoformat(), "2024-07-03T13:00:00-04:00")
+
+    def test_weekend_and_overnight_sessions(self):
+        self.assertEqual(self.nyse.next_open(datetime(2024, 7, 6, 12, 0)).isoformat(), "2024-07-08T09:30:00-04:00")
+
+        overnight = ExchangeCalendar("X", "UTC", time(22, 0), time(2, 0))
+        self.assertTrue(overnight.is_open(datetime(2024, 7, 5, 23, 0)))  # Friday's session
+        self.assertTrue(overnight.is_open(datetime(2024, 7, 6, 2, 0)))  # still Friday's, ends Saturday
+        self.assertFalse(overnight.is_open(datetime(2024, 7, 6, 23, 0)))  # no Saturday session
+        self.assertFalse(overnight.is_open(datetime(2024, 7, 8, 1, 0)))  # nor Sunday's
+        self.assertEqual(overnight.next_close(datetime(2024, 7, 5, 23, 0)).isoformat(), "2024-07-06T02:00:00+00:00")
+
+
+# ============================================================
+# REBALANCING ENGINE
+# ============================================================
+def naive_backtest(index, prices, weights, initial_value, option, frequency=None, threshold=None):
+    """Row-by-row reference: hold shares, reset them to `weights` whenever the rule fires."""
+    shares = initial_value * weights / prices[0]
+    values, rebalances, turnover = [], [], 0.0
+    for t in range(len(prices)):
+        value = shares @ prices[t]
+        held = shares * prices[t] / value
+        if option == "time-based" and t > 0:
+            if isinstance(frequency, int):
+                due = t % frequency == 0
+            else:
+                due = index[t].to_period("M") != index[t - 1].to_period("M")
+        elif option == "drift-based":
+            due = ((held < weights * (1 - threshold)) | (held > weights * (1 + threshold))).any()
+        else:
+            due = False
+        if due:
+            rebalances.append(index[t])
+            turnover += 0.5 * np.abs(held - weights).sum()
+            shares = value * weights / prices[t]
+        values.append(value)
+    return np.array(values), rebalances, turnover
+
+
+class RebalancingEngineTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.index = pd.bdate_range("2020-01-01", periods=600)
+        self.prices = 100 * np.cumprod(1 + rng.normal(0.0003, 0.02, (len(self.index), 6)), axis=0)
+        self.weights = np.array([0.3, 0.2, 0.2, 0.1, 0.1, 0.1])
+
+    def test_matches_a_naive_per_row_loop(self):
+        for option, frequency, threshold in [
+            ("none", None, None),
+            ("time-based", 5, None),
+            ("time-based", "monthly", None),
+            ("drift-based", None, 0.05),
+            ("drift-based", None, 0.3),
+        ]:
+            with self.subTest(option=option, frequency=frequency, threshold=threshold):
+                result = backtest(self.index, self.prices, self.weights, 1e6, option, frequency, threshold)
+                values, rebalances, turnover = naive_backtest(
+                    self.index, self.prices, self.weights, 1e6, option, frequency, threshold
+                )
+                np.testing.assert_allclose(result["values"].to_numpy(), values, rtol=1e-10)
+                self.assertEqual(list(result["rebalances"]), rebalances)
+                self.assertAlmostEqual(result["turnover"], turnover, places=10)
+
+
+# ============================================================
+# DOWNSAMPLING
+# ============================================================
+class DownsamplingTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.x = np.arange(10_000) * 3_600_000
+        self.y = np.cumsum(rng.normal(size=10_000))
+
+    def test_lttb_keeps_endpoints_and_one_point_per_bucket(self):
+        for points in (3, 10, 500, 9_999):
+            keep = lttb_indices(self.x, self.y, points)
+            self.assertEqual(len(keep), points)
+            self.assertEqual((keep[0], keep[-1]), (0, len(self.y) - 1))
+            self.assertTrue((np.diff(keep) > 0).all())
+
+    def test_minmax_keeps_endpoints_and_extremes(self):
+        for points in (4, 11, 500):
+            keep = minmax_indices(self.y, points)
+            self.assertLessEqual(len(keep), 2 * (points // 2) + 2)
+            self.assertEqual((keep[0], keep[-1]), (0, len(self.y) - 1))
+            self.assertIn(self.y.argmin(), keep)
+            self.assertIn(self.y.argmax(), keep)
+
+    def test_downsample_series(self):
+        for method in ("lttb", "minmax"):
+            x, y = downsample_series(self.x, self.y, 500, method)
+            self.assertLessEqual(len(y), 502)
+            self.assertEqual((x[0], x[-1]), (self.x[0], self.x[-1]))
+            self.assertEqual((y.min(), y.max()), (self.y.min(), self.y.max()))
+
+        for dates in (pd.date_range("2020-01-01", periods=10_000, freq="h"),
+                      pd.date_range("2020-01-01", periods=10_000, freq="h", tz="UTC")):
+            x, y = downsample_series(dates, self.y, 500)
+            self.assertEqual(len(x), len(y))
+            self.assertEqual((pd.Timestamp(x[0]), pd.Timestamp(x[-1])), (dates[0], dates[-1]))
+
+        short = np.array([1.0, np.nan, 3.0])
+        x, y = downsample_series(np.arange(3), short, 500)
+        self.assertEqual((x.tolist(), y.tolist()), ([0, 2], [1.0, 3.0]))
+        self.assertEqual(len(lttb_indices(self.x[:5], self.y[:5], 500)), 5)
+        with self.assertRaises(ValueError):
+            downsample_series(self.x, self.y, 500, "median")
+
+
+# ============================================================
+# QUOTE REFRESHER
+# ============================================================
+class RefreshQuotesTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.provider = market_data.SyntheticProvider()
+        user = User.objects.create_user("alice", password="secret")
+        watchlist = Watchlist.objects.create(name="main", user=user)
+        for ticker in ("AAPL", "MSFT", "NOPE1"):
+            WatchlistStock.objects.create(watchlist=watchlist, stock=Stock.objects.create(ticker=ticker), user=user)
+        patches = [
+            mock.patch.object(market_data, "PROVIDER", self.provider),
+            mock.patch.object(quotes_api, "SYMBOLS", SymbolIndex(Path(tmp.name) / "symbols.sqlite3")),
+            mock.patch.object(quotes_api, "CACHE", LRUCache()),
+            mock.patch.object(refresh_quotes, "check_market_status", lambda code: {"market_open": True}),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_exchanges_are_resolved_once_and_unknown_tickers_are_skipped(self):
+        command = refresh_quotes.Command(stdout=io.StringIO())
+        with mock.patch.object(refresh_quotes, "lookup_many") as lookup_many:
+            for _ in range(3):
+                self.assertTrue(command.cycle({}))
+        self.assertEqual(self.provider.calls["info"], 3)  # one per ticker, on the first cycle only
+        self.assertEqual(sorted(lookup_many.call_args.args[0]), ["AAPL", "MSFT"])
+
+    def test_per_process_cache_is_refused(self):
+        with mock.patch.object(refresh_quotes, "CACHE", LRUCache()), self.assertRaises(CommandError):
+            refresh_quotes.Command(stdout=io.StringIO()).handle(once=True)
+
+
+# ============================================================
+# PORTFOLIO METRICS
+# ============================================================
+def portfolio_db(holdings):
+    """In-memory stand-in for the strategies database, with one portfolio (strategy 1)."""
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+    db.execute("CREATE TABLE portfolio (strategy_id INTEGER, ticker TEXT, shares REAL)")
+    db.executemany("INSERT INTO portfolio VALUES (1, ?, ?)", holdings.items())
+    return db
+
+
+def reference_metrics(db, strategy_id, prices):
+    """The per-ticker loop compute_metrics used before it was vectorized."""
+    portfolio = {r["ticker"]: float(r["shares"]) for r in db.execute(
+        "SELECT ticker, shares FROM portfolio WHERE strategy_id = ?", (strategy_id,))}
+    spend = {}
+    for t in db.execute("SELECT ticker, type, price, shares FROM transactions WHERE strategy_id = ?", (strategy_id,)):
+        spend[t["ticker"]] = spend.get(t["ticker"], 0.0) + (1 if t["type"] == "buy" else -1) * t["price"] * t["shares"]
+    results, equity_value = [], 0.0
+    for ticker, shares in portfolio.items():
+        if shares <= 0:
+            continue
+        price = prices.get(ticker, 0.0)
+        weighted_price = spend.get(ticker, 0.0) / shares
+        results.append({
+            "ticker": ticker, "shares": shares, "price": price, "share_value": shares * price,
+            "weighted_price": weighted_price,
+            "stock_return": (price - weighted_price) / weighted_price if weighted_price else 0.0,
+        })
+        equity_value += shares * price
+    for r in results:
+        r["portfolio_contribution"] = r["share_value"] / equity_value if equity_value else 0
+    return {"portfolio": results, "equity_value": equity_value}
+
+
+class PortfolioMetricsTests(SimpleTestCase):
+    def setUp(self):
+        self.db = portfolio_db({})
+        self.addCleanup(self.db.close)
+        self.db.executemany("INSERT INTO portfolio VALUES (?, ?, ?)", [
+            (1, "AAPL", 10), (1, "MSFT", 5), (1, "NEW", 4), (1, "GONE", 0),
+            (2, "AAPL", 3), (2, "DEAD", 2),
+            (3, "NEW", 1),
+        ])
+        self.db.execute("CREATE TABLE transactions (strategy_id INTEGER, ticker TEXT, type TEXT, price REAL, shares REAL)")
+        self.db.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?)", [
+            (1, "AAPL", "buy", 100.0, 12), (1, "AAPL", "sell", 120.0, 2), (1, "MSFT", "buy", 300.0, 5),
+            (1, "GONE", "buy", 10.0, 3), (1, "GONE", "sell", 12.0, 3),
+            (2, "AAPL", "buy", 150.0, 3), (2, "DEAD", "buy", 20.0, 2),
+        ])
+        # NEW lists late and DEAD has no price at all
+        nan = float("nan")
+        values = np.array([[150.0, 310.0, nan, nan], [155.0, 305.0, nan, nan], [160.0, 320.0, 42.0, nan]])
+        self.matrix = PriceMatrix(pd.bdate_range("2024-01-01", periods=3), ("AAPL", "MSFT", "NEW", "DEAD"), values, ~np.isnan(values))
+
+    def assert_same(self, result, expected):
+        self.assertAlmostEqual(result["equity_value"], expected["equity_value"])
+        self.assertEqual([r["ticker"] for r in result["portfolio"]], [r["ticker"] for r in expected["portfolio"]])
+        for row, reference in zip(result["portfolio"], expected["portfolio"]):
+            for column, value in reference.items():
+                self.assertAlmostEqual(row[column], value, msg=f"{row['ticker']} {column}")
+
+    def test_batch_matches_the_per_ticker_loop(self):
+        prices = self.matrix.latest()
+        batch = compute_metrics_batch(self.db, [1, 2, 3, 4], self.matrix)
+        for strategy_id in (1, 2, 3):
+            self.assert_same(batch[strategy_id], reference_metrics(self.db, strategy_id, prices))
+        self.assertEqual(batch[4], {"portfolio": [], "equity_value": 0.0})
+
+        frame = compute_metrics_frame(load_positions(self.db, [1, 2]), load_transactions(self.db, [1, 2]), prices)
+        self.assertEqual(frame.loc[frame["ticker"] == "DEAD", "price"].tolist(), [0.0])
+        self.assertNotIn("GONE", frame["ticker"].tolist())
+
+    def test_single_strategy_keeps_its_contract(self):
+        with mock.patch("analytics.utils.portfolio_metrics.lookup_many", lambda held: [{"price": 160.0}] * len(held)):
+            self.assert_same(compute_metrics(self.db, 2), reference_metrics(self.db, 2, {"AAPL": 160.0, "DEAD": 160.0}))
+        with self.assertRaises(ValueError):
+            compute_metrics(self.db, 4)
+
+
+# ============================================================
+# REBALANCING SWEEP
+# ============================================================
+class RebalancingSweepTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        index = pd.bdate_range("2020-01-01", periods=300)
+        values = 100 * np.cumprod(1 + rng.normal(0.0003, 0.02, (len(index), 3)), axis=0)
+        self.matrix = PriceMatrix(index, ("AAPL", "MSFT", "SAP.DE"), values, np.ones(values.shape, dtype=bool))
+        self.db = portfolio_db({"AAPL": 10, "MSFT": 5, "SAP.DE": 20})
+        self.addCleanup(self.db.close)
+        self.allocations = {"equal": {"AAPL": 1, "MSFT": 1, "SAP.DE": 1}, "tilted": {"AAPL": 3, "MSFT": 1, "SAP.DE": 1}}
+
+    def test_matches_rebalance_per_grid_point(self):
+        results = list(rebalancing_sweep.sweep_rebalancing(
+            self.db, 1, self.allocations, ["monthly", 10], [0.05, 0.2], processes=2, matrix=self.matrix,
+        ))
+        self.assertEqual(len(results), 1 + 2 * 2 * 2)
+        for summary in results:
+            allocation = self.allocations.get(summary["allocation"], {})
+            expected = rebalance(
+                self.db, 1, summary["option"], allocation, summary["frequency"], summary["threshold"], None,
+                matrix=self.matrix,
+            )
+            self.assertAlmostEqual(summary["final_value"], expected["values"].iloc[-1], places=6)
+            self.assertEqual(summary["rebalances"], len(expected["rebalances"]))
+            self.assertAlmostEqual(summary["turnover"], expected["turnover"], places=10)
+            self.assertAlmostEqual(summary["metrics"]["sharpe"], expected["metrics"]["sharpe"], places=10)
+
+    def test_shared_block_is_unlinked_when_the_consumer_stops_early(self):
+        blocks, shared_matrix = [], rebalancing_sweep.SharedPriceMatrix
+
+        def tracked(prices):
+            blocks.append(shared_matrix(prices))
+            return blocks[-1]
+
+        with mock.patch.object(rebalancing_sweep, "SharedPriceMatrix", side_effect=tracked):
+            results = rebalancing_sweep.sweep_rebalancing(
+                self.db, 1, self.allocations, ["monthly", "yearly"], [0.1], processes=2, matrix=self.matrix,
+            )
+            next(results)
+            name = blocks[0].handle[0]
+            results.close()
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
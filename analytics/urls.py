@@ -1,4 +1,4 @@
-from .views import index, watchlist, dashboard
+from .views import index, watchlist, dashboard, charts, status
 from django.urls import path
 from django.views.generic import TemplateView
 from django.urls import re_path
@@ -15,6 +15,7 @@ urlpatterns = [
     path("api/dashboard/watchlist/", watchlist.watchlist, name="watchlist"),
     path("api/dashboard/watchlist/select/<int:watchlist_id>/", watchlist.watchlist_select, name="watchlist_select"),
     path("api/dashboard/watchlist/data/<int:watchlist_id>/", watchlist.watchlist_data, name="watchlist_data"),
+    path("api/dashboard/watchlist/stream/<int:watchlist_id>/", watchlist.watchlist_stream, name="watchlist_stream"),
     path("api/dashboard/watchlist/create/", watchlist.watchlist_create, name="watchlist_create"),
     path("api/dashboard/watchlist/rename/<int:watchlist_id>/", watchlist.watchlist_rename, name="watchlist_rename"),
     path("api/dashboard/watchlist/delete/<int:watchlist_id>/", watchlist.watchlist_delete, name="watchlist_delete"),
@@ -22,8 +23,16 @@ urlpatterns = [
     # Stock data/add/delete views
     path("api/dashboard/stock/<int:stock_id>/", watchlist.stock_data, name="stock_data"),
     path("api/dashboard/watchlist/add/stock/", watchlist.watchlist_add_stock, name="watchlist_add"),
+    path("api/dashboard/watchlist/add/stocks/", watchlist.watchlist_add_stocks, name="watchlist_add_bulk"),
     path("api/dashboard/watchlist/remove/stock/<int:stock_id>/<int:watchlist_id>/", watchlist.watchlist_remove_stock, name="watchlist_remove"),
 
+    # Strategy chart data (JSON series, ETag-cached)
+    path("api/dashboard/chart/<int:strategy_id>/", charts.chart_data, name="chart_data"),
+    path("api/dashboard/chart/<int:strategy_id>/image/", charts.chart_image, name="chart_image"),
+
+    # Market data health for this worker (staff only)
+    path("api/status/market-data/", status.market_data_status, name="market_data_status"),
+
     # -----------------------------
     # FRONT-END SPA ENTRY POINT
     # -----------------------------
@@ -0,0 +1,204 @@
+# ======================================================================
+# chart_renderer.py
+# Headless matplotlib rendering (object-oriented Agg API) with an on-disk
+# content-addressed image cache and an optional worker pool
+# ======================================================================
+
+import hashlib
+import io
+import json
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.dates import AutoDateLocator, ConciseDateFormatter
+from matplotlib.figure import Figure
+
+from .config import CACHE_DIR, setting
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+RENDER_WORKERS = setting("CHART_RENDER_WORKERS", 2)
+# Workers are replaced after this many renders, so no process grows for ever
+RENDERS_PER_WORKER = setting("CHART_RENDERS_PER_WORKER", 500)
+START_METHOD = setting("SWEEP_START_METHOD", "spawn")
+IMAGE_CACHE = setting("CHART_IMAGE_CACHE", {})
+
+
+# ======================================================================
+# RENDER
+# ======================================================================
+# A spec is a JSON chart payload (see portfolio_visualization) plus output
+# options: {"title", "y_title", "x"?, "series": [{"name", "x"?, "y", "color"?}],
+#           "format": "png" | "svg", "width": px, "height": px, "dpi": int}
+def render(spec: Dict[str, Any]) -> bytes:
+    """
+    Draw a line chart to PNG or SVG bytes. Uses a standalone Figure with its
+    own canvas: nothing is registered with pyplot, so there is no shared
+    global state between threads and the figure is freed once unreferenced.
+    """
+    fmt = spec.get("format", "png")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported image format: choose from {list(FORMATS)}.")
+    dpi = spec.get("dpi", 100)
+    fig = Figure(figsize=(spec.get("width", 1000) / dpi, spec.get("height", 500) / dpi), dpi=dpi)
+    FigureCanvasAgg(fig)
+    try:
+        ax = fig.add_subplot()
+        for series in spec["series"]:
+            x = series.get("x", spec.get("x"))
+            ax.plot(_dates(x), [float("nan") if v is None else v for v in series["y"]],
+                    label=series["name"], color=series.get("color"), linewidth=1)
+
+        locator = AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+        ax.set_title(spec.get("title", ""))
+        ax.set_xlabel("Date")
+        ax.set_ylabel(spec.get("y_title", ""))
+        if len(spec["series"]) > 1:
+            ax.legend()
+        fig.tight_layout()
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=fmt)
+        return buffer.getvalue()
+    finally:
+        fig.clear()
+
+
+def _dates(x_ms):
+    return np.asarray(x_ms, dtype="int64").astype("datetime64[ms]")
+
+
+# ======================================================================
+# CONTENT-ADDRESSED CACHE
+# ======================================================================
+def spec_key(spec: Dict[str, Any]) -> str:
+    """Hash of everything that affects the image, so equal specs share one file."""
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class ImageCache:
+    """
+    Rendered images stored as <root>/<key[:2]>/<key>.<format>, written atomically.
+    A file's mtime is its last use: hits touch it, images unused for `max_age`
+    seconds are misses, and each put prunes expired images and then the least
+    recently used ones beyond `max_entries`.
+    """
+
+    def __init__(self, root: Path, max_entries: int = 2000, max_age: float = 7 * 86400):
+        self.root = Path(root)
+        self.max_entries = max_entries
+        self.max_age = max_age
+
+    def path(self, key: str, fmt: str) -> Path:
+        return self.root / key[:2] / f"{key}.{fmt}"
+
+    def get(self, key: str, fmt: str) -> Optional[bytes]:
+        path = self.path(key, fmt)
+        try:
+            if time.time() - path.stat().st_mtime >= self.max_age:
+                return None
+            data = path.read_bytes()
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, fmt: str, data: bytes) -> None:
+        path = self.path(key, fmt)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self.prune()
+
+    def prune(self) -> int:
+        """Delete expired and least recently used images; returns how many went."""
+        images = []
+        for path in self.root.glob("*/*"):
+            if path.suffix[1:] in FORMATS:
+                try:
+                    images.append((path.stat().st_mtime, path))
+                except FileNotFoundError:  # pruned by another worker meanwhile
+                    pass
+        images.sort(reverse=True)
+        cutoff = time.time() - self.max_age
+        doomed = [path for i, (mtime, path) in enumerate(images) if i >= self.max_entries or mtime <= cutoff]
+        for path in doomed:
+            path.unlink(missing_ok=True)
+        return len(doomed)
+
+
+IMAGES = ImageCache(
+    CACHE_DIR / "charts",
+    max_entries=IMAGE_CACHE.get("MAX_ENTRIES", 2000),
+    max_age=IMAGE_CACHE.get("MAX_AGE_SECONDS", 7 * 86400),
+)
+
+
+def render_cached(spec: Dict[str, Any]) -> Tuple[str, bytes]:
+    """(key, image bytes), rendering only when this exact spec is not on disk yet."""
+    key, fmt = spec_key(spec), spec.get("format", "png")
+    data = IMAGES.get(key, fmt)
+    if data is None:
+        data = render(spec)
+        IMAGES.put(key, fmt, data)
+    return key, data
+
+
+# ======================================================================
+# WORKER POOL
+# ======================================================================
+# Rendering is CPU-bound and holds the GIL, so it runs in worker processes.
+# The pool is created on first use; cache hits never leave the caller.
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(
+                max_workers=RENDER_WORKERS,
+                mp_context=mp.get_context(START_METHOD),
+                max_tasks_per_child=RENDERS_PER_WORKER,
+            )
+        return _POOL
+
+
+def submit_render(spec: Dict[str, Any]) -> "Future[Tuple[str, bytes]]":
+    """Like render_cached, but renders misses in the worker pool."""
+    key, fmt = spec_key(spec), spec.get("format", "png")
+    data = IMAGES.get(key, fmt)
+    if data is not None:
+        future: Future = Future()
+        future.set_result((key, data))
+        return future
+    return _pool().submit(render_cached, spec)
+
+
+# ========== Test ==========
+if __name__ == "__main__":
+    import resource
+    import time
+
+    rng = np.random.default_rng(0)
+    x = (np.arange(1000) * 86_400_000 + 1_577_836_800_000).tolist()
+    spec = {"title": "Render test", "y_title": "Price", "x": x, "series": [], "format": "png"}
+
+    start = time.perf_counter()
+    for i in range(2000):
+        spec["series"] = [{"name": "A", "y": np.cumsum(rng.normal(size=1000)).round(4).tolist()}]
+        render(spec)
+        if i % 500 == 0:
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{i:>5} renders  max RSS {rss:.0f} MB")
+    print(f"{(time.perf_counter() - start) / 2000 * 1000:.1f} ms per render")
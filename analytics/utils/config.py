@@ -0,0 +1,29 @@
+# ======================================================================
+# config.py
+# Paths and tunables shared by the analytics utilities
+# ======================================================================
+
+from pathlib import Path
+from typing import Any
+
+try:
+    # If we're inside Django runtime
+    from django.conf import settings
+    BASE_DIR = Path(settings.BASE_DIR)
+except Exception:
+    # If run directly (outside Django)
+    settings = None
+    BASE_DIR = Path(__file__).resolve().parent.parent.parent
+    # Goes from config.py to utils/ to analytics/ to project root
+
+
+def setting(name: str, default: Any) -> Any:
+    """Read an optional Django setting, falling back to `default` outside Django."""
+    try:
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+DATA_DIR = BASE_DIR / "data"
+CACHE_DIR = Path(setting("MARKET_DATA_CACHE_DIR", DATA_DIR / "cache"))
@@ -0,0 +1,170 @@
+# ======================================================================
+# exchange_calendar.py
+# Trading sessions per exchange, parsed once from data/exchanges.csv
+# ======================================================================
+
+import csv
+from datetime import date, datetime, time, timedelta
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+import numpy as np
+from pytz import timezone, utc
+
+from .config import DATA_DIR
+from .exchange_rates_api import EXCHANGES
+
+# Optional: columns code,date (YYYY-MM-DD) and close (HH:MM); a row with a
+# close time is a half day ending early, without one the exchange is shut
+HOLIDAYS_PATH = DATA_DIR / "holidays.csv"
+DEFAULT_WEEKEND = frozenset({5, 6})  # Saturday, Sunday; override with a "weekend" column, e.g. "4 5"
+MAX_SCAN_DAYS = 30  # how far next_open / previous_close look for a trading day
+
+
+# ======================================================================
+# CALENDAR
+# ======================================================================
+class ExchangeCalendar:
+    """
+    Regular trading session of one exchange: parsed open/close times, a
+    timezone object, weekend days, holidays and early closes. Sessions
+    closing after midnight (open > close) belong to the day they open on.
+    """
+
+    def __init__(
+        self,
+        code: str,
+        tz_name: str,
+        open_time: time,
+        close_time: time,
+        weekend: FrozenSet[int] = DEFAULT_WEEKEND,
+        holidays: Iterable[date] = (),
+        early_closes: Optional[Dict[date, time]] = None,
+    ):
+        self.code = code
+        self.tz = timezone(tz_name)
+        self.open_time = open_time
+        self.close_time = close_time
+        self.overnight = open_time >= close_time
+        self.weekend = frozenset(weekend)
+        self.holidays = frozenset(holidays)
+        self.early_closes = dict(early_closes or {})
+        # Half days are trading days, so only full holidays go into the business-day calendar
+        self._busdays = np.busdaycalendar(
+            weekmask=[day not in self.weekend for day in range(7)], holidays=sorted(self.holidays)
+        )
+
+    @classmethod
+    def from_row(
+        cls, row: Dict[str, str], holidays: Iterable[date] = (), early_closes: Optional[Dict[date, time]] = None
+    ) -> "ExchangeCalendar":
+        weekend = row.get("weekend")
+        return cls(
+            code=row["code"],
+            tz_name=row["timezone"],
+            open_time=datetime.strptime(row["open"], "%H:%M").time(),
+            close_time=datetime.strptime(row["close"], "%H:%M").time(),
+            weekend=frozenset(int(d) for d in weekend.split()) if weekend else DEFAULT_WEEKEND,
+            holidays=holidays,
+            early_closes=early_closes,
+        )
+
+    # ---------- Helpers ----------
+    def local_now(self, now: Optional[datetime] = None) -> datetime:
+        """`now` (aware, or naive UTC) in exchange-local time."""
+        now = now or datetime.now(utc)
+        if now.tzinfo is None:
+            now = utc.localize(now)
+        return now.astimezone(self.tz)
+
+    def is_trading_day(self, day: date) -> bool:
+        return day.weekday() not in self.weekend and day not in self.holidays
+
+    def trading_days(self, start: date, end: date) -> int:
+        """Number of sessions opening in [start, end)."""
+        return int(np.busday_count(start, end, busdaycal=self._busdays))
+
+    def session(self, day: date) -> Tuple[datetime, datetime]:
+        """Aware open and close datetimes of the session opening on `day`."""
+        open_dt = self.tz.localize(datetime.combine(day, self.open_time))
+        close_day = day + timedelta(days=1) if self.overnight else day
+        close_time = self.early_closes.get(day, self.close_time)
+        close_dt = self.tz.localize(datetime.combine(close_day, close_time))
+        return open_dt, close_dt
+
+    # ---------- Queries ----------
+    def is_open(self, now: Optional[datetime] = None) -> bool:
+        local = self.local_now(now)
+        # Only today's session, or yesterday's running past midnight, can be open
+        for day in (local.date() - timedelta(days=1), local.date()):
+            if self.is_trading_day(day):
+                open_dt, close_dt = self.session(day)
+                if open_dt <= local <= close_dt:
+                    return True
+        return False
+
+    def next_open(self, now: Optional[datetime] = None) -> datetime:
+        """Start of the next session strictly after `now`."""
+        local = self.local_now(now)
+        day = local.date()
+        for _ in range(MAX_SCAN_DAYS):
+            if self.is_trading_day(day):
+                open_dt, _ = self.session(day)
+                if open_dt > local:
+                    return open_dt
+            day += timedelta(days=1)
+        raise ValueError(f"No trading day within {MAX_SCAN_DAYS} days for {self.code}")
+
+    def next_close(self, now: Optional[datetime] = None) -> datetime:
+        """End of the current session if open, else of the next one."""
+        local = self.local_now(now)
+        day = local.date() - timedelta(days=1)
+        for _ in range(MAX_SCAN_DAYS):
+            if self.is_trading_day(day):
+                _, close_dt = self.session(day)
+                if close_dt > local:
+                    return close_dt
+            day += timedelta(days=1)
+        raise ValueError(f"No trading day within {MAX_SCAN_DAYS} days for {self.code}")
+
+    def previous_close(self, now: Optional[datetime] = None) -> datetime:
+        """End of the most recent session that closed at or before `now`."""
+        local = self.local_now(now)
+        day = local.date()
+        for _ in range(MAX_SCAN_DAYS):
+            if self.is_trading_day(day):
+                _, close_dt = self.session(day)
+                if close_dt <= local:
+                    return close_dt
+            day -= timedelta(days=1)
+        raise ValueError(f"No trading day within {MAX_SCAN_DAYS} days for {self.code}")
+
+
+# ======================================================================
+# BUILD ONCE
+# ======================================================================
+def load_holidays(path=HOLIDAYS_PATH) -> Tuple[Dict[str, FrozenSet[date]], Dict[str, Dict[date, time]]]:
+    """Read the optional holiday file into {code: closed dates} and {code: {date: early close}}."""
+    holidays: Dict[str, set] = {}
+    early_closes: Dict[str, Dict[date, time]] = {}
+    try:
+        with open(path, "r") as csv_file:
+            for row in csv.DictReader(csv_file):
+                day = datetime.strptime(row["date"], "%Y-%m-%d").date()
+                if row.get("close"):
+                    early_closes.setdefault(row["code"], {})[day] = datetime.strptime(row["close"], "%H:%M").time()
+                else:
+                    holidays.setdefault(row["code"], set()).add(day)
+    except FileNotFoundError:
+        pass
+    return {code: frozenset(days) for code, days in holidays.items()}, early_closes
+
+
+def build_calendars(path=HOLIDAYS_PATH) -> Dict[str, ExchangeCalendar]:
+    holidays, early_closes = load_holidays(path)
+    return {
+        code: ExchangeCalendar.from_row(row, holidays.get(code, ()), early_closes.get(code))
+        for code, row in EXCHANGES.items()
+    }
+
+
+CALENDARS = build_calendars()
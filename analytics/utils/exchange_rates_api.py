@@ -1,61 +1,140 @@
 import csv
-import yfinance as yf
-from pathlib import Path
-
-try:
-    # If we're inside Django runtime
-    from django.conf import settings
-    csv_path = settings.BASE_DIR / 'data' / 'exchanges.csv'
-except Exception:
-    # If run directly (outside Django)
-    BASE_DIR = Path(__file__).resolve().parent.parent.parent  
-    # Goes from exchange_rates_api.py to utils/ to trendly/ to project root
-    csv_path = BASE_DIR / 'data' / 'exchanges.csv'
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+import pandas as pd
+
+from . import market_data
+from .config import DATA_DIR, setting
+from .history_store import HISTORY
+from .single_flight import SingleFlight
+from .upstream import UPSTREAM
+
+csv_path = DATA_DIR / 'exchanges.csv'
 
 with open(csv_path, 'r') as csv_file:
     reader = csv.DictReader(csv_file)
     EXCHANGES = {row['code']: row for row in reader}
 
+# ========== Live Rate Service ==========
+def fetch_rates(currencies: Iterable[str]) -> Dict[str, float]:
+    """Latest USD->currency rates for several currencies in one provider call."""
+    currencies = list(currencies)
+    if not currencies:
+        return {}
+    return UPSTREAM.call(market_data.PROVIDER.fx_rates, currencies)
+
+
+class FXRateService:
+    """
+    In-process live FX rates keyed by currency.
+    The first miss loads every currency in EXCHANGES in one batch, shared by
+    all callers arriving meanwhile; after that, stale rates are served
+    immediately while a background thread refreshes them.
+    """
+
+    def __init__(self, refresh_interval: float, fetch: Callable = fetch_rates):
+        self.refresh_interval = refresh_interval
+        self.fetch = fetch
+        self._rates: Dict[str, Tuple[float, float]] = {}  # currency -> (rate, fetched_at)
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._loading = SingleFlight()
+
+    def rate(self, currency: str) -> Optional[float]:
+        if currency == "USD":
+            return 1.0
+        entry = self._rates.get(currency)
+        if entry is None:
+            self._loading.do("load", self.refresh, {currency} | self.currencies())
+            entry = self._rates.get(currency)
+            return entry[0] if entry else None
+        if time.time() - entry[1] >= self.refresh_interval:
+            self.refresh_in_background()
+        return entry[0]
+
+    def currencies(self) -> Set[str]:
+        """Every non-USD currency we may need: listed exchanges plus anything seen."""
+        listed = {row["currency"] for row in EXCHANGES.values()}
+        return (listed | set(self._rates)) - {"USD"}
+
+    def refresh(self, currencies: Optional[Iterable[str]] = None) -> None:
+        """Blocking batch refresh; failures keep the previous rates."""
+        currencies = set(currencies or self.currencies()) - {"USD"}
+        try:
+            fetched = self.fetch(currencies)
+        except Exception as e:
+            print(f"[fx refresh error] {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for currency, rate in fetched.items():
+                self._rates[currency] = (rate, now)
+
+    def refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="fx-refresh", daemon=True).start()
+
+
+FX = FXRateService(refresh_interval=setting("FX_REFRESH_SECONDS", 300))
+
+
 # ========== Get Live Exchange Rate ==========
 def get_exchange_rate(exchange_code: str):
-    exchange_info = EXCHANGES[exchange_code]
+    exchange_info = EXCHANGES.get(exchange_code)
     if not exchange_info:
         return None
+    return FX.rate(exchange_info["currency"])
 
-    currency = exchange_info["currency"]
-    if currency == "USD":
-        return 1.0
 
-    pair = f"USD{currency}=X"
-    try:
-        data = yf.Ticker(pair).fast_info
-        rate = data["last_price"] if data else None
-        return float(rate) if rate is not None else None
-    except Exception:
-        return None
-   
-    
 # ========== Get Historical Exchange Rates ==========
 def get_historical_exchange_rate(exchange: str, start_date: str, end_date: str):
+    """
+    Daily USD->local close rates as a Series indexed by date.
+    Rates live in the local history store, so a stored range is never refetched.
+    USD exchanges get a constant 1.0 for every day in [start_date, end_date).
+    """
     exchange_info = EXCHANGES[exchange]
     if not exchange_info:
         return None
 
     currency = exchange_info["currency"]
     if currency == "USD":
-        return 1.0
+        days = pd.date_range(_naive(start_date).floor("D"), _naive(end_date).ceil("D"), inclusive="left", name="Date")
+        return pd.Series(1.0, index=days, name="Close")
 
     pair = f"USD{currency}=X"
+    # Look back a week so the first requested day has a prior rate to carry forward
+    start = pd.Timestamp(start_date) - pd.Timedelta(days=7)
     try:
-        historical_rates = {}
-        data = yf.Ticker(pair).history(start=start_date, end=end_date)
-        for i in range(len(data)):
-            date = data.index[i].strftime("%Y-%m-%d")
-            close_rate = float(data["Close"].iloc[i])
-            historical_rates[date] = close_rate
-        return historical_rates if historical_rates else None
+        rates = HISTORY.read(pair, start, end_date, "1d")["Close"]
     except Exception:
         return None
+    return rates if not rates.empty else None
+
+
+def _naive(value) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize(None) if ts.tzinfo is not None else ts
+
+
+def align_rates(rates: pd.Series, index: pd.DatetimeIndex) -> pd.Series:
+    """Align daily rates onto a (possibly intraday) price index, carrying the last known rate."""
+    days = index.tz_localize(None).normalize() if index.tz is not None else index.normalize()
+    aligned = rates.reindex(days, method="ffill").bfill()
+    return pd.Series(aligned.to_numpy(), index=index)
+
 
 # ========== Test ==========    
 if __name__ == "__main__":
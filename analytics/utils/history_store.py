@@ -0,0 +1,252 @@
+# ======================================================================
+# history_store.py
+# Local OHLCV history store: one memory-mapped NumPy file per symbol/interval
+# ======================================================================
+
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import market_data
+from .config import CACHE_DIR
+from .upstream import UPSTREAM, UpstreamError
+
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+Range = Tuple[int, int]  # [start, end) in epoch seconds
+
+
+# ======================================================================
+# UPSTREAM FETCH
+# ======================================================================
+def download_history(symbol: str, start: pd.Timestamp, end: pd.Timestamp, interval: str) -> pd.DataFrame:
+    """Fetch one OHLCV range from the market data provider."""
+    return UPSTREAM.call(market_data.PROVIDER.history, symbol, start, end, interval)
+
+
+def download_history_many(symbols: List[str], start: pd.Timestamp, end: pd.Timestamp, interval: str) -> Dict[str, pd.DataFrame]:
+    """Fetch one OHLCV range for several symbols in a single provider call."""
+    return UPSTREAM.call(market_data.PROVIDER.history_many, symbols, start, end, interval)
+
+
+# ======================================================================
+# RANGE HELPERS
+# ======================================================================
+def _to_seconds(ts) -> int:
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return int(ts.value // 10**9)
+
+
+def merge_ranges(ranges: List[Range]) -> List[Range]:
+    """Union of half-open ranges, sorted and coalesced."""
+    merged: List[Range] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_ranges(covered: List[Range], start: int, end: int) -> List[Range]:
+    """Parts of [start, end) not covered by the (merged) `covered` ranges."""
+    gaps, cursor = [], start
+    for c_start, c_end in covered:
+        if c_end <= cursor:
+            continue
+        if c_start >= end:
+            break
+        if c_start > cursor:
+            gaps.append((cursor, c_start))
+        cursor = max(cursor, c_end)
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+# ======================================================================
+# STORE
+# ======================================================================
+class HistoryStore:
+    """
+    Per symbol and interval, rows are kept sorted in a Fortran-ordered
+    float64 array [timestamp, open, high, low, close, volume] saved as .npy,
+    plus a JSON list of date ranges already fetched. Reads memory-map the
+    file and slice the requested range; only missing ranges go upstream.
+    Every range the provider answered is recorded as fetched, even with no
+    rows (holidays, before a listing): the provider raises instead when rows
+    were expected. While it is unavailable, reads return the rows stored.
+    """
+
+    def __init__(self, root: Path, fetch: Callable = download_history, fetch_many: Callable = download_history_many):
+        self.root = Path(root)
+        self.fetch = fetch
+        self.fetch_many = fetch_many
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    # ---------- Paths and locking ----------
+    def _dir(self, symbol: str, interval: str) -> Path:
+        safe = re.sub(r"[^A-Za-z0-9._-]", "_", symbol)
+        return self.root / interval / safe
+
+    def _lock(self, symbol: str, interval: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(f"{interval}/{symbol}", threading.Lock())
+
+    # ---------- Persistence ----------
+    def _load_coverage(self, path: Path) -> List[Range]:
+        try:
+            with open(path / "coverage.json") as f:
+                return [tuple(r) for r in json.load(f)]
+        except (FileNotFoundError, ValueError):
+            return []
+
+    def _load_rows(self, path: Path) -> Optional[np.ndarray]:
+        try:
+            return np.load(path / "data.npy", mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self, path: Path, rows: np.ndarray, coverage: List[Range]) -> None:
+        """Write rows, then coverage, each atomically via rename."""
+        path.mkdir(parents=True, exist_ok=True)
+        tmp = path / f"data.{os.getpid()}.{threading.get_ident()}.npy"
+        np.save(tmp, np.asfortranarray(rows))
+        os.replace(tmp, path / "data.npy")
+        tmp = path / f"coverage.{os.getpid()}.{threading.get_ident()}.json"
+        with open(tmp, "w") as f:
+            json.dump(coverage, f)
+        os.replace(tmp, path / "coverage.json")
+
+    # ---------- Public API ----------
+    def read(self, symbol: str, start, end, interval: str = "1d") -> pd.DataFrame:
+        """Return OHLCV rows in [start, end), fetching only uncovered ranges."""
+        start_s, end_s = _to_seconds(start), _to_seconds(end)
+        path = self._dir(symbol, interval)
+
+        gaps = missing_ranges(self._load_coverage(path), start_s, end_s)
+        if gaps:
+            with self._lock(symbol, interval):
+                # Another thread may have filled the gaps while we waited
+                gaps = missing_ranges(self._load_coverage(path), start_s, end_s)
+                if gaps:
+                    try:
+                        self._fill(symbol, interval, path, gaps)
+                    except UpstreamError as e:
+                        print(f"[history unavailable] {symbol}: {e}")
+                        UPSTREAM.count("served_stale")
+
+        return self._slice(path, start_s, end_s)
+
+    def read_many(self, symbols: List[str], start, end, interval: str = "1d") -> Dict[str, pd.DataFrame]:
+        """
+        `read` for several symbols. Symbols with gaps are fetched together in
+        one upstream call spanning the union of their gaps; each symbol the
+        provider answered for then records only its own gaps.
+        """
+        start_s, end_s = _to_seconds(start), _to_seconds(end)
+        symbols = list(dict.fromkeys(symbols))
+        gaps = {
+            s: missing_ranges(self._load_coverage(self._dir(s, interval)), start_s, end_s)
+            for s in symbols
+        }
+        stale = [s for s in symbols if gaps[s]]
+        if len(stale) == 1:
+            self.read(stale[0], start, end, interval)
+        elif stale:
+            window = (min(gaps[s][0][0] for s in stale), max(gaps[s][-1][1] for s in stale))
+            try:
+                frames = self.fetch_many(
+                    stale, pd.Timestamp(window[0], unit="s"), pd.Timestamp(window[1], unit="s"), interval
+                )
+            except UpstreamError as e:
+                print(f"[history unavailable] {stale}: {e}")
+                UPSTREAM.count("served_stale", len(stale))
+            else:
+                for s in stale:
+                    if s in frames:
+                        with self._lock(s, interval):
+                            self.merge(s, interval, [frames[s]], gaps[s])
+
+        return {s: self._slice(self._dir(s, interval), start_s, end_s) for s in symbols}
+
+    def version(self, symbols: List[str], interval: str = "1d") -> str:
+        """Changes whenever any of the symbols' stored rows are rewritten (from file mtimes)."""
+        stamps = []
+        for symbol in symbols:
+            try:
+                stamps.append(str((self._dir(symbol, interval) / "data.npy").stat().st_mtime_ns))
+            except FileNotFoundError:
+                stamps.append("0")
+        return "-".join(stamps)
+
+    def _fill(self, symbol: str, interval: str, path: Path, gaps: List[Range]) -> None:
+        """Fetch each gap; gaps answered before a failure are still stored."""
+        frames, answered = [], []
+        try:
+            for g_start, g_end in gaps:
+                frames.append(self.fetch(symbol, pd.Timestamp(g_start, unit="s"), pd.Timestamp(g_end, unit="s"), interval))
+                answered.append((g_start, g_end))
+        finally:
+            if answered:
+                self.merge(symbol, interval, frames, answered)
+
+    def merge(self, symbol: str, interval: str, frames: List[pd.DataFrame], fetched: List[Range]) -> None:
+        """Merge fetched frames into the stored rows and record `fetched` as covered."""
+        path = self._dir(symbol, interval)
+        existing = self._load_rows(path)
+        parts = [np.asarray(existing)] if existing is not None else []
+        for frame in frames:
+            if _has_rows(frame):
+                parts.append(_frame_to_rows(frame))
+        rows = np.concatenate(parts) if parts else np.empty((0, len(COLUMNS) + 1))
+
+        # Sort by timestamp; on duplicates keep the most recently fetched row
+        order = np.argsort(rows[:, 0], kind="stable")
+        rows = rows[order]
+        if len(rows):
+            keep = np.append(rows[1:, 0] != rows[:-1, 0], True)
+            rows = rows[keep]
+
+        # The current, still-forming period is never marked as covered
+        horizon = _to_seconds(pd.Timestamp.now("UTC").floor("D" if interval != "1h" else "h"))
+        coverage = [(s, min(e, horizon)) for s, e in fetched if s < horizon]
+        coverage = merge_ranges(self._load_coverage(path) + coverage)
+        self._save(path, rows, coverage)
+
+    def _slice(self, path: Path, start_s: int, end_s: int) -> pd.DataFrame:
+        rows = self._load_rows(path)
+        if rows is None or not len(rows):
+            return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], name="Date"))
+        stamps = rows[:, 0]
+        lo, hi = np.searchsorted(stamps, [start_s, end_s])
+        window = np.array(rows[lo:hi])
+        index = pd.to_datetime(window[:, 0].astype("int64"), unit="s")
+        return pd.DataFrame(window[:, 1:], index=index.rename("Date"), columns=COLUMNS)
+
+
+def _has_rows(frame: Optional[pd.DataFrame]) -> bool:
+    return frame is not None and not frame.empty
+
+
+def _frame_to_rows(frame: pd.DataFrame) -> np.ndarray:
+    """Convert a yFinance OHLCV frame into [timestamp, O, H, L, C, V] rows."""
+    index = frame.index
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    rows = np.empty((len(frame), len(COLUMNS) + 1))
+    rows[:, 0] = index.as_unit("ns").asi8 // 10**9
+    rows[:, 1:] = frame.reindex(columns=COLUMNS).to_numpy(dtype="float64")
+    return rows
+
+
+HISTORY = HistoryStore(CACHE_DIR / "history")
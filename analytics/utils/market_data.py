@@ -0,0 +1,378 @@
+# ======================================================================
+# market_data.py
+# Market data providers: the yFinance default and an offline synthetic
+# provider for load tests and benchmarks
+# ======================================================================
+
+import random
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from yfinance import shared as yf_shared
+from yfinance.exceptions import YFInvalidPeriodError, YFNotImplementedError, YFTzMissingError
+
+from .config import setting
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+class NoDataError(LookupError):
+    """The provider answered, but has no such symbol, interval or range."""
+
+
+class ProviderError(Exception):
+    """The provider returned nothing where data was expected (a swallowed download error)."""
+
+
+# Errors meaning "no such symbol or request" rather than "provider unavailable":
+# never retried. yFinance reports a delisted or unknown symbol as a missing timezone.
+PERMANENT_ERRORS = (NoDataError, YFTzMissingError, YFInvalidPeriodError, YFNotImplementedError)
+
+
+# ======================================================================
+# INTERFACE
+# ======================================================================
+class MarketDataProvider:
+    """
+    Everything the analytics utilities fetch from a market data service.
+    Implementations return yFinance-shaped data: `info` is a yFinance-style
+    info dict (quote fields included) or {} for an unknown ticker; history
+    frames have a DatetimeIndex and the COLUMNS columns.
+    """
+
+    name = "base"
+
+    def info(self, ticker: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def history(self, symbol: str, start: pd.Timestamp, end: pd.Timestamp, interval: str) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def history_many(self, symbols: List[str], start: pd.Timestamp, end: pd.Timestamp, interval: str) -> Dict[str, pd.DataFrame]:
+        return {symbol: self.history(symbol, start, end, interval) for symbol in symbols}
+
+    def fx_rates(self, currencies: Iterable[str]) -> Dict[str, float]:
+        """Latest USD->currency rates."""
+        raise NotImplementedError
+
+
+# ======================================================================
+# YFINANCE
+# ======================================================================
+class YFinanceProvider(MarketDataProvider):
+    name = "yfinance"
+
+    def info(self, ticker: str) -> Dict[str, Any]:
+        return yf.Ticker(ticker).info or {}
+
+    def history(self, symbol, start, end, interval):
+        """
+        One OHLCV range with flat column names. yf.download logs errors and
+        returns an empty frame, so an empty answer for a range that should
+        hold bars raises ProviderError and goes through the upstream retries.
+        """
+        data = yf.download(
+            symbol, start=start, end=end, interval=interval,
+            progress=False, multi_level_index=False,
+        )
+        if _failed(symbol, data):
+            if _rows_expected([symbol], start, end):
+                raise ProviderError(f"no data returned for {symbol} from {start} to {end}")
+            return pd.DataFrame(columns=COLUMNS)
+        return data
+
+    def history_many(self, symbols, start, end, interval):
+        """
+        One OHLCV range for several symbols in a single yFinance call.
+        Symbols that came back empty get an empty frame when their exchange
+        had no session in the range, and are left out otherwise; the call
+        fails only if none came back.
+        """
+        data = yf.download(
+            symbols, start=start, end=end, interval=interval,
+            group_by="ticker", progress=False, multi_level_index=True,
+        )
+        frames = {}
+        for symbol in symbols:
+            frame = None
+            if data is not None and symbol in data.columns.get_level_values(0):
+                # Symbols are outer-joined on one index; drop rows this one never traded
+                frame = data[symbol].dropna(how="all")
+            if not _failed(symbol, frame):
+                frames[symbol] = frame
+            elif not _rows_expected([symbol], start, end):
+                frames[symbol] = pd.DataFrame(columns=COLUMNS)
+        if symbols and not frames:
+            raise ProviderError(f"no data returned for {', '.join(symbols)} from {start} to {end}")
+        return frames
+
+    def fx_rates(self, currencies):
+        """Several currencies in one download."""
+        pairs = {f"USD{c}=X": c for c in currencies}
+        if not pairs:
+            return {}
+        data = yf.download(list(pairs), period="5d", interval="1d", progress=False)
+        closes = data["Close"].ffill().iloc[-1]
+        return {pairs[p]: float(r) for p, r in closes.items() if p in pairs and pd.notna(r)}
+
+
+def _failed(symbol: str, data: Optional[pd.DataFrame]) -> bool:
+    """Whether yf.download came back empty or recorded an error for the symbol (older releases)."""
+    return data is None or data.empty or symbol.upper() in getattr(yf_shared, "_ERRORS", {})
+
+
+def _exchange_code(symbol: str) -> Optional[str]:
+    """Exchange a yFinance symbol trades on, from its suffix; None for FX pairs and unknown suffixes."""
+    if symbol.endswith("=X"):
+        return None
+    if symbol.startswith("^"):
+        return "SNP"
+    _, dot, suffix = symbol.partition(".")
+    return SUFFIXES.get(dot + suffix, (None,))[0]
+
+
+def _rows_expected(symbols: List[str], start, end) -> bool:
+    """
+    Whether [start, end) holds a session completed before today for any of
+    the symbols, on its exchange's calendar (weekdays when unknown).
+    Weekends, holidays and today's session legitimately have no bars.
+    """
+    # Imported here: the calendar module reaches this one back through the FX rates
+    from .exchange_calendar import CALENDARS
+
+    first = _naive(start).normalize()
+    last = min(_naive(end), pd.Timestamp.now("UTC").tz_localize(None).normalize())
+    if first >= last:
+        return False
+    for symbol in symbols:
+        calendar = CALENDARS.get(_exchange_code(symbol))
+        if calendar is not None:
+            days = calendar.trading_days(first.date(), last.date())
+        else:
+            days = np.busday_count(first.date(), last.date())
+        if days > 0:
+            return True
+    return False
+
+
+def _naive(value) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_convert("UTC").tz_localize(None) if ts.tzinfo is not None else ts
+
+
+# ======================================================================
+# SYNTHETIC (OFFLINE)
+# ======================================================================
+# Ticker suffix -> (exchange code, currency), as yFinance reports them
+SUFFIXES = {
+    "": ("NMS", "USD"), ".L": ("LSE", "GBP"), ".T": ("TSE", "JPY"), ".TO": ("TOR", "CAD"),
+    ".PA": ("PAR", "EUR"), ".DE": ("FRA", "EUR"), ".AS": ("AMS", "EUR"), ".SW": ("SIX", "CHF"),
+    ".HK": ("HKG", "HKD"), ".AX": ("ASX", "AUD"), ".NS": ("NSE", "INR"),
+}
+# Starting level of each USD->currency pair
+FX_LEVELS = {
+    "GBP": 0.79, "EUR": 0.92, "JPY": 150.0, "CAD": 1.36, "CHF": 0.88, "HKD": 7.8, "AUD": 1.5,
+    "CNY": 7.2, "INR": 83.0, "DKK": 6.9, "SEK": 10.5, "NOK": 10.7, "BRL": 5.0, "MXN": 17.0,
+    "SGD": 1.35, "KRW": 1330.0, "ZAR": 18.5,
+}
+ORIGIN = pd.Timestamp("2000-01-03")  # every series starts here, so any range is reproducible
+TODAY = pd.Timestamp("2024-06-28")  # the market's "now" for quotes and spot FX, unless told otherwise
+HOURS_UTC = [13.5 + h for h in range(7)]  # bar starts of a US session in UTC
+
+
+class SyntheticProvider(MarketDataProvider):
+    """
+    Deterministic random-walk market: the same (seed, ticker) always gives
+    the same info and history, with no network. Plain tickers and the
+    SUFFIXES above are equities, "^..." indices, "USD<CCY>=X" FX pairs;
+    tickers in `invalid` (or containing digits) are unknown. Every call
+    sleeps `latency` plus up to `jitter` seconds and fails with
+    probability `error_rate`, to stand in for a real service under load.
+    Quotes and spot FX are the bars of `today` (a date, or a callable
+    returning one), so they do not drift with the wall clock.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, seed: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, invalid: Iterable[str] = (), today: Any = TODAY):
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.invalid = set(invalid)
+        self.today = today
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = {"info": 0, "history": 0, "fx_rates": 0}
+
+    # ---------- Simulated service ----------
+    def _request(self, kind: str) -> None:
+        with self._lock:
+            self.calls[kind] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise ConnectionError(f"synthetic {kind} request failed")
+
+    # ---------- Symbols ----------
+    def _describe(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """quoteType / exchange / currency plus walk parameters, or None if unknown."""
+        if ticker in self.invalid or any(c.isdigit() for c in ticker):
+            return None
+        if ticker.startswith("USD") and ticker.endswith("=X"):
+            currency = ticker[3:-2]
+            return {"quoteType": "CURRENCY", "exchange": "CCY", "currency": currency,
+                    "level": FX_LEVELS.get(currency, 1.0), "vol": 0.003, "drift": 0.0}
+        if ticker.startswith("^"):
+            return {"quoteType": "INDEX", "exchange": "SNP", "currency": "USD", "level": 1500.0, "vol": 0.011, "drift": 0.0002}
+        base, dot, suffix = ticker.partition(".")
+        if not base or (dot + suffix) not in SUFFIXES:
+            return None
+        exchange, currency = SUFFIXES[dot + suffix]
+        h = self._hash(ticker)
+        return {"quoteType": "EQUITY", "exchange": exchange, "currency": currency,
+                "level": 10.0 + h % 290, "vol": 0.01 + (h % 20) / 1000, "drift": 0.0002}
+
+    def _today(self) -> pd.Timestamp:
+        return pd.Timestamp(self.today() if callable(self.today) else self.today).normalize()
+
+    def _hash(self, ticker: str) -> int:
+        return zlib.crc32(f"{self.seed}:{ticker}".encode())
+
+    # ---------- Random walk ----------
+    def _rng(self, ticker: str, stream: int) -> np.random.Generator:
+        """One generator per ticker and component, so a longer series extends a shorter one."""
+        return np.random.default_rng([self.seed, self._hash(ticker), stream])
+
+    def _daily(self, ticker: str, meta: Dict[str, Any], until: pd.Timestamp) -> pd.DataFrame:
+        """Business-day OHLCV bars from ORIGIN through `until`."""
+        last = max(until, ORIGIN).normalize()
+        days = np.arange(ORIGIN.date(), (last + pd.Timedelta(days=1)).date(), dtype="datetime64[D]")
+        index = pd.DatetimeIndex(days[np.is_busday(days)].astype("datetime64[ns]"))
+        n, vol = len(index), meta["vol"]
+        close = meta["level"] * np.exp(np.cumsum(self._rng(ticker, 0).normal(meta["drift"], vol, n)))
+        open_ = np.concatenate(([meta["level"]], close[:-1])) * np.exp(self._rng(ticker, 1).normal(0, vol / 3, n))
+        wick = np.abs(self._rng(ticker, 2).normal(0, vol / 2, (n, 2)))
+        high = np.maximum(open_, close) * (1 + wick[:, 0])
+        low = np.minimum(open_, close) * (1 - wick[:, 1])
+        volume = np.round(self._rng(ticker, 3).lognormal(13, 0.5, n))
+        return pd.DataFrame(
+            {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume}, index=index
+        )
+
+    def _hourly(self, ticker: str, meta: Dict[str, Any], daily: pd.DataFrame) -> pd.DataFrame:
+        """Seven UTC-stamped bars per day, wandering from the day's open to its close."""
+        days, n = len(daily), len(HOURS_UTC)
+        t = np.arange(1, n + 1) / n
+        log_open, log_close = np.log(daily["Open"].to_numpy()), np.log(daily["Close"].to_numpy())
+        noise = np.cumsum(self._rng(ticker, 4).normal(0, meta["vol"] / np.sqrt(n), (days, n)), axis=1)
+        bridge = noise - noise[:, -1:] * t  # zero at the last bar, which closes at the day's close
+        close = np.exp(log_open[:, None] + t * (log_close - log_open)[:, None] + bridge)
+        open_ = np.concatenate((np.exp(log_open)[:, None], close[:, :-1]), axis=1)
+        wick = np.abs(self._rng(ticker, 5).normal(0, meta["vol"] / 10, (days, n, 2)))
+        stamps = daily.index.values[:, None] + (np.array(HOURS_UTC) * 3600e9).astype("timedelta64[ns]")
+        return pd.DataFrame(
+            {
+                "Open": open_.ravel(),
+                "High": (np.maximum(open_, close) * (1 + wick[..., 0])).ravel(),
+                "Low": (np.minimum(open_, close) * (1 - wick[..., 1])).ravel(),
+                "Close": close.ravel(),
+                "Volume": np.repeat(daily["Volume"].to_numpy() / n, n),
+            },
+            index=pd.DatetimeIndex(stamps.ravel()).tz_localize("UTC"),
+        )
+
+    # ---------- Provider API ----------
+    def info(self, ticker):
+        self._request("info")
+        meta = self._describe(ticker)
+        if meta is None:
+            return {}
+        bar = self._daily(ticker, meta, self._today()).iloc[-1]
+        spread = bar["Close"] * 0.0005
+        return {
+            "symbol": ticker, "quoteType": meta["quoteType"], "exchange": meta["exchange"],
+            "currency": meta["currency"], "regularMarketOpen": float(bar["Open"]),
+            "regularMarketPrice": float(bar["Close"]), "bid": float(bar["Close"] - spread),
+            "ask": float(bar["Close"] + spread), "volume": int(bar["Volume"]),
+        }
+
+    def history(self, symbol, start, end, interval):
+        return self.history_many([symbol], start, end, interval)[symbol]
+
+    def history_many(self, symbols, start, end, interval):
+        self._request("history")
+        if interval not in ("1h", "1d", "5d", "1wk"):
+            raise NoDataError(f"Unsupported interval '{interval}'")
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        frames = {}
+        for symbol in symbols:
+            meta = self._describe(symbol)
+            if meta is None:
+                frames[symbol] = pd.DataFrame(columns=COLUMNS)
+                continue
+            data = self._daily(symbol, meta, end)
+            if interval == "1h":
+                data = self._hourly(symbol, meta, data)
+                index = data.index.tz_localize(None)
+            else:
+                if interval != "1d":
+                    rule = "W-MON" if interval == "1wk" else "5B"
+                    data = data.resample(rule, label="left", closed="left").agg(
+                        {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+                    ).dropna()
+                index = data.index
+            frames[symbol] = data[(index >= start) & (index < end)]
+        return frames
+
+    def fx_rates(self, currencies):
+        self._request("fx_rates")
+        today = self._today()
+        rates = {}
+        for currency in currencies:
+            pair = f"USD{currency}=X"
+            rates[currency] = float(self._daily(pair, self._describe(pair), today)["Close"].iloc[-1])
+        return rates
+
+
+# ======================================================================
+# FACTORY
+# ======================================================================
+def build_provider() -> MarketDataProvider:
+    """
+    Provider from the MARKET_DATA_PROVIDER setting, e.g. {"BACKEND": "yfinance"}
+    or {"BACKEND": "synthetic", "SEED": 0, "LATENCY_SECONDS": 0.05,
+    "JITTER_SECONDS": 0.02, "ERROR_RATE": 0.0, "TODAY": "2024-06-28"}.
+    """
+    config = setting("MARKET_DATA_PROVIDER", {})
+    backend = config.get("BACKEND", "yfinance")
+    if backend == "yfinance":
+        return YFinanceProvider()
+    if backend == "synthetic":
+        return SyntheticProvider(
+            seed=config.get("SEED", 0),
+            latency=config.get("LATENCY_SECONDS", 0.0),
+            jitter=config.get("JITTER_SECONDS", 0.0),
+            error_rate=config.get("ERROR_RATE", 0.0),
+            today=config.get("TODAY", TODAY),
+        )
+    raise ValueError(f"Unknown market data provider '{backend}'")
+
+
+# The active provider; call sites read it through this module so it can be swapped
+PROVIDER: MarketDataProvider = build_provider()
+
+
+def set_provider(provider: MarketDataProvider) -> MarketDataProvider:
+    """Make `provider` the active one (e.g. for a benchmark); returns the previous one."""
+    global PROVIDER
+    previous, PROVIDER = PROVIDER, provider
+    return previous
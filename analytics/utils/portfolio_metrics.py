@@ -1,4 +1,8 @@
-from .quotes_api import lookup
+import numpy as np
+import pandas as pd
+
+from .price_matrix import PriceMatrix
+from .quotes_api import lookup_many
 
 # ========================================================================
 # Portfolio Retrieval
@@ -28,45 +32,120 @@ def get_transactions(db, strategy_id):
         d.setdefault(t["ticker"], []).append((t["price"], t["shares"]))
     return buys, sells
 
+# ==========================================================================
+# Batched Loading
+# ==========================================================================
+SQL_CHUNK = 900  # stay well below SQLite's bound-parameter limit
+
+
+def _read_for_strategies(db, sql, strategy_ids, columns):
+    """Run `sql` (with an IN placeholder) over strategy ids in chunks into one DataFrame."""
+    strategy_ids = list(dict.fromkeys(strategy_ids))
+    frames = []
+    for i in range(0, len(strategy_ids), SQL_CHUNK):
+        chunk = strategy_ids[i:i + SQL_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        rows = db.execute(sql.format(ids=placeholders), chunk).fetchall()
+        frames.append(pd.DataFrame([tuple(r) for r in rows], columns=columns))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+def load_positions(db, strategy_ids):
+    return _read_for_strategies(
+        db,
+        "SELECT strategy_id, ticker, shares FROM portfolio WHERE strategy_id IN ({ids})",
+        strategy_ids,
+        ["strategy_id", "ticker", "shares"],
+    )
+
+
+def load_transactions(db, strategy_ids):
+    return _read_for_strategies(
+        db,
+        "SELECT strategy_id, ticker, type, price, shares FROM transactions WHERE strategy_id IN ({ids})",
+        strategy_ids,
+        ["strategy_id", "ticker", "type", "price", "shares"],
+    )
+
+
 # ==========================================================================
 # Portfolio Metrics Computation
 # ==========================================================================
-def compute_metrics(db, strategy_id):
-    portfolio = get_portfolio(db, strategy_id)
-    buys, sells = get_transactions(db, strategy_id)
+METRIC_COLUMNS = [
+    "ticker", "shares", "price", "share_value",
+    "weighted_price", "stock_return", "portfolio_contribution",
+]
+
 
-    equity_value = 0.0
-    results = []
+def compute_metrics_frame(positions, transactions, prices):
+    """
+    Vectorized metrics for any number of strategies.
+    `positions` and `transactions` are frames as returned by the loaders,
+    `prices` maps ticker -> USD price. Returns one row per held position.
+    """
+    df = positions.astype({"shares": float})
+    df = df[df["shares"] > 0].reset_index(drop=True)
 
-    for ticker, shares in portfolio.items():
-        if shares <= 0:
-            continue
+    # Net spend per (strategy, ticker): buys add, sells subtract
+    tx = transactions
+    sign = np.where(tx["type"].to_numpy() == "buy", 1.0, -1.0)
+    spend = pd.Series(
+        sign * tx["price"].to_numpy(dtype=float) * tx["shares"].to_numpy(dtype=float),
+        index=pd.MultiIndex.from_arrays([tx["strategy_id"], tx["ticker"]]),
+    ).groupby(level=[0, 1]).sum()
+    key = pd.MultiIndex.from_arrays([df["strategy_id"], df["ticker"]])
+    net_spend = spend.reindex(key).fillna(0.0).to_numpy()
 
-        quote = lookup(ticker)
-        price = float(quote["price"]) if quote and "price" in quote else 0.0
-        share_value = shares * price
-        equity_value += share_value
+    shares = df["shares"].to_numpy()
+    price = df["ticker"].map(prices).astype(float).fillna(0.0).to_numpy()
+    share_value = shares * price
+    weighted_price = net_spend / shares
+    with np.errstate(divide="ignore", invalid="ignore"):
+        stock_return = np.where(weighted_price != 0, (price - weighted_price) / weighted_price, 0.0)
+        equity = df.assign(v=share_value).groupby("strategy_id")["v"].transform("sum").to_numpy()
+        contribution = np.where(equity != 0, share_value / equity, 0.0)
 
-        total_buys = sum(p * s for p, s in buys.get(ticker, []))
-        total_sells = sum(p * s for p, s in sells.get(ticker, []))
-        net_spend = total_buys - total_sells
-        weighted_price = (net_spend / shares) if shares else 0.0
-        stock_return = ((price - weighted_price) / weighted_price) if weighted_price else 0.0
+    return df.assign(
+        price=price,
+        share_value=share_value,
+        weighted_price=weighted_price,
+        stock_return=stock_return,
+        portfolio_contribution=contribution,
+    )
 
-        results.append({
-            "ticker": ticker,
-            "shares": shares,
-            "price": price,
-            "share_value": share_value,
-            "weighted_price": weighted_price,
-            "stock_return": stock_return,
-        })
 
-    # Compute contributions in one pass
-    for r in results:
-        r["portfolio_contribution"] = r["share_value"] / equity_value if equity_value else 0
+def compute_metrics_batch(db, strategy_ids, prices=None):
+    """
+    Metrics for many strategies in one pass: {strategy_id: {"portfolio", "equity_value"}}.
+    Prices are looked up once per distinct ticker unless `prices` is given,
+    either as {ticker: price} or as a PriceMatrix (its latest row is used).
+    """
+    positions = load_positions(db, strategy_ids)
+    transactions = load_transactions(db, strategy_ids)
+    if isinstance(prices, PriceMatrix):
+        prices = prices.latest()
+    if prices is None:
+        held = positions.loc[positions["shares"].astype(float) > 0, "ticker"].unique().tolist()
+        quotes = lookup_many(held)
+        prices = {t: q.get("price") or 0.0 for t, q in zip(held, quotes)}
 
-    return {"portfolio": results, "equity_value": equity_value}
+    frame = compute_metrics_frame(positions, transactions, prices)
+    equity = frame.groupby("strategy_id")["share_value"].sum()
+    results = {
+        sid: {"portfolio": [], "equity_value": float(equity.get(sid, 0.0))}
+        for sid in strategy_ids
+    }
+    # One conversion for all rows, then a plain Python split by strategy
+    records = frame[METRIC_COLUMNS].to_dict("records")
+    for sid, record in zip(frame["strategy_id"].tolist(), records):
+        results[sid]["portfolio"].append(record)
+    return results
+
+
+def compute_metrics(db, strategy_id):
+    # Keeps the single-strategy contract, including the empty-portfolio error
+    get_portfolio(db, strategy_id)
+    return compute_metrics_batch(db, [strategy_id])[strategy_id]
 
 
 # ========== Test ==========
@@ -79,8 +158,3 @@ if __name__ == "__main__":
     portfolio = get_portfolio(db, strategy_id)
     close_db(db)
     print(portfolio)
-
-# Add volatility, drawdown, max drawdown calculations here as needed.
-# Add sharpe ratio, sortino ratio calculations here as needed.
-# Add alpha, beta calculations here as needed.
-# Add CAGR calculations here as needed.
\ No newline at end of file
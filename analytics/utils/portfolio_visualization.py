@@ -1,103 +1,86 @@
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.io as pio
 
-
-from .quotes_api import get_historic_data
+from .chart_renderer import IMAGES, render_cached
 from .portfolio_metrics import get_portfolio
+from .price_matrix import build_price_matrix
 
-from ..models import Portfolio
+# ==========================================================================
+# Aligned Portfolio Values
+# ==========================================================================
+def _portfolio_frame(matrix, portfolio, index):
+    """
+    Value of each position and their "total" on the matrix calendar, plus
+    the index prices, from the first row where every position has a price
+    (later listings, holidays on other exchanges). Raises only for tickers
+    with no price at all in the range.
+    """
+    held = matrix.select(portfolio)
+    missing = [t for t, has_data in zip(held.tickers, (~np.isnan(held.values)).any(axis=0)) if not has_data]
+    if missing:
+        raise ValueError(f"No price history for {missing} in the selected range.")
+    start = held.first_complete()
+    if start >= len(matrix.index):
+        raise ValueError("No overlapping price history for the selected tickers.")
+
+    values = held.values[start:]
+    shares = np.array([portfolio[t] for t in held.tickers])
+    portfolio_df = pd.DataFrame(values * shares, index=matrix.index[start:], columns=list(held.tickers))
+    portfolio_df["total"] = values @ shares
+    return portfolio_df, matrix.column(index).iloc[start:]
 
 # ==========================================================================
 # Display Individual Stock Prices
 # ==========================================================================
-def display_stocks(db, strategy_id, start_date, end_date, freq):
+def display_stocks(db, strategy_id, start_date, end_date, freq, matrix=None, fmt="png"):
+    """({ticker: price series}, path of the rendered chart image)."""
     portfolio = get_portfolio(db, strategy_id)
+    if matrix is None:
+        matrix = build_price_matrix(portfolio, start_date, end_date, freq)
 
-    portfolio_data = {}
-    for ticker in portfolio.keys():
-        portfolio_data[ticker] = get_historic_data(ticker, start_date, end_date, freq)["Close"]
+    portfolio_data = {ticker: matrix.column(ticker).dropna() for ticker in portfolio}
 
-    # Plotting stocks (ignore index) 
-    plt.figure(figsize=(10, 5))
-    for ticker, data in portfolio_data.items():
-        plt.plot(data.index, data, label=ticker)
-    
-    # Formatting
-    plt.title("Portfolio Stocks Over Time")
-    plt.xlabel("Date")
-    plt.ylabel("Price")
-    plt.legend()
-    plt.grid(False)
-    plt.tight_layout()
-
-    # plt.savefig("data/portfolio_plot.png")
-    return portfolio_data
+    # Plotting stocks into the image cache (headless, no pyplot state)
+    spec = stocks_chart_data(matrix, portfolio, points=1000)
+    key, _ = render_cached({**spec, "format": fmt, "width": 1000, "height": 500})
+    return portfolio_data, IMAGES.path(key, fmt)
 
 # ==========================================================================
 # Display Portfolio Performance vs Index
 # ==========================================================================
-def display_portfolio(db, strategy_id, index, start_date, end_date, freq):
+def display_portfolio(db, strategy_id, index, start_date, end_date, freq, matrix=None, fmt="png"):
+    """(position values and their "total", path of the rendered chart image)."""
     portfolio = get_portfolio(db, strategy_id)
-    index_data = get_historic_data(index, start_date, end_date, freq)["Close"]
-
-    portfolio_df = pd.DataFrame(index=index_data.index)
-    total_value_series = pd.Series(0, index=index_data.index)
-
-    length = {}
-    for ticker in portfolio.keys():
-        stock_data = get_historic_data(ticker, start_date, end_date, freq)["Close"]
-        stock_value = stock_data * portfolio[ticker]
-        total_value_series += stock_value
-        portfolio_df[ticker] = stock_value
-        length[ticker] = len(stock_data)
-        if length[ticker] < len(index_data):
-            index_data = index_data[len(index_data) - length[ticker]:]
-
-    # Check for data length mismatch
-    if len(index_data) < len(total_value_series):
-        new_date = index_data.index[0].strftime("%Y-%m-%d")
-        culprit = [ticker for ticker in portfolio.keys() if length[ticker] < len(total_value_series)]
-        raise ValueError(f"Data length mismatch for {culprit}. Hint: input start date later than {new_date}.")
-
-    # Normalizing data
-    portfolio_norm = total_value_series / total_value_series.iloc[0] * 100
-    index_norm = index_data / index_data.iloc[0] * 100
-    portfolio_df["total"] = total_value_series
-
-    # Plotting index and portfolio average
-    plt.figure(figsize=(10, 5))
-    plt.plot(index_data.index, index_norm, label=index, color='black')
-    plt.plot(index_data.index, portfolio_norm, label="Portfolio Average", color='blue')
-
-    # Formatting
-    plt.title("Portfolio Average vs Index Over Time")
-    plt.xlabel("Date")
-    plt.ylabel("Price")
-    plt.legend()
-    plt.grid(False)
-    plt.tight_layout()
+    if matrix is None:
+        matrix = build_price_matrix([index, *portfolio], start_date, end_date, freq)
+    portfolio_df, _ = _portfolio_frame(matrix, portfolio, index)
 
-    # plt.savefig("data/portfolio_average_plot.png")
-    return portfolio_df
+    # Plotting index and portfolio average into the image cache
+    spec = portfolio_chart_data(matrix, portfolio, index, points=1000)
+    spec["series"][0]["color"], spec["series"][1]["color"] = "black", "blue"
+    key, _ = render_cached({**spec, "format": fmt, "width": 1000, "height": 500})
+    return portfolio_df, IMAGES.path(key, fmt)
 
 # ==========================================================================
 # Display Individual Stock Prices
 # ==========================================================================
-def display_stocks_plotly(db, strategy_id, start_date, end_date, freq):
+def display_stocks_plotly(db, strategy_id, start_date, end_date, freq, matrix=None, points=None):
     portfolio = get_portfolio(db, strategy_id)
+    if matrix is None:
+        matrix = build_price_matrix(portfolio, start_date, end_date, freq)
 
-    portfolio_data = {}
-    for ticker in portfolio.keys():
-        portfolio_data[ticker] = get_historic_data(ticker, start_date, end_date, freq)["Close"]
+    portfolio_data = {ticker: matrix.column(ticker).dropna() for ticker in portfolio}
 
     # Create Plotly figure
     fig = go.Figure()
     for ticker, data in portfolio_data.items():
+        # Down to about `points` (e.g. the chart's pixel width) when given
+        x, y = downsample_series(data.index, data.to_numpy(), points)
         fig.add_trace(go.Scatter(
-            x=data.index,
-            y=data.values,
+            x=x,
+            y=y,
             mode="lines",
             name=ticker
         ))
@@ -119,31 +102,23 @@ def display_stocks_plotly(db, strategy_id, start_date, end_date, freq):
 # ==========================================================================
 # Display Portfolio Performance vs Index
 # ==========================================================================
-def display_portfolio_plotly(db, strategy_id, index, start_date, end_date, freq):
+def display_portfolio_plotly(db, strategy_id, index, start_date, end_date, freq, matrix=None, points=None):
     portfolio = get_portfolio(db, strategy_id)
-    index_data = get_historic_data(index, start_date, end_date, freq)["Close"]
-
-    portfolio_df = pd.DataFrame(index=index_data.index)
-    total_value_series = pd.Series(0, index=index_data.index)
-
-    length = {}
-    for ticker in portfolio.keys():
-        stock_data = get_historic_data(ticker, start_date, end_date, freq)["Close"]
-        stock_value = stock_data * portfolio[ticker]
-        total_value_series += stock_value
-        portfolio_df[ticker] = stock_value
-        length[ticker] = len(stock_data)
-        if length[ticker] < len(index_data):
-            index_data = index_data[len(index_data) - length[ticker]:]
+    if matrix is None:
+        matrix = build_price_matrix([index, *portfolio], start_date, end_date, freq)
+    portfolio_df, index_data = _portfolio_frame(matrix, portfolio, index)
+    total_value_series = portfolio_df["total"]
 
     # Normalize data
     portfolio_norm = total_value_series / total_value_series.iloc[0] * 100
-    index_norm = index_data / index_data.iloc[0] * 100
+    index_norm = index_data / index_data.dropna().iloc[0] * 100
 
     # Plotly figure
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=index_data.index, y=index_norm, name=index, line=dict(color="gray")))
-    fig.add_trace(go.Scatter(x=index_data.index, y=portfolio_norm, name="Portfolio", line=dict(color="blue")))
+    x, y = downsample_series(index_data.index, index_norm.to_numpy(), points)
+    fig.add_trace(go.Scatter(x=x, y=y, name=index, line=dict(color="gray")))
+    x, y = downsample_series(portfolio_norm.index, portfolio_norm.to_numpy(), points)
+    fig.add_trace(go.Scatter(x=x, y=y, name="Portfolio", line=dict(color="blue")))
 
     fig.update_layout(
         title="Portfolio vs Index Over Time",
@@ -158,16 +133,148 @@ def display_portfolio_plotly(db, strategy_id, index, start_date, end_date, freq)
     return graph_html
 
 
+# ==========================================================================
+# Downsampling
+# ==========================================================================
+# Multi-year hourly series have far more points than a chart has pixels.
+# Both methods below are vectorized over all buckets at once and always keep
+# the first, last, lowest and highest points.
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def _first_max_per_bucket(values, bucket, starts):
+    """Index of the first maximum of `values` within each contiguous bucket."""
+    peaks = np.maximum.reduceat(values, starts)
+    hits = np.flatnonzero(values == peaks[bucket])
+    _, first = np.unique(bucket[hits], return_index=True)
+    return hits[first]
+
+
+def _as_numbers(x):
+    """x as float64; datetimes (naive, aware or datetime64) become epoch nanoseconds."""
+    x = np.asarray(x)
+    if x.dtype == object or np.issubdtype(x.dtype, np.datetime64):
+        return pd.DatetimeIndex(x).asi8.astype("float64")
+    return x.astype("float64")
+
+
+def lttb_indices(x, y, points):
+    """
+    Largest-Triangle-Three-Buckets. Interior points are split into
+    `points - 2` buckets and each keeps the point forming the largest
+    triangle with its neighbours. Neighbours are the previous and next
+    bucket averages, rather than the previously chosen point, which is what
+    lets every bucket be solved in one array pass.
+    """
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x = _as_numbers(x)
+    x -= x[0]
+    y = np.asarray(y, dtype="float64")
+
+    edges = 1 + np.linspace(0, n - 2, points - 1).astype(np.int64)
+    starts, counts = edges[:-1] - 1, np.diff(edges)
+    bucket = np.repeat(np.arange(points - 2), counts)
+    mean_x = np.add.reduceat(x[1:-1], starts) / counts
+    mean_y = np.add.reduceat(y[1:-1], starts) / counts
+
+    prev_x = np.concatenate(([x[0]], mean_x[:-1]))[bucket]
+    prev_y = np.concatenate(([y[0]], mean_y[:-1]))[bucket]
+    next_x = np.concatenate((mean_x[1:], [x[-1]]))[bucket]
+    next_y = np.concatenate((mean_y[1:], [y[-1]]))[bucket]
+    px, py = x[1:-1], y[1:-1]
+    area = np.abs((prev_x - next_x) * (py - prev_y) - (prev_x - px) * (next_y - prev_y))
+
+    chosen = _first_max_per_bucket(area, bucket, starts) + 1
+    return np.concatenate(([0], chosen, [n - 1]))
+
+
+def minmax_indices(y, points):
+    """Lowest and highest point of each of `points // 2` buckets (min/max per pixel)."""
+    n = len(y)
+    if points >= n or points < 4:
+        return np.arange(n)
+    y = np.asarray(y, dtype="float64")
+    starts = np.linspace(0, n, points // 2 + 1).astype(np.int64)[:-1]
+    bucket = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    highs = _first_max_per_bucket(y, bucket, starts)
+    lows = _first_max_per_bucket(-y, bucket, starts)
+    return np.unique(np.concatenate(([0], lows, highs, [n - 1])))
+
+
+def downsample_series(x, y, points, method="lttb"):
+    """
+    Reduce one series to about `points` (x, y) pairs, e.g. the chart width
+    in pixels. Missing values are dropped first.
+    """
+    x, y = np.asarray(x), np.asarray(y, dtype="float64")
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    if not points or len(y) <= points:
+        return x, y
+    if method == "lttb":
+        keep = np.union1d(lttb_indices(x, y, int(points)), [y.argmin(), y.argmax()])
+    elif method == "minmax":
+        keep = minmax_indices(y, int(points))
+    else:
+        raise ValueError(f"Unknown downsampling method: choose from {list(DOWNSAMPLE_METHODS)}.")
+    return x[keep], y[keep]
+
+
+# ==========================================================================
+# JSON Chart Payloads
+# ==========================================================================
+# Compact series for the client to draw with one cached plotly.js asset,
+# instead of an HTML fragment embedding the library and every point.
+# Full series share one epoch-ms "x"; downsampled series carry their own.
+def _series(values):
+    rounded = np.round(np.asarray(values, dtype="float64"), 4)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
+
+
+def _chart_payload(title, y_title, index, columns, points=None, method="lttb"):
+    x = index.as_unit("ms").asi8
+    payload = {"title": title, "y_title": y_title}
+    if not points or len(x) <= points:
+        payload["x"] = x.tolist()
+        payload["series"] = [{"name": name, "y": _series(y)} for name, y in columns.items()]
+        return payload
+
+    payload["series"] = []
+    for name, y in columns.items():
+        sx, sy = downsample_series(x, y, points, method)
+        payload["series"].append({"name": name, "x": sx.tolist(), "y": _series(sy)})
+    return payload
+
+
+def stocks_chart_data(matrix, portfolio, points=None, method="lttb"):
+    columns = {ticker: matrix.values[:, matrix.tickers.index(ticker)] for ticker in portfolio}
+    return _chart_payload("Portfolio Stocks Over Time", "Price", matrix.index, columns, points, method)
+
+
+def portfolio_chart_data(matrix, portfolio, index, points=None, method="lttb"):
+    portfolio_df, index_data = _portfolio_frame(matrix, portfolio, index)
+    total = portfolio_df["total"].to_numpy()
+    columns = {
+        index: index_data.to_numpy() / index_data.dropna().iloc[0] * 100,
+        "Portfolio": total / total[0] * 100,
+    }
+    return _chart_payload("Portfolio vs Index Over Time", "Normalized Value", portfolio_df.index, columns, points, method)
+
+
 # ========== Test ==========
 if __name__ == "__main__":
     import os, sys
     sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from ...helpers.setup import get_db, close_db
     db = get_db()
     strategy_id = 1
     start_date = "2020-09-30"
     end_date = "2023-01-01"
     index = "^GSPC"
     freq = "1d"
-    display_stocks(db, strategy_id, start_date, end_date, freq)
-    display_portfolio(db, strategy_id, index, start_date, end_date, freq)
+    _, stocks_image = display_stocks(db, strategy_id, start_date, end_date, freq)
+    _, portfolio_image = display_portfolio(db, strategy_id, index, start_date, end_date, freq)
+    print(f"Charts: {stocks_image}, {portfolio_image}")
     close_db(db)
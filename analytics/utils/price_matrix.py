@@ -0,0 +1,165 @@
+# ======================================================================
+# price_matrix.py
+# Aligned (dates × tickers) USD price matrix shared by charts, metrics and backtests
+# ======================================================================
+
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .config import setting
+from .exchange_rates_api import EXCHANGES, align_rates
+from .history_store import HISTORY
+from .quote_cache import LRUCache
+from .quotes_api import symbol_metadata
+
+FREQUENCIES = ("1h", "1d", "5d", "1wk")
+DAILY_FREQUENCIES = ("1d", "5d", "1wk")
+FX_LOOKBACK = pd.Timedelta(days=7)  # so the first day has a prior rate to carry forward
+MATRICES = LRUCache(max_entries=32, ttl=setting("PRICE_MATRIX_TTL_SECONDS", 300))
+
+
+# ======================================================================
+# MATRIX
+# ======================================================================
+class PriceMatrix(NamedTuple):
+    """
+    `values[t, j]` is the USD price of `tickers[j]` at `index[t]`, on the
+    union calendar of all tickers. Rules:
+    - a missing bar after a ticker's first one carries the last price forward
+      (up to `max_fill` rows, if set), and `observed` is False there;
+    - rows before a ticker's first bar stay NaN.
+    Both arrays are read-only, so one matrix can be shared freely.
+    """
+
+    index: pd.DatetimeIndex
+    tickers: Tuple[str, ...]
+    values: np.ndarray
+    observed: np.ndarray
+
+    def column(self, ticker: str) -> pd.Series:
+        return pd.Series(self.values[:, self.tickers.index(ticker)], index=self.index, name=ticker)
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.values, index=self.index, columns=list(self.tickers))
+
+    def first_complete(self) -> int:
+        """First row where every ticker has a price (len(index) if none)."""
+        complete = ~np.isnan(self.values).any(axis=1)
+        return int(complete.argmax()) if complete.any() else len(self.index)
+
+    def complete(self) -> "PriceMatrix":
+        """Rows from the first one where every ticker has a price."""
+        start = self.first_complete()
+        return PriceMatrix(self.index[start:], self.tickers, self.values[start:], self.observed[start:])
+
+    def select(self, tickers: Iterable[str]) -> "PriceMatrix":
+        """Columns for `tickers`, in that order."""
+        tickers = tuple(tickers)
+        cols = [self.tickers.index(t) for t in tickers]
+        return PriceMatrix(self.index, tickers, self.values[:, cols], self.observed[:, cols])
+
+    def latest(self) -> Dict[str, float]:
+        """Last known price per ticker."""
+        return {t: float(v) for t, v in zip(self.tickers, self.values[-1]) if not np.isnan(v)} if len(self.index) else {}
+
+    def value(self, shares: Dict[str, float]) -> pd.Series:
+        """Value of holding `shares` (ticker -> count) at every row."""
+        weights = np.array([float(shares.get(t, 0.0)) for t in self.tickers])
+        held = weights != 0
+        return pd.Series(self.values[:, held] @ weights[held], index=self.index, name="value")
+
+
+# ======================================================================
+# BUILD
+# ======================================================================
+def _calendar(index: pd.DatetimeIndex, freq: str) -> pd.DatetimeIndex:
+    """
+    Stored timestamps are naive UTC. A daily bar is stamped at local midnight,
+    which lands up to ±12h from UTC midnight, so daily bars are rounded to the
+    nearest day to line up across exchanges.
+    """
+    return index.round("D") if freq in DAILY_FREQUENCIES else index
+
+
+def _usd_rates(currencies: Iterable[str], start, end) -> Dict[str, pd.Series]:
+    """Daily USD->currency closes for each currency, in one batched history read."""
+    pairs = {f"USD{c}=X": c for c in currencies}
+    if not pairs:
+        return {}
+    frames = HISTORY.read_many(list(pairs), pd.Timestamp(start) - FX_LOOKBACK, end, "1d")
+    rates = {}
+    for pair, currency in pairs.items():
+        closes = frames[pair]["Close"].dropna()
+        if closes.empty:
+            raise RuntimeError(f"No exchange rates available for {currency}")
+        rates[currency] = closes
+    return rates
+
+
+def build_price_matrix(
+    tickers: Iterable[str],
+    start_date,
+    end_date,
+    freq: str = "1d",
+    field: str = "Close",
+    max_fill: Optional[int] = None,
+) -> PriceMatrix:
+    """
+    Dense USD price matrix for `tickers` over [start_date, end_date).
+    History comes from the local store with every missing range fetched in
+    one batched call (plus one for FX); results are cached for a few minutes.
+    """
+    tickers = tuple(dict.fromkeys(tickers))
+    if freq not in FREQUENCIES:
+        raise ValueError("Unsupported frequency: choose from '1h', '1d', '5d', '1wk'.")
+    key = repr((tickers, str(start_date), str(end_date), freq, field, max_fill))
+    cached = MATRICES.get(key)
+    if cached is not None:
+        return cached
+
+    currencies = {}
+    for ticker in tickers:
+        exchange_code = symbol_metadata(ticker).get("exchange")
+        if exchange_code not in EXCHANGES:
+            raise ValueError(f"Unknown exchange '{exchange_code}' for {ticker}")
+        currencies[ticker] = EXCHANGES[exchange_code]["currency"]
+
+    frames = HISTORY.read_many(list(tickers), start_date, end_date, freq)
+    rates = _usd_rates({c for c in currencies.values() if c != "USD"}, start_date, end_date)
+
+    columns = {}
+    for ticker in tickers:
+        series = frames[ticker][field].dropna()
+        if currencies[ticker] != "USD" and not series.empty:
+            series = series / align_rates(rates[currencies[ticker]], series.index)
+        series.index = _calendar(series.index, freq)
+        columns[ticker] = series[~series.index.duplicated(keep="last")]
+
+    # Union calendar, then scatter each ticker's observations into its column
+    index = pd.DatetimeIndex(sorted(set().union(*(s.index for s in columns.values()))), name="Date")
+    values = np.full((len(index), len(tickers)), np.nan)
+    for j, series in enumerate(columns.values()):
+        values[index.get_indexer(series.index), j] = series.to_numpy(dtype="float64")
+    observed = ~np.isnan(values)
+
+    # Forward fill: each cell reads the latest observed row at or above it
+    rows = np.arange(len(index))[:, None]
+    last = np.maximum.accumulate(np.where(observed, rows, 0), axis=0)
+    values = np.take_along_axis(values, last, axis=0)
+    if max_fill is not None:
+        values[rows - last > max_fill] = np.nan
+
+    values.flags.writeable = False
+    observed.flags.writeable = False
+    matrix = PriceMatrix(index, tickers, values, observed)
+    MATRICES.set(key, matrix)
+    return matrix
+
+
+# ========== Test ==========
+if __name__ == "__main__":
+    matrix = build_price_matrix(["AAPL", "MSFT", "SHEL.L"], "2024-01-01", "2024-03-01")
+    print(matrix.frame().tail())
+    print("filled cells:", int((~matrix.observed & ~np.isnan(matrix.values)).sum()))
@@ -0,0 +1,335 @@
+# ======================================================================
+# quote_cache.py
+# Pluggable quote cache backends: in-process LRU, LRU with an on-disk
+# snapshot, and shared SQLite file
+# ======================================================================
+
+import abc
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .config import CACHE_DIR, setting
+
+
+# ======================================================================
+# BASE
+# ======================================================================
+class QuoteCache(abc.ABC):
+    """
+    Common interface for quote caches.
+    Entries expire after `ttl` seconds; `get(key, stale=True)` still returns
+    an expired entry that has not been evicted yet.
+    """
+
+    def __init__(self, max_entries: int = 5000, ttl: float = 12 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += n
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit / miss / eviction counters for this process."""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    @abc.abstractmethod
+    def get(self, key: str, stale: bool = False) -> Optional[Any]:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        ...
+
+    def reload(self, key: str) -> None:
+        """Pick up an entry another process may have written (no-op unless the backend keeps a private copy of a shared file)."""
+
+
+# ======================================================================
+# IN-PROCESS LRU
+# ======================================================================
+class LRUCache(QuoteCache):
+    """Thread-safe in-process LRU with a max entry count and per-entry TTL."""
+
+    def __init__(self, max_entries: int = 5000, ttl: float = 12 * 3600):
+        super().__init__(max_entries, ttl)
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires, value)
+
+    def get(self, key: str, stale: bool = False) -> Optional[Any]:
+        value = self._get(key, stale)
+        self._count("misses" if value is None else "hits")
+        return value
+
+    def _get(self, key: str, stale: bool) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (not stale and entry[0] <= time.time()):
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._put(key, time.time() + (self.ttl if ttl is None else ttl), value)
+
+    def _put(self, key: str, expires: float, value: Any) -> None:
+        evicted = 0
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self._count("evictions", evicted)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# ======================================================================
+# LRU WITH PERSISTENT SNAPSHOT
+# ======================================================================
+class SnapshotCache(LRUCache):
+    """
+    In-process LRU written through to a SQLite snapshot file. The snapshot is
+    read in one query on first access, so a restarted worker starts warm:
+    quotes for closed markets are served at once and only stale entries are
+    refetched. Hits never touch the file; a miss or expired entry is looked
+    up there once more, which picks up what another process (another worker,
+    or the refresh_quotes command) has written since.
+    """
+
+    def __init__(self, path: Path, max_entries: int = 5000, ttl: float = 12 * 3600):
+        super().__init__(max_entries, ttl)
+        self.path = Path(path)
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._loaded = False
+
+    def _conn(self) -> sqlite3.Connection:
+        """Shared autocommit connection; callers hold `_db_lock`."""
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshot ("
+                "key TEXT PRIMARY KEY, value BLOB, expires REAL, written REAL)"
+            )
+            self._db = conn
+        return self._db
+
+    def _load(self) -> None:
+        """Fill the LRU from the snapshot once per process, pruning what is no longer useful."""
+        if self._loaded:
+            return
+        with self._db_lock:
+            if self._loaded:
+                return
+            try:
+                conn = self._conn()
+                # Entries long past expiry are useless even as stale fallbacks
+                conn.execute("DELETE FROM snapshot WHERE expires < ?", (time.time() - self.ttl,))
+                conn.execute(
+                    "DELETE FROM snapshot WHERE key NOT IN "
+                    "(SELECT key FROM snapshot ORDER BY written DESC LIMIT ?)", (self.max_entries,)
+                )
+                rows = conn.execute("SELECT key, value, expires FROM snapshot ORDER BY written DESC").fetchall()
+            except sqlite3.Error as e:
+                print(f"Error loading quote snapshot {self.path}: {e}")
+                rows = []
+
+            with self._lock:
+                # Newest first, each moved to the LRU front: the oldest ends up evicted first.
+                # Keys set before the load are newer than the snapshot and are kept.
+                for key, blob, expires in rows:
+                    if key in self._data:
+                        continue
+                    try:
+                        self._data[key] = (expires, pickle.loads(blob))
+                    except Exception as e:
+                        print(f"Error reading snapshot entry {key}: {e}")
+                        continue
+                    self._data.move_to_end(key, last=False)
+            self._loaded = True
+
+    def get(self, key: str, stale: bool = False) -> Optional[Any]:
+        self._load()
+        value = self._get(key, stale)
+        if value is None:
+            self.reload(key)
+            value = self._get(key, stale)
+        self._count("misses" if value is None else "hits")
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._load()
+        ttl = self.ttl if ttl is None else ttl
+        super().set(key, value, ttl)
+        now = time.time()
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            with self._db_lock:
+                self._conn().execute(
+                    "INSERT OR REPLACE INTO snapshot VALUES (?, ?, ?, ?)", (key, blob, now + ttl, now)
+                )
+        except sqlite3.Error as e:
+            print(f"Error writing quote snapshot for {key}: {e}")
+
+    def reload(self, key: str) -> None:
+        self._load()
+        try:
+            with self._db_lock:
+                row = self._conn().execute("SELECT value, expires FROM snapshot WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._put(key, row[1], pickle.loads(row[0]))
+        except Exception as e:
+            print(f"Error reloading quote snapshot for {key}: {e}")
+
+    def delete(self, key: str) -> None:
+        self._load()
+        super().delete(key)
+        try:
+            with self._db_lock:
+                self._conn().execute("DELETE FROM snapshot WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            print(f"Error deleting quote snapshot entry {key}: {e}")
+
+    def clear(self) -> None:
+        # Under the load lock, so a concurrent first load cannot refill the LRU afterwards
+        with self._db_lock:
+            super().clear()
+            try:
+                self._conn().execute("DELETE FROM snapshot")
+            except sqlite3.Error as e:
+                print(f"Error clearing quote snapshot {self.path}: {e}")
+            self._loaded = True
+
+    def __len__(self) -> int:
+        self._load()
+        return super().__len__()
+
+
+# ======================================================================
+# SHARED SQLITE FILE
+# ======================================================================
+class SQLiteCache(QuoteCache):
+    """
+    Cross-process cache stored in a local SQLite file, so every worker on the
+    box shares one copy. Least recently accessed entries are evicted first.
+    """
+
+    def __init__(self, path: Path, max_entries: int = 5000, ttl: float = 12 * 3600):
+        super().__init__(max_entries, ttl)
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB, expires REAL, accessed REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, stale: bool = False) -> Optional[Any]:
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (not stale and row[1] <= now):
+            self._count("misses")
+            return None
+        conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        conn = self._conn()
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", (key, blob, expires, now))
+            excess = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN "
+                    "(SELECT key FROM cache ORDER BY accessed LIMIT ?)", (excess,)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if excess > 0:
+            self._count("evictions", excess)
+
+    def delete(self, key: str) -> None:
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM cache")
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+# ======================================================================
+# FACTORY
+# ======================================================================
+BACKENDS = {"lru": LRUCache, "snapshot": SnapshotCache, "sqlite": SQLiteCache}
+
+
+def build_cache(name: str = "quotes", **defaults) -> QuoteCache:
+    """
+    Build a cache from the QUOTE_CACHE setting, e.g.
+    {"BACKEND": "snapshot", "MAX_ENTRIES": 5000, "TTL_SECONDS": 43200}.
+    Keyword arguments supply defaults for keys the setting leaves out.
+    """
+    config = {**defaults, **setting("QUOTE_CACHE", {})}
+    backend = config.get("BACKEND", "lru")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown quote cache backend '{backend}'")
+
+    kwargs = {
+        "max_entries": config.get("MAX_ENTRIES", 5000),
+        "ttl": config.get("TTL_SECONDS", 12 * 3600),
+    }
+    if backend == "sqlite":
+        kwargs["path"] = config.get("PATH", CACHE_DIR / f"{name}.sqlite3")
+    elif backend == "snapshot":
+        kwargs["path"] = config.get("PATH", CACHE_DIR / f"{name}.snapshot.sqlite3")
+    return BACKENDS[backend](**kwargs)
@@ -1,28 +1,48 @@
 # ======================================================================
 # market_data.py
-# Optimized stock lookup and caching system using yFinance
+# Optimized stock lookup and caching system over the market data provider
 # ======================================================================
 
-import yfinance as yf
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from pytz import timezone
-from typing import Dict, Any, Optional
+from functools import partial
+from pytz import utc
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from urllib.parse import quote as url_quote
+from weakref import WeakKeyDictionary
 
-from .exchange_rates_api import EXCHANGES, get_exchange_rate
+from . import market_data
+from .config import CACHE_DIR, setting
+from .exchange_calendar import CALENDARS
+from .exchange_rates_api import EXCHANGES, align_rates, get_exchange_rate, get_historical_exchange_rate
+from .history_store import HISTORY
+from .quote_cache import QuoteCache, build_cache
+from .single_flight import FileLock, SingleFlight
+from .symbol_index import SYMBOLS
+from .upstream import UPSTREAM, UpstreamError
 
 
 # ======================================================================
 # GLOBAL CACHE STRUCTURE
 # ======================================================================
-# CACHE = {
-#     "AAPL": {
-#         "exchange": "NASDAQ",
-#         "timestamp": datetime,
-#         "data": {...}
-#     }
+# Entries, keyed by ticker, look like:
+# {
+#     "exchange": "NMS",
+#     "timestamp": datetime (aware, UTC),
+#     "data": {...}
 # }
-CACHE: Dict[str, Dict[str, Any]] = {}
+# The backend (in-process LRU, LRU with a snapshot that survives restarts,
+# or shared SQLite file) comes from QUOTE_CACHE.
 CACHE_TTL = timedelta(hours=12)  # optional safety TTL
+CACHE: QuoteCache = build_cache("quotes", TTL_SECONDS=CACHE_TTL.total_seconds())
+# How long a quote stays fresh while its market is open
+QUOTE_FRESHNESS = timedelta(seconds=setting("QUOTE_FRESHNESS_SECONDS", 60))
+PRICE_COLUMNS = ["Open", "High", "Low", "Close"]
+MAX_WORKERS = 16  # upper bound on concurrent upstream requests per batch
+# Serialize refreshes of one ticker across worker processes too (see SINGLE-FLIGHT FETCHES)
+CROSS_PROCESS_LOCK = setting("QUOTE_CROSS_PROCESS_LOCK", False)
+LOCK_DIR = CACHE_DIR / "locks"
 
 
 # ======================================================================
@@ -30,31 +50,30 @@ CACHE_TTL = timedelta(hours=12)  # optional safety TTL
 # ======================================================================
 def check_market_status(exchange: str) -> Dict[str, Any]:
     """Return whether the given exchange is open, along with local time info."""
-    tz = timezone(EXCHANGES[exchange]["timezone"])
-    now = datetime.now(tz)
-    open_t = datetime.strptime(EXCHANGES[exchange]["open"], "%H:%M").time()
-    close_t = datetime.strptime(EXCHANGES[exchange]["close"], "%H:%M").time()
-
-    # Handle markets that close after midnight (e.g., 23:00–05:00)
-    if open_t < close_t:
-        is_open = open_t <= now.time() <= close_t
-    else:
-        is_open = now.time() >= open_t or now.time() <= close_t
+    calendar = CALENDARS[exchange]
+    now = calendar.local_now()
 
     return {
-        "market_open": is_open,
+        "market_open": calendar.is_open(now),
         "time_now": now,
         "date_now": now.date(),
     }
 
 
 # ======================================================================
-# YFINANCE UTILITIES
+# PROVIDER UTILITIES
 # ======================================================================
-def safe_info(ticker: str) -> Dict[str, Any]:
-    """Safely fetch ticker info, suppressing yFinance exceptions."""
+def safe_info(ticker: str) -> Optional[Dict[str, Any]]:
+    """
+    Fetch ticker info from the market data provider through the upstream
+    client, suppressing provider exceptions: {} when the provider has nothing for the ticker, None when
+    the provider could not be reached (so callers can serve stale data).
+    """
     try:
-        return yf.Ticker(ticker).info or {}
+        return UPSTREAM.call(market_data.PROVIDER.info, ticker) or {}
+    except UpstreamError as e:
+        print(f"[safe_info unavailable] {ticker}: {e}")
+        return None
     except Exception as e:
         print(f"[safe_info error] {ticker}: {e}")
         return {}
@@ -82,18 +101,102 @@ def compute_price(info: Dict[str, Any], rate: float) -> Dict[str, Optional[float
     }
 
 
+# ======================================================================
+# SINGLE-FLIGHT FETCHES
+# ======================================================================
+# Concurrent misses for one ticker in this process share a single upstream
+# call, and the quote is cached before that call is released, so callers
+# arriving just after it find the fresh quote instead of fetching again.
+# With QUOTE_CROSS_PROCESS_LOCK, workers also take a per-ticker file lock
+# around the fetch and, once they hold it, re-read the ticker's cache entry
+# (`reload`), so a worker that waited finds the quote the other one wrote.
+# That needs a cache file shared between workers: the "sqlite" or
+# "snapshot" backend, not "lru".
+INFLIGHT = SingleFlight()
+
+
+def fetch_info(ticker: str) -> Optional[Dict[str, Any]]:
+    """`safe_info`, shared by every caller asking for the same ticker at the same time."""
+    return INFLIGHT.do(("info", ticker), safe_info, ticker)
+
+
+def _fetch_quote(ticker: str, since: Optional[datetime]) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    (info, quote) for a quote cache miss. Nothing is fetched (info None) if
+    the ticker has been cached meanwhile: at or after `since`, or at all
+    while still fresh when `since` is None.
+    """
+    return INFLIGHT.do(("quote", ticker), _locked_fetch, ticker, since)
+
+
+def _locked_fetch(ticker: str, since: Optional[datetime]) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    if not CROSS_PROCESS_LOCK:
+        return _fetch_uncached(ticker, since)
+    with FileLock(LOCK_DIR / f"{url_quote(ticker, safe='')}.lock"):
+        CACHE.reload(ticker)
+        return _fetch_uncached(ticker, since)
+
+
+def _fetch_uncached(ticker: str, since: Optional[datetime]) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    cached = CACHE.get(ticker)
+    if cached is not None:
+        fresh = cached["timestamp"] >= since if since else _is_fresh(cached, datetime.now(utc))
+        if fresh:
+            return None, _entry_quote(ticker, cached)
+    info = safe_info(ticker)
+    return info, _quote_from_info(ticker, info)
+
+
 # ======================================================================
 # STOCK VALIDATION
 # ======================================================================
-def check_stock(ticker: str) -> bool:
-    """Validate if the ticker exists and represents an equity."""
-    try:
-        info = yf.Ticker(ticker).info
-        if info.get("quoteType") == "EQUITY":
-            return True
-        return False
-    except Exception:
-        return False
+def check_stock(ticker: str) -> Optional[bool]:
+    """Validate if the ticker exists and represents an equity (None if the provider could not be asked)."""
+    return check_stocks([ticker])[ticker]
+
+
+def check_stocks(tickers: Iterable[str]) -> Dict[str, Optional[bool]]:
+    """
+    Validate many tickers, answering from the symbol index (including its
+    negative cache) where possible. Unknown tickers are fetched concurrently;
+    each fetch also records the metadata and caches a fresh quote, so the
+    first quote render after validation needs no second `.info` call.
+    Tickers the provider could not be asked about map to None.
+    """
+    results, unknown = _split_validity(tickers)
+    if unknown:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(unknown))) as pool:
+            infos = dict(zip(unknown, pool.map(fetch_info, unknown)))
+        results.update(_record_validation(infos))
+    return results
+
+
+def _split_validity(tickers: Iterable[str]) -> Tuple[Dict[str, bool], List[str]]:
+    """Dedupe tickers into those the symbol index can answer and those to fetch."""
+    results, unknown = {}, []
+    for ticker in dict.fromkeys(tickers):
+        valid = SYMBOLS.validity(ticker)
+        if valid is None:
+            unknown.append(ticker)
+        else:
+            results[ticker] = valid
+    return results, unknown
+
+
+def _record_validation(infos: Dict[str, Optional[Dict[str, Any]]]) -> Dict[str, Optional[bool]]:
+    """
+    Store fetched infos (quotes for equities, negatives for unknowns) and
+    return validity. Tickers the provider could not be asked about (circuit
+    open, retries exhausted, shed by the rate limit) map to None and are not
+    negatively cached.
+    """
+    answered = {t: info for t, info in infos.items() if info is not None}
+    known = {t: info for t, info in answered.items() if info.get("quoteType")}
+    equities = {t: info for t, info in known.items() if info["quoteType"] == "EQUITY"}
+    SYMBOLS.put_invalid_many(t for t in answered if t not in known)
+    SYMBOLS.put_many((t, info) for t, info in known.items() if t not in equities)
+    _quotes_from_infos(equities)
+    return {t: t in equities if t in answered else None for t in infos}
 
 
 # ======================================================================
@@ -101,10 +204,84 @@ def check_stock(ticker: str) -> bool:
 # ======================================================================
 def lookup(ticker: str) -> Dict[str, Any]:
     """
-    Retrieve current stock data. Uses cache when market is closed.
-    Clears cache when market opens.
+    Retrieve current stock data. Serves from cache without any network call
+    while the entry is fresh; see `lookup_many`.
     """
-    info = safe_info(ticker)
+    return lookup_many([ticker])[0]
+
+
+def lookup_many(tickers: Iterable[str], refresh: bool = False) -> List[Dict[str, Any]]:
+    """
+    Batched lookup returning quotes in input order.
+    Cache hits are decided from the symbol index alone; only misses and stale
+    open-market entries are fetched, over a bounded worker pool, and a miss
+    already being fetched by another request is waited for rather than
+    refetched. FX rates are shared per currency through the FX service.
+    `refresh=True` skips the cache and refetches every ticker.
+    """
+    tickers = list(tickers)
+    since = datetime.now(utc) if refresh else None
+    quotes, misses = _split_cached(tickers, refresh)
+    if misses:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(misses))) as pool:
+            fetched = dict(zip(misses, pool.map(partial(_fetch_quote, since=since), misses)))
+        quotes.update(_record_fetched(fetched))
+
+    return [quotes[t] for t in tickers]
+
+
+def _split_cached(tickers: List[str], refresh: bool) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """Dedupe tickers into valid cached quotes and the misses still to fetch."""
+    quotes = {}
+    unique = list(dict.fromkeys(tickers))
+    if not refresh:
+        for ticker in unique:
+            cached = _cached_quote(ticker)
+            if cached is not None:
+                quotes[ticker] = cached
+    return quotes, [t for t in unique if t not in quotes]
+
+
+def _record_fetched(fetched: Dict[str, Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Record metadata for fetched misses in one batch and return their quotes."""
+    SYMBOLS.put_many((ticker, info) for ticker, (info, _) in fetched.items())
+    return {ticker: quote for ticker, (_, quote) in fetched.items()}
+
+
+def _quotes_from_infos(infos: Dict[str, Optional[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Record fetched metadata and turn each info dict into a fresh quote."""
+    SYMBOLS.put_many(infos.items())
+    return {ticker: _quote_from_info(ticker, info) for ticker, info in infos.items()}
+
+
+def _cached_quote(ticker: str) -> Optional[Dict[str, Any]]:
+    """Return the cached quote if still valid, deciding market status offline."""
+    meta = SYMBOLS.get(ticker)
+    cached = CACHE.get(ticker)
+    if not meta or not cached:
+        return None
+
+    exchange_code = meta["exchange"]
+    if meta["quote_type"] != "EQUITY" or exchange_code not in EXCHANGES:
+        return None
+    if cached["exchange"] != exchange_code:
+        return None
+
+    return _entry_quote(ticker, cached) if _is_fresh(cached, datetime.now(utc)) else None
+
+
+def _is_fresh(cached: Dict[str, Any], now: datetime) -> bool:
+    """Open: fresh for QUOTE_FRESHNESS. Closed: valid if taken after the last close."""
+    calendar = CALENDARS[cached["exchange"]]
+    if calendar.is_open(now):
+        return now - cached["timestamp"] < QUOTE_FRESHNESS
+    return cached["timestamp"] >= calendar.previous_close(now)
+
+
+def _quote_from_info(ticker: str, info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build a fresh quote from fetched info and store it in the cache."""
+    if info is None:
+        return _stale_quote(ticker)
     if not info or info.get("quoteType") != "EQUITY":
         return {"ticker": ticker, "error": "Invalid or unsupported ticker."}
 
@@ -112,28 +289,34 @@ def lookup(ticker: str) -> Dict[str, Any]:
     if exchange_code not in EXCHANGES:
         return {"ticker": ticker, "error": f"Unknown exchange '{exchange_code}'"}
 
-    status = check_market_status(exchange_code)
+    # Rates come from the shared FX service, keyed by currency
     rate = get_exchange_rate(exchange_code)
-    market_open_now = status["market_open"]
+    if rate is None:
+        return _stale_quote(ticker)
+    data = compute_price(info, rate)
 
-    # ---------- MARKET OPEN: Always fetch fresh ----------
-    if market_open_now:
-        data = compute_price(info, rate)
-        CACHE.pop(ticker, None)  # remove stale cache
-        CACHE[ticker] = {"exchange": exchange_code, "timestamp": datetime.now(), "data": data}
-        return {"ticker": ticker, "is_open": True, **data}
+    # A quote taken while the market is closed holds until the next open
+    calendar = CALENDARS[exchange_code]
+    now = datetime.now(utc)
+    market_open_now = calendar.is_open(now)
+    ttl = None if market_open_now else (calendar.next_open(now) - now).total_seconds()
+    CACHE.set(ticker, {"exchange": exchange_code, "timestamp": now, "data": data}, ttl=ttl)
+    return {"ticker": ticker, "is_open": market_open_now, **data, "cached": False}
 
-    # ---------- MARKET CLOSED: Return cached or create ----------
-    cached = CACHE.get(ticker)
-    if cached and cached["exchange"] == exchange_code:
-        # optional TTL check to prevent stale overnight cache
-        if datetime.now() - cached["timestamp"] < CACHE_TTL:
-            return {"ticker": ticker, "is_open": False, **cached["data"], "cached": True}
 
-    # fetch once, store for reuse during market close
-    data = compute_price(info, rate)
-    CACHE[ticker] = {"exchange": exchange_code, "timestamp": datetime.now(), "data": data}
-    return {"ticker": ticker, "is_open": False, **data, "cached": False}
+def _stale_quote(ticker: str) -> Dict[str, Any]:
+    """Last cached quote, however old, for when the provider cannot be reached."""
+    cached = CACHE.get(ticker, stale=True)
+    if cached is None:
+        return {"ticker": ticker, "error": "Market data provider unavailable."}
+    UPSTREAM.count("served_stale")
+    return {**_entry_quote(ticker, cached), "stale": True}
+
+
+def _entry_quote(ticker: str, cached: Dict[str, Any]) -> Dict[str, Any]:
+    """Quote for a cache entry, without any freshness check."""
+    market_open_now = CALENDARS[cached["exchange"]].is_open(datetime.now(utc))
+    return {"ticker": ticker, "is_open": market_open_now, **cached["data"], "cached": True}
 
 
 # ======================================================================
@@ -145,9 +328,12 @@ def get_historic_data(
     end_date: str,
     freq: str = "1d"
 ):
-    """Fetch historical OHLCV data for an asset, converted to USD."""
-    info = safe_info(asset)
-    exchange_code = info.get("exchange")
+    """
+    Fetch historical OHLCV data for an asset, converted to USD.
+    Served from the local history store; only uncovered ranges are downloaded.
+    """
+    meta = symbol_metadata(asset)
+    exchange_code = meta.get("exchange")
 
     if exchange_code not in EXCHANGES:
         raise ValueError(f"Unknown exchange '{exchange_code}'")
@@ -155,24 +341,97 @@ def get_historic_data(
         raise ValueError("Unsupported frequency: choose from '1h', '1d', '5d', '1wk'.")
 
     try:
-        # Faster than calling .history() on each Ticker object
-        data = yf.download(asset, start=start_date, end=end_date, interval=freq, progress=False)
+        data = HISTORY.read(asset, start_date, end_date, freq)
     except Exception as e:
         raise RuntimeError(f"Failed to fetch data for {asset}: {e}")
 
-    currency = info.get("currency")
-    if currency != "USD":
-        rate = get_exchange_rate(exchange_code)
-        data.loc[:, ["Open", "High", "Low", "Close"]] /= rate
+    # Convert with each day's own rate, not today's
+    if EXCHANGES[exchange_code]["currency"] != "USD" and not data.empty:
+        rates = get_historical_exchange_rate(exchange_code, data.index[0], end_date)
+        if rates is None:
+            raise RuntimeError(f"No exchange rates available for {asset}")
+        data[PRICE_COLUMNS] = data[PRICE_COLUMNS].div(align_rates(rates, data.index), axis=0)
 
     return data
 
 
+def symbol_metadata(ticker: str) -> Dict[str, Any]:
+    """Exchange / quote type / currency for a ticker, from the index when known."""
+    meta = SYMBOLS.get(ticker)
+    if meta is None:
+        info = fetch_info(ticker)
+        SYMBOLS.put(ticker, info)
+        meta = SYMBOLS.get(ticker) or {}
+    return meta
+
+
+# ======================================================================
+# ASYNC PIPELINE
+# ======================================================================
+# Blocking provider calls run on one shared, bounded executor and a per-loop
+# semaphore caps in-flight upstream requests, so concurrent requests never
+# each get their own thread. The yFinance provider already routes every call
+# through one shared HTTP session, which pools connections per host.
+ASYNC_CONCURRENCY = setting("QUOTE_ASYNC_CONCURRENCY", 32)
+_EXECUTOR = ThreadPoolExecutor(max_workers=ASYNC_CONCURRENCY, thread_name_prefix="quotes")
+_SEMAPHORES: "WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = WeakKeyDictionary()
+
+
+async def _run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_EXECUTOR, func, *args)
+
+
+async def _run_upstream(func, *args):
+    """Run one blocking upstream call, waiting for a free concurrency slot."""
+    loop = asyncio.get_running_loop()
+    semaphore = _SEMAPHORES.get(loop)
+    if semaphore is None:
+        semaphore = _SEMAPHORES[loop] = asyncio.Semaphore(ASYNC_CONCURRENCY)
+    async with semaphore:
+        return await _run_blocking(func, *args)
+
+
+async def async_lookup(ticker: str) -> Dict[str, Any]:
+    """Async counterpart of `lookup`."""
+    return (await async_lookup_many([ticker]))[0]
+
+
+async def async_lookup_many(tickers: Iterable[str], refresh: bool = False) -> List[Dict[str, Any]]:
+    """
+    Async counterpart of `lookup_many`: misses are fetched concurrently,
+    bounded per loop. Cache and symbol index reads may hit SQLite, so they
+    run in the executor too.
+    """
+    tickers = list(tickers)
+    since = datetime.now(utc) if refresh else None
+    quotes, misses = await _run_blocking(_split_cached, tickers, refresh)
+    if misses:
+        results = await asyncio.gather(*(_run_upstream(_fetch_quote, t, since) for t in misses))
+        quotes.update(await _run_blocking(_record_fetched, dict(zip(misses, results))))
+    return [quotes[t] for t in tickers]
+
+
+async def async_check_stocks(tickers: Iterable[str]) -> Dict[str, Optional[bool]]:
+    """Async counterpart of `check_stocks`: unknown tickers are fetched concurrently, bounded per loop."""
+    results, unknown = await _run_blocking(_split_validity, list(tickers))
+    if unknown:
+        infos = await asyncio.gather(*(_run_upstream(fetch_info, t) for t in unknown))
+        results.update(await _run_blocking(_record_validation, dict(zip(unknown, infos))))
+    return results
+
+
+async def async_get_historic_data(asset: str, start_date: str, end_date: str, freq: str = "1d"):
+    """Async counterpart of `get_historic_data`."""
+    return await _run_upstream(get_historic_data, asset, start_date, end_date, freq)
+
+
 # ======================================================================
 # TEST BLOCK
 # ======================================================================
 if __name__ == "__main__":
     tickers = ["AAPL", "MSFT", "^GSPC"]
-    for t in tickers:
-        print(t, "→", lookup(t))
-    print("\nCACHE snapshot:", CACHE)
\ No newline at end of file
+    for t, quote in zip(tickers, lookup_many(tickers)):
+        print(t, "→", quote)
+    print("\nCACHE stats:", CACHE.stats())
+    print("INFLIGHT stats:", INFLIGHT.stats())
+    print("UPSTREAM metrics:", UPSTREAM.metrics())
\ No newline at end of file
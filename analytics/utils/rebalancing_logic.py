@@ -1,23 +1,202 @@
-from analytics.utils.portfolio_metrics import get_portfolio
+# ======================================================================
+# rebalancing_logic.py
+# Vectorized rebalancing backtests over an aligned price matrix
+# ======================================================================
 
-# fixed allocations is a dictionary which only contains information if rebalancing is selected
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
 
-def rebalance(db, id, rebalancing_option, fixed_allocations, frequency, threshold, user_id):
-    portfolio = get_portfolio(db, id) # returns dictionary of Stock objects
+import numpy as np
+import pandas as pd
+
+from .portfolio_metrics import get_portfolio
+from .price_matrix import build_price_matrix
+from .risk_metrics import risk_report
+
+
+OPTIONS = ("none", "time-based", "drift-based")
+# Calendar rebalancing frequencies; an int instead means "every n rows"
+CALENDAR_FREQUENCIES = {"weekly": "W", "monthly": "M", "quarterly": "Q", "yearly": "Y"}
+DRIFT_CHUNK = 32  # first look-ahead window when scanning for a drift breach
+MAX_DRIFT_CHUNK = 4096
+
+
+# ======================================================================
+# ENGINE
+# ======================================================================
+def _segment_values(prices: np.ndarray, weights: np.ndarray, starts: np.ndarray, initial_value: float):
+    """
+    Portfolio value per row when holdings are reset to `weights` at each row
+    in `starts` (starts[0] == 0) and held in between. Within a segment the
+    value grows by (p_t / p_start) @ weights, so the whole path is a few
+    array operations plus one cumulative product over segments.
+    """
+    segment = np.zeros(len(prices), dtype=np.int64)
+    segment[starts[1:]] = 1
+    segment = np.cumsum(segment)
+
+    base = prices[starts]
+    growth = (prices / base[segment]) @ weights
+
+    # Growth of each finished segment up to the next rebalance
+    drifted = weights * (prices[starts[1:]] / base[:-1])
+    segment_growth = drifted.sum(axis=1)
+    start_values = initial_value * np.concatenate(([1.0], np.cumprod(segment_growth)))
+
+    # Fraction of the portfolio traded at each rebalance
+    turnover = 0.5 * np.abs(drifted / segment_growth[:, None] - weights).sum(axis=1)
+    return start_values[segment] * growth, turnover
+
+
+def _time_starts(index: pd.DatetimeIndex, frequency) -> np.ndarray:
+    """Rebalance rows: every `frequency` rows, or the first row of each calendar period."""
+    if isinstance(frequency, (int, np.integer)):
+        if frequency < 1:
+            raise ValueError("Rebalancing frequency must be at least 1 period.")
+        return np.arange(0, len(index), frequency)
+    if frequency not in CALENDAR_FREQUENCIES:
+        raise ValueError(f"Invalid frequency: choose a number of periods or one of {list(CALENDAR_FREQUENCIES)}.")
+    periods = index.tz_localize(None).to_period(CALENDAR_FREQUENCIES[frequency]).asi8
+    return np.flatnonzero(np.concatenate(([True], periods[1:] != periods[:-1])))
+
+
+def _drift_starts(prices: np.ndarray, weights: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Rebalance rows for drift-based rebalancing: the first row where any
+    weight leaves target * (1 ± threshold). Each step checks a block of
+    upcoming rows at once, so the Python loop runs about once per rebalance.
+    """
+    low, high = weights * (1 - threshold), weights * (1 + threshold)
+    starts, start, row, size = [0], 0, 1, DRIFT_CHUNK
+    while row < len(prices):
+        end = min(len(prices), row + size)
+        held = prices[row:end] / prices[start] * weights
+        held /= held.sum(axis=1, keepdims=True)
+        breach = ((held < low) | (held > high)).any(axis=1)
+        if breach.any():
+            hit = row + int(breach.argmax())
+            # Expect the next breach about as far away as this one
+            size = min(MAX_DRIFT_CHUNK, max(DRIFT_CHUNK, 2 * (hit - start)))
+            starts.append(hit)
+            start, row = hit, hit + 1
+        else:
+            row = end
+            size = min(MAX_DRIFT_CHUNK, size * 2)
+    return np.asarray(starts)
+
+
+def backtest(
+    index: pd.DatetimeIndex,
+    prices: np.ndarray,
+    weights: np.ndarray,
+    initial_value: float,
+    rebalancing_option: str,
+    frequency=None,
+    threshold: Optional[float] = None,
+    freq: str = "1d",
+) -> Dict[str, Any]:
+    """
+    Run one strategy over a (dates, tickers) price matrix. `weights` are the
+    starting (and, when rebalancing, target) fractions per column.
+    """
     if rebalancing_option == "none":
-        return  # No rebalancing needed
-    if rebalancing_option == "time-based":
-        # Implement time-based rebalancing logic
-        pass
+        starts = np.zeros(1, dtype=np.int64)
+    elif rebalancing_option == "time-based":
+        starts = _time_starts(index, frequency)
     elif rebalancing_option == "drift-based":
-        for stock in portfolio.values():
-            min = fixed_allocations[stock.ticker] * (1 - threshold)
-            max = fixed_allocations[stock.ticker] * (1 + threshold)
-            if stock.portfolio_contribution > max or stock.portfolio_contribution < min:
-                # Implement drift-based rebalancing logic
+        if threshold is None or not 0 < threshold < 1:
+            raise ValueError("Drift threshold must be between 0 and 1.")
+        starts = _drift_starts(prices, weights, threshold)
     else:
         raise ValueError("Invalid rebalancing option selected.")
 
-# for t in time_span:
-#     compute metrics
-#     rebalance if needed
\ No newline at end of file
+    values, turnover = _segment_values(prices, weights, starts, initial_value)
+    values = pd.Series(values, index=index, name="value")
+    return {
+        "option": rebalancing_option,
+        "frequency": frequency,
+        "threshold": threshold,
+        "values": values,
+        "rebalances": index[starts[1:]],
+        "turnover": float(turnover.sum()),
+        "metrics": risk_report(values, freq=freq),
+    }
+
+
+# ======================================================================
+# ENTRY POINTS
+# ======================================================================
+def prepare(db, id, fixed_allocations, start_date=None, end_date=None, freq="1d", matrix=None):
+    """
+    Price matrix, current weights, target weights and starting value for a
+    strategy. Tickers come from the portfolio plus any in `fixed_allocations`.
+    The backtest starts on the first row where every ticker has a price.
+    """
+    portfolio = get_portfolio(db, id)  # {ticker: shares}
+    fixed_allocations = fixed_allocations or {}
+    tickers = tuple(sorted(set(portfolio) | set(fixed_allocations)))
+
+    if matrix is None:
+        end_date = end_date or date.today().isoformat()
+        start_date = start_date or (date.fromisoformat(end_date) - timedelta(days=5 * 365)).isoformat()
+        matrix = build_price_matrix(tickers, start_date, end_date, freq)
+    matrix = matrix.select(tickers).complete()
+    if not len(matrix.index):
+        raise ValueError("No overlapping price history for the selected tickers.")
+    index, prices = matrix.index, matrix.values
+
+    shares = np.array([portfolio.get(t, 0.0) for t in tickers])
+    holdings = shares * prices[0]
+    initial_value = float(holdings.sum())
+    if initial_value <= 0:
+        raise ValueError("Portfolio has no value at the start date.")
+
+    target = np.array([float(fixed_allocations.get(t, 0.0)) for t in tickers])
+    if (target < 0).any():
+        raise ValueError("Allocations cannot be negative.")
+    target = target / target.sum() if target.sum() > 0 else holdings / initial_value
+    return {
+        "tickers": tickers,
+        "index": index,
+        "prices": prices,
+        "current": holdings / initial_value,
+        "target": target,
+        "initial_value": initial_value,
+    }
+
+
+# fixed_allocations maps ticker -> target weight (any scale; normalized here)
+# and is only used when a rebalancing option is selected. Grids of options
+# run through rebalancing_sweep.sweep_rebalancing on a process pool.
+def rebalance(db, id, rebalancing_option, fixed_allocations, frequency, threshold, user_id,
+              start_date=None, end_date=None, freq="1d", matrix=None):
+    """
+    Backtest a strategy's current holdings under the chosen rebalancing rule.
+    `user_id` is accepted for callers scoping strategies; ownership is not
+    stored in the portfolio table.
+    """
+    if rebalancing_option not in OPTIONS:
+        raise ValueError("Invalid rebalancing option selected.")
+    setup = prepare(db, id, fixed_allocations, start_date, end_date, freq, matrix)
+    weights = setup["current"] if rebalancing_option == "none" else setup["target"]
+    result = backtest(
+        setup["index"], setup["prices"], weights, setup["initial_value"],
+        rebalancing_option, frequency, threshold, freq,
+    )
+    result["tickers"] = list(setup["tickers"])
+    return result
+
+
+# ========== Test ==========
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range("2005-01-03", periods=20 * 252)
+    prices = 100 * np.cumprod(1 + rng.normal(0.0003, 0.015, (len(index), 500)), axis=0)
+    weights = np.full(500, 1 / 500)
+    for option, frequency, threshold in [("none", None, None), ("time-based", "monthly", None), ("drift-based", None, 0.5)]:
+        t0 = time.perf_counter()
+        result = backtest(index, prices, weights, 1e6, option, frequency, threshold)
+        print(f"{option:<12} {time.perf_counter() - t0:.3f}s  rebalances={len(result['rebalances'])}  "
+              f"final={result['values'].iloc[-1]:,.0f}")
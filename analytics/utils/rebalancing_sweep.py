@@ -0,0 +1,165 @@
+# ======================================================================
+# rebalancing_sweep.py
+# Parameter sweeps over rebalancing rules on a process pool
+# ======================================================================
+
+import multiprocessing as mp
+import os
+from itertools import product
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import numpy as np
+
+from .config import setting
+from .rebalancing_logic import backtest, prepare
+
+
+# Spawned workers start clean, which is safe from a threaded web server
+START_METHOD = setting("SWEEP_START_METHOD", "spawn")
+
+
+# ======================================================================
+# SHARED PRICE MATRIX
+# ======================================================================
+class SharedPriceMatrix:
+    """
+    Copies a price matrix into one shared-memory block. Workers attach by
+    name and get a read-only view of the same pages, so nothing is copied or
+    pickled per worker or per task. The creator unlinks the block on exit.
+    """
+
+    def __init__(self, prices: np.ndarray):
+        self.shape, self.dtype = prices.shape, prices.dtype.str
+        self.shm = shared_memory.SharedMemory(create=True, size=max(prices.nbytes, 1))
+        np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)[:] = prices
+
+    @property
+    def handle(self):
+        return self.shm.name, self.shape, self.dtype
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# ======================================================================
+# WORKER
+# ======================================================================
+# Set once per worker process by _init_worker
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_worker(handle, index, weights, initial_value, freq):
+    name, shape, dtype = handle
+    # Pool workers share the parent's resource tracker, so attaching does not
+    # add a second owner; the parent alone unlinks the block
+    shm = shared_memory.SharedMemory(name=name)
+    prices = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    prices.flags.writeable = False
+    _WORKER.update(shm=shm, prices=prices, index=index, weights=weights,
+                   initial_value=initial_value, freq=freq)
+
+
+def _run_point(point):
+    """Backtest one grid point and return a compact, cheap-to-pickle summary."""
+    option, frequency, threshold, allocation, keep_values = point
+    result = backtest(
+        _WORKER["index"], _WORKER["prices"], _WORKER["weights"][allocation],
+        _WORKER["initial_value"], option, frequency, threshold, _WORKER["freq"],
+    )
+    summary = {
+        "option": option,
+        "frequency": frequency,
+        "threshold": threshold,
+        "allocation": allocation,
+        "final_value": float(result["values"].iloc[-1]),
+        "rebalances": len(result["rebalances"]),
+        "turnover": result["turnover"],
+        "metrics": result["metrics"],
+    }
+    if keep_values:
+        summary["values"] = result["values"]
+    return summary
+
+
+# ======================================================================
+# ENTRY POINT
+# ======================================================================
+def build_grid(allocation_sets, frequencies, thresholds, keep_values=False):
+    """Buy-and-hold once, then every allocation set × (frequencies + thresholds)."""
+    grid = [("none", None, None, None, keep_values)]
+    for name, frequency in product(allocation_sets, frequencies):
+        grid.append(("time-based", frequency, None, name, keep_values))
+    for name, threshold in product(allocation_sets, thresholds):
+        grid.append(("drift-based", None, threshold, name, keep_values))
+    return grid
+
+
+def sweep_rebalancing(
+    db,
+    id,
+    allocation_sets: Dict[str, Dict[str, float]],
+    frequencies: Iterable = (),
+    thresholds: Iterable[float] = (),
+    user_id=None,
+    start_date=None,
+    end_date=None,
+    freq: str = "1d",
+    processes: Optional[int] = None,
+    keep_values: bool = False,
+    matrix=None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Run the `rebalance` rules for a strategy over a threshold × frequency ×
+    allocation-set grid, yielding each result as soon as a worker finishes
+    (not in grid order). Prices are loaded once, for the union of tickers,
+    and shared with every worker through shared memory.
+    """
+    tickers = set()
+    for allocations in allocation_sets.values():
+        tickers.update(allocations)
+    setup = prepare(db, id, dict.fromkeys(tickers, 1.0), start_date, end_date, freq, matrix)
+
+    # Target weights per allocation set, in the matrix's column order
+    weights = {None: setup["current"]}
+    for name, allocations in allocation_sets.items():
+        target = np.array([float(allocations.get(t, 0.0)) for t in setup["tickers"]])
+        if (target < 0).any() or target.sum() <= 0:
+            raise ValueError(f"Invalid allocations in set '{name}'.")
+        weights[name] = target / target.sum()
+
+    grid = build_grid(allocation_sets, list(frequencies), list(thresholds), keep_values)
+    processes = min(processes or os.cpu_count() or 1, len(grid))
+    context = mp.get_context(START_METHOD)
+
+    with SharedPriceMatrix(setup["prices"]) as shared:
+        initargs = (shared.handle, setup["index"], weights, setup["initial_value"], freq)
+        with context.Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+            yield from pool.imap_unordered(_run_point, grid)
+
+
+# ========== Test ==========
+if __name__ == "__main__":
+    import time
+
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range("2005-01-03", periods=20 * 252)
+    prices = 100 * np.cumprod(1 + rng.normal(0.0003, 0.015, (len(index), 500)), axis=0)
+    weights = {None: np.full(500, 1 / 500), "equal": np.full(500, 1 / 500)}
+    grid = build_grid(["equal"], ["weekly", "monthly", "quarterly", "yearly", 5, 21],
+                      [0.05, 0.1, 0.2, 0.3, 0.4, 0.5])
+
+    t0 = time.perf_counter()
+    with SharedPriceMatrix(prices) as shared:
+        initargs = (shared.handle, index, weights, 1e6, "1d")
+        with mp.get_context(START_METHOD).Pool(initializer=_init_worker, initargs=initargs) as pool:
+            for summary in pool.imap_unordered(_run_point, grid):
+                print(f"{summary['option']:<12} {str(summary['frequency'] or summary['threshold']):<10}"
+                      f"{summary['final_value']:>14,.0f}")
+    print(f"{len(grid)} backtests in {time.perf_counter() - t0:.2f}s")
@@ -0,0 +1,251 @@
+# ======================================================================
+# risk_metrics.py
+# Vectorized risk analytics over an aligned portfolio value series
+# ======================================================================
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+# Sampling periods per year for the frequencies get_historic_data supports
+PERIODS_PER_YEAR = {"1h": 252 * 7, "1d": 252, "5d": 252 / 5, "1wk": 52}
+SECONDS_PER_YEAR = 365.25 * 24 * 3600
+
+
+# ======================================================================
+# SERIES HELPERS
+# ======================================================================
+def to_returns(values: pd.Series) -> pd.Series:
+    """Simple period returns of a value series, without the leading NaN."""
+    values = pd.Series(values, dtype="float64").dropna()
+    return values.pct_change().iloc[1:]
+
+
+def align(portfolio: pd.Series, benchmark: pd.Series) -> pd.DataFrame:
+    """Portfolio and benchmark values on their common, gap-free timestamps."""
+    frame = pd.concat({"portfolio": portfolio, "benchmark": benchmark}, axis=1, join="inner")
+    return frame.dropna().astype("float64")
+
+
+def _excess(returns, risk_free: float, periods: float) -> np.ndarray:
+    """Returns minus the per-period risk-free rate (given annualized)."""
+    return np.asarray(returns, dtype="float64") - risk_free / periods
+
+
+# ======================================================================
+# FULL-PERIOD METRICS
+# ======================================================================
+def volatility(returns, periods: float = 252) -> float:
+    """Annualized standard deviation of period returns."""
+    r = np.asarray(returns, dtype="float64")
+    return float(np.std(r, ddof=1) * np.sqrt(periods)) if len(r) > 1 else np.nan
+
+
+def drawdown(values: pd.Series) -> pd.Series:
+    """Fractional distance below the running peak at each point (<= 0)."""
+    v = np.asarray(values, dtype="float64")
+    peak = np.maximum.accumulate(v)
+    return pd.Series(v / peak - 1.0, index=getattr(values, "index", None))
+
+
+def max_drawdown(values: pd.Series) -> float:
+    """Deepest peak-to-trough loss, as a negative fraction."""
+    return float(drawdown(values).min()) if len(values) else np.nan
+
+
+def sharpe_ratio(returns, risk_free: float = 0.0, periods: float = 252) -> float:
+    excess = _excess(returns, risk_free, periods)
+    if len(excess) < 2:
+        return np.nan
+    std = np.std(excess, ddof=1)
+    return float(excess.mean() / std * np.sqrt(periods)) if std > 0 else np.nan
+
+
+def sortino_ratio(returns, risk_free: float = 0.0, periods: float = 252) -> float:
+    """Like Sharpe, but only penalizes returns below the risk-free rate."""
+    excess = _excess(returns, risk_free, periods)
+    if len(excess) < 2:
+        return np.nan
+    downside = np.sqrt(np.mean(np.minimum(excess, 0.0) ** 2))
+    return float(excess.mean() / downside * np.sqrt(periods)) if downside > 0 else np.nan
+
+
+def alpha_beta(returns, benchmark_returns, risk_free: float = 0.0, periods: float = 252):
+    """Annualized Jensen's alpha and beta of returns against a benchmark."""
+    r = _excess(returns, risk_free, periods)
+    b = _excess(benchmark_returns, risk_free, periods)
+    if len(r) < 2:
+        return np.nan, np.nan
+    var = np.var(b, ddof=1)
+    if var == 0:
+        return np.nan, np.nan
+    beta = np.cov(r, b, ddof=1)[0, 1] / var
+    alpha = (r.mean() - beta * b.mean()) * periods
+    return float(alpha), float(beta)
+
+
+def cagr(values: pd.Series) -> float:
+    """Compound annual growth rate between the first and last value, by calendar time."""
+    values = pd.Series(values, dtype="float64").dropna()
+    if len(values) < 2 or values.iloc[0] <= 0:
+        return np.nan
+    years = (values.index[-1] - values.index[0]).total_seconds() / SECONDS_PER_YEAR
+    if years <= 0:
+        return np.nan
+    return float((values.iloc[-1] / values.iloc[0]) ** (1.0 / years) - 1.0)
+
+
+def risk_report(
+    values: pd.Series,
+    benchmark: Optional[pd.Series] = None,
+    freq: str = "1d",
+    risk_free: float = 0.0,
+) -> Dict[str, Any]:
+    """
+    All full-period metrics for a portfolio value series, e.g. the "total"
+    column of the frame display_portfolio returns, optionally against an
+    index such as ^GSPC.
+    `risk_free` is an annual rate.
+    """
+    periods = PERIODS_PER_YEAR[freq]
+    if benchmark is not None:
+        frame = align(values, benchmark)
+        values = frame["portfolio"]
+    returns = to_returns(values)
+
+    report = {
+        "cagr": cagr(values),
+        "volatility": volatility(returns, periods),
+        "max_drawdown": max_drawdown(values),
+        "sharpe": sharpe_ratio(returns, risk_free, periods),
+        "sortino": sortino_ratio(returns, risk_free, periods),
+    }
+    if benchmark is not None:
+        report["alpha"], report["beta"] = alpha_beta(
+            returns, to_returns(frame["benchmark"]), risk_free, periods
+        )
+    return report
+
+
+# ======================================================================
+# ROLLING METRICS (O(n))
+# ======================================================================
+# Each window statistic is a difference of two prefix sums, so a full pass
+# costs O(n) whatever the window length. Inputs are demeaned first: variance
+# and covariance are shift-invariant, and centring keeps the sums small
+# enough that the subtraction does not lose precision on long series.
+def _window_sums(x: np.ndarray, window: int) -> np.ndarray:
+    """Sum of each trailing window of length `window`, NaN until it is full."""
+    c = np.concatenate(([0.0], np.cumsum(x)))
+    out = np.full(len(x), np.nan)
+    out[window - 1:] = c[window:] - c[:-window]
+    return out
+
+
+def _rolling_moments(x: np.ndarray, window: int):
+    """Trailing-window mean and sample variance of x."""
+    shift = x.mean() if len(x) else 0.0
+    d = x - shift
+    s1, s2 = _window_sums(d, window), _window_sums(d * d, window)
+    mean = s1 / window
+    var = np.maximum((s2 - s1 * mean) / (window - 1), 0.0)
+    return mean + shift, var
+
+
+def _window_input(returns: pd.Series, window: int) -> np.ndarray:
+    if window < 2:
+        raise ValueError("Rolling window must be at least 2 periods.")
+    return np.asarray(returns, dtype="float64")
+
+
+def rolling_volatility(returns: pd.Series, window: int, periods: float = 252) -> pd.Series:
+    r = _window_input(returns, window)
+    _, var = _rolling_moments(r, window)
+    return pd.Series(np.sqrt(var * periods), index=returns.index)
+
+
+def rolling_sharpe(returns: pd.Series, window: int, risk_free: float = 0.0, periods: float = 252) -> pd.Series:
+    excess = _excess(_window_input(returns, window), risk_free, periods)
+    mean, var = _rolling_moments(excess, window)
+    std = np.sqrt(var)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(std > 0, mean / std * np.sqrt(periods), np.nan)
+    return pd.Series(out, index=returns.index)
+
+
+def rolling_sortino(returns: pd.Series, window: int, risk_free: float = 0.0, periods: float = 252) -> pd.Series:
+    excess = _excess(_window_input(returns, window), risk_free, periods)
+    mean = _window_sums(excess, window) / window
+    downside = np.sqrt(_window_sums(np.minimum(excess, 0.0) ** 2, window) / window)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(downside > 0, mean / downside * np.sqrt(periods), np.nan)
+    return pd.Series(out, index=returns.index)
+
+
+def rolling_alpha_beta(
+    returns: pd.Series,
+    benchmark_returns: pd.Series,
+    window: int,
+    risk_free: float = 0.0,
+    periods: float = 252,
+) -> pd.DataFrame:
+    """Trailing-window annualized alpha and beta; both series must share an index."""
+    r = _excess(_window_input(returns, window), risk_free, periods)
+    b = _excess(benchmark_returns, risk_free, periods)
+    dr, db = r - r.mean(), b - b.mean()
+    sr, sb = _window_sums(dr, window), _window_sums(db, window)
+    cov = _window_sums(dr * db, window) - sr * sb / window
+    var = _window_sums(db * db, window) - sb * sb / window
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = np.where(var > 0, cov / var, np.nan)
+    mean_r = sr / window + r.mean()
+    mean_b = sb / window + b.mean()
+    alpha = (mean_r - beta * mean_b) * periods
+    return pd.DataFrame({"alpha": alpha, "beta": beta}, index=returns.index)
+
+
+def _window_max(v: np.ndarray, window: int) -> np.ndarray:
+    """
+    Maximum of each trailing window (shorter at the start), ignoring NaN.
+    Van Herk/Gil-Werman: the series is cut into blocks of `window`; any
+    window spans the suffix of one block and the prefix of the next, so two
+    running maxima give every window in O(n).
+    """
+    n = len(v)
+    blocks = -(-(n + window - 1) // window)
+    padded = np.full(blocks * window, -np.inf)
+    padded[window - 1:window - 1 + n] = v
+    padded = padded.reshape(blocks, window)
+    prefix = np.fmax.accumulate(padded, axis=1).ravel()
+    suffix = np.fmax.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.fmax(suffix[:n], prefix[window - 1:window - 1 + n])
+
+
+def rolling_drawdown(values: pd.Series, window: int) -> pd.Series:
+    """Distance below the highest value of the trailing window."""
+    if window < 1:
+        raise ValueError("Rolling window must be at least 1 period.")
+    v = np.asarray(values, dtype="float64")
+    return pd.Series(v / _window_max(v, window) - 1.0, index=values.index)
+
+
+def rolling_return(values: pd.Series, window: int) -> pd.Series:
+    """Total return over each trailing window of `window` periods."""
+    if window < 1:
+        raise ValueError("Rolling window must be at least 1 period.")
+    v = np.asarray(values, dtype="float64")
+    out = np.full(len(v), np.nan)
+    out[window:] = v[window:] / v[:-window] - 1.0
+    return pd.Series(out, index=values.index)
+
+
+# ========== Test ==========
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2020-01-01", periods=1000, freq="B")
+    bench = pd.Series(100 * np.cumprod(1 + rng.normal(0.0003, 0.01, len(index))), index=index)
+    port = pd.Series(100 * np.cumprod(1 + rng.normal(0.0005, 0.012, len(index))), index=index)
+    print(risk_report(port, bench, "1d", risk_free=0.02))
+    print(rolling_volatility(to_returns(port), 63).tail())
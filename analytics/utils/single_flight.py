@@ -0,0 +1,97 @@
+# ======================================================================
+# single_flight.py
+# Duplicate call suppression: one in-flight fetch per key, in process
+# (threads) and optionally across processes (file lock)
+# ======================================================================
+
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Optional
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows: the file lock becomes a no-op
+    fcntl = None
+
+
+# ======================================================================
+# IN-PROCESS
+# ======================================================================
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Concurrent `do(key, func, *args)` calls for the same key share one run of
+    `func`: the first caller runs it, the others wait and get its result (or
+    its exception). Nothing is cached once the call has finished.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._stats = {"calls": 0, "shared": 0}
+
+    def do(self, key: Hashable, func: Callable, *args) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["calls"] += 1
+            else:
+                self._stats["shared"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        """Calls actually run vs. callers that joined one already in flight."""
+        with self._lock:
+            return dict(self._stats)
+
+
+# ======================================================================
+# CROSS-PROCESS
+# ======================================================================
+class FileLock:
+    """Exclusive advisory lock (flock) on a file, shared by every process on the box."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fd: Optional[int] = None
+
+    def __enter__(self) -> "FileLock":
+        if fcntl is None:
+            return self
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,128 @@
+# ======================================================================
+# symbol_index.py
+# Persistent ticker -> exchange / quoteType / currency metadata index
+# ======================================================================
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .config import CACHE_DIR, setting
+
+# How long a ticker that failed validation is remembered as invalid. Kept
+# short because an upstream outage also looks like an unknown symbol.
+NEGATIVE_TTL = setting("SYMBOL_NEGATIVE_TTL_SECONDS", 6 * 3600)
+
+
+# ======================================================================
+# INDEX
+# ======================================================================
+class SymbolIndex:
+    """
+    Small SQLite-backed metadata store, mirrored in memory.
+    Lets quote lookups resolve a ticker's exchange without a network call,
+    and remembers tickers that failed validation (negative cache).
+    """
+
+    def __init__(self, path: Path, negative_ttl: float = NEGATIVE_TTL):
+        self.path = Path(path)
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._memory: Optional[Dict[str, Dict[str, Any]]] = None
+        self._invalid: Dict[str, float] = {}  # ticker -> time it was found invalid
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS symbols ("
+            "ticker TEXT PRIMARY KEY, exchange TEXT, quote_type TEXT, "
+            "currency TEXT, updated REAL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS invalid_symbols (ticker TEXT PRIMARY KEY, checked REAL)")
+        return conn
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Load the whole index into memory once per process."""
+        if self._memory is None:
+            with self._lock:
+                if self._memory is None:
+                    conn = self._connect()
+                    try:
+                        rows = conn.execute(
+                            "SELECT ticker, exchange, quote_type, currency, updated FROM symbols"
+                        ).fetchall()
+                        self._invalid = dict(conn.execute(
+                            "SELECT ticker, checked FROM invalid_symbols WHERE checked > ?",
+                            (time.time() - self.negative_ttl,),
+                        ).fetchall())
+                    finally:
+                        conn.close()
+                    self._memory = {
+                        r[0]: {"exchange": r[1], "quote_type": r[2], "currency": r[3], "updated": r[4]}
+                        for r in rows
+                    }
+        return self._memory
+
+    def get(self, ticker: str) -> Optional[Dict[str, Any]]:
+        """Return stored metadata for `ticker`, or None if never seen."""
+        return self._load().get(ticker)
+
+    def validity(self, ticker: str) -> Optional[bool]:
+        """True for a known equity, False for a known non-equity or recent failure, None if unknown."""
+        meta = self.get(ticker)
+        if meta is not None:
+            return meta["quote_type"] == "EQUITY"
+        checked = self._invalid.get(ticker)
+        if checked is not None and time.time() - checked < self.negative_ttl:
+            return False
+        return None
+
+    def put_many(self, infos: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
+        """Record metadata from yFinance info dicts; empty infos are skipped."""
+        now = time.time()
+        rows = [
+            (ticker, info.get("exchange"), info.get("quoteType"), info.get("currency"), now)
+            for ticker, info in infos if info and info.get("quoteType")
+        ]
+        if not rows:
+            return
+        memory = self._load()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO symbols VALUES (?, ?, ?, ?, ?)", rows)
+                conn.executemany("DELETE FROM invalid_symbols WHERE ticker = ?", [(r[0],) for r in rows])
+        finally:
+            conn.close()
+        with self._lock:
+            for ticker, exchange, quote_type, currency, updated in rows:
+                memory[ticker] = {
+                    "exchange": exchange, "quote_type": quote_type,
+                    "currency": currency, "updated": updated,
+                }
+                self._invalid.pop(ticker, None)
+
+    def put_invalid_many(self, tickers: Iterable[str]) -> None:
+        """Remember tickers that returned no usable metadata, for NEGATIVE_TTL."""
+        now = time.time()
+        rows = [(ticker, now) for ticker in tickers]
+        if not rows:
+            return
+        self._load()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO invalid_symbols VALUES (?, ?)", rows)
+        finally:
+            conn.close()
+        with self._lock:
+            self._invalid.update(rows)
+
+    def put(self, ticker: str, info: Dict[str, Any]) -> None:
+        self.put_many([(ticker, info)])
+
+
+SYMBOLS = SymbolIndex(CACHE_DIR / "symbols.sqlite3")
@@ -0,0 +1,227 @@
+# ======================================================================
+# upstream.py
+# Guarded calls to the market data provider: token-bucket rate limit,
+# bounded retries with jittered backoff, and a circuit breaker
+# ======================================================================
+
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from .config import setting
+from .market_data import PERMANENT_ERRORS
+
+
+class UpstreamError(Exception):
+    """The provider could not answer: retries exhausted, circuit open or rate limit exceeded."""
+
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+
+class RateLimitedError(UpstreamError):
+    pass
+
+
+# ======================================================================
+# TOKEN BUCKET
+# ======================================================================
+class TokenBucket:
+    """Allows `rate` calls per second on average, in bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait: float) -> Optional[float]:
+        """
+        Take a token and return how long the caller must wait before using it,
+        or None (taking nothing) if that would be longer than `max_wait`.
+        Tokens may be reserved ahead, so waiting callers are served in order.
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+
+# ======================================================================
+# CIRCUIT BREAKER
+# ======================================================================
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed calls and rejects calls for
+    `reset_timeout` seconds. Then a single trial call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float, clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self._retry_at: Optional[float] = None  # when an open circuit lets a trial call through
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._retry_at is None:
+            return "closed"
+        return "half-open" if self.clock() >= self._retry_at else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._retry_at is None:
+                return True
+            if self._trial or self.clock() < self._retry_at:
+                return False
+            self._trial = True
+            return True
+
+    def release(self) -> None:
+        """Give back an allowed call that never reached the provider."""
+        with self._lock:
+            self._trial = False
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._retry_at = None
+            self._trial = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.threshold:
+                # Compared as absolute times: `now - opened >= timeout` can miss by a float ulp
+                self._retry_at = self.clock() + self.reset_timeout
+
+
+# ======================================================================
+# CLIENT
+# ======================================================================
+class UpstreamClient:
+    """
+    Runs provider calls through a shared rate limit, retries failures with
+    full-jitter exponential backoff, and stops calling a provider that keeps
+    failing. Exceptions in `permanent` mean the provider answered ("no such
+    ticker") and are re-raised as is, without retrying or tripping the breaker.
+    Callers decide what to serve instead (usually stale cached data) when an
+    UpstreamError is raised, and report it with `count("served_stale")`.
+    """
+
+    COUNTERS = ("calls", "retries", "throttled", "shed", "failures", "rejected", "served_stale")
+
+    def __init__(
+        self,
+        name: str,
+        rate: float = 50.0,
+        burst: int = 100,
+        max_wait: float = 10.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        permanent: Tuple[Type[BaseException], ...] = (),
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst, clock)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, clock)
+        self.max_wait = max_wait
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.permanent = permanent
+        self.sleep = sleep
+        self._stats_lock = threading.Lock()
+        self._stats = dict.fromkeys(self.COUNTERS, 0)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[name] += n
+
+    def metrics(self) -> Dict[str, Any]:
+        """Counters for this process plus the circuit state."""
+        with self._stats_lock:
+            return {**self._stats, "circuit": self.breaker.state}
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        if not self.breaker.allow():
+            self.count("rejected")
+            raise CircuitOpenError(f"{self.name} circuit open, not calling the provider")
+
+        error: Optional[BaseException] = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.count("retries")
+                self.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1))))
+
+            wait = self.bucket.acquire(self.max_wait)
+            if wait is None:
+                if error is not None:
+                    break  # no budget left to retry: report the provider failure
+                self.breaker.release()
+                self.count("shed")
+                raise RateLimitedError(f"{self.name} rate limit: no call slot within {self.max_wait}s")
+            if wait:
+                self.count("throttled")
+                self.sleep(wait)
+
+            try:
+                result = func(*args, **kwargs)
+            except self.permanent:
+                self.breaker.success()
+                self.count("calls")
+                raise
+            except Exception as e:
+                error = e
+                continue
+            self.breaker.success()
+            self.count("calls")
+            return result
+
+        self.breaker.failure()
+        self.count("failures")
+        raise UpstreamError(f"{self.name} failed after {attempt + 1} attempts: {error}") from error
+
+
+def build_client(name: str = "market data") -> UpstreamClient:
+    """
+    Client from the MARKET_DATA_UPSTREAM setting, e.g.
+    {"RATE": 50, "BURST": 100, "MAX_WAIT_SECONDS": 10, "RETRIES": 2,
+     "BACKOFF_SECONDS": 0.5, "MAX_BACKOFF_SECONDS": 8,
+     "FAILURE_THRESHOLD": 5, "RESET_SECONDS": 30}.
+    """
+    config = setting("MARKET_DATA_UPSTREAM", {})
+    return UpstreamClient(
+        name,
+        rate=config.get("RATE", 50.0),
+        burst=config.get("BURST", 100),
+        max_wait=config.get("MAX_WAIT_SECONDS", 10.0),
+        retries=config.get("RETRIES", 2),
+        backoff=config.get("BACKOFF_SECONDS", 0.5),
+        max_backoff=config.get("MAX_BACKOFF_SECONDS", 8.0),
+        failure_threshold=config.get("FAILURE_THRESHOLD", 5),
+        reset_timeout=config.get("RESET_SECONDS", 30.0),
+        permanent=PERMANENT_ERRORS,
+    )
+
+
+# One client per process, shared by every market data provider call
+UPSTREAM = build_client()
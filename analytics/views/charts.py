@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import json
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import condition
+
+from ..models import Portfolio
+from ..utils.chart_renderer import FORMATS, spec_key, submit_render
+from ..utils.config import setting
+from ..utils.history_store import HISTORY
+from ..utils.portfolio_visualization import DOWNSAMPLE_METHODS, portfolio_chart_data, stocks_chart_data
+from ..utils.price_matrix import FREQUENCIES, build_price_matrix
+from ..utils.quote_cache import LRUCache
+
+# Serialized payloads keyed by their ETag, which already encodes the data version
+PAYLOADS = LRUCache(max_entries=setting("CHART_CACHE_ENTRIES", 256), ttl=setting("CHART_CACHE_SECONDS", 3600))
+KINDS = ("stocks", "portfolio")
+MAX_POINTS = 10_000
+IMAGE_SIZE = (1000, 500)  # default width, height in pixels
+
+## ============================================================
+## CHART DATA
+## ============================================================
+
+def _chart_params(request):
+    """Validated query parameters; raises ValueError with a message for the client."""
+    try:
+        end = date.fromisoformat(request.GET.get("end") or date.today().isoformat())
+        start = date.fromisoformat(request.GET["start"]) if request.GET.get("start") else end - timedelta(days=365)
+    except ValueError:
+        raise ValueError("start and end must be dates in YYYY-MM-DD format")
+    if start >= end:
+        raise ValueError("start must be before end")
+
+    params = {
+        "kind": request.GET.get("kind", "portfolio"),
+        "index": request.GET.get("index", "^GSPC"),
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "freq": request.GET.get("freq", "1d"),
+        "points": request.GET.get("points"),
+        "method": request.GET.get("method", "lttb"),
+    }
+    for name, allowed in (("kind", KINDS), ("freq", FREQUENCIES), ("method", DOWNSAMPLE_METHODS)):
+        if params[name] not in allowed:
+            raise ValueError(f"{name} must be one of {list(allowed)}")
+    if params["points"] is not None and not params["points"].isdigit():
+        raise ValueError("points must be a positive integer")
+    params["points"] = min(int(params["points"]), MAX_POINTS) if params["points"] else None
+    return params
+
+
+def _chart_key(strategy_id, params, portfolio):
+    """
+    ETag for one chart: request parameters plus the data version, i.e. the
+    strategy's holdings and when the history store last rewrote each series.
+    """
+    tickers = sorted(portfolio) + ([params["index"]] if params["kind"] == "portfolio" else [])
+    version = {
+        "strategy": strategy_id,
+        "params": params,
+        "holdings": sorted(portfolio.items()),
+        "history": HISTORY.version(tickers, params["freq"]),
+    }
+    return hashlib.sha1(json.dumps(version, sort_keys=True).encode()).hexdigest()
+
+
+def _load_portfolio(user_id, strategy_id):
+    """{ticker: shares} for one of the user's strategies, or None if it has no holdings."""
+    holdings = Portfolio.objects.filter(
+        strategy_id=strategy_id,
+        strategy__user_id=user_id
+    ).values_list("ticker", "shares")
+    return {ticker: float(shares) for ticker, shares in holdings} or None
+
+
+def _chart_etag(request, strategy_id):
+    try:
+        params = _chart_params(request)
+    except ValueError:
+        return None
+    portfolio = _load_portfolio(request.user.id, strategy_id)
+    if portfolio is None:
+        return None
+    return _chart_key(strategy_id, params, portfolio)
+
+
+def _chart_body(strategy_id, params, portfolio):
+    """(ETag, serialized payload), built once per data version."""
+    key = _chart_key(strategy_id, params, portfolio)
+    body = PAYLOADS.get(key)
+    if body is None:
+        if params["kind"] == "stocks":
+            matrix = build_price_matrix(portfolio, params["start"], params["end"], params["freq"])
+            payload = stocks_chart_data(matrix, portfolio, params["points"], params["method"])
+        else:
+            tickers = [params["index"], *portfolio]
+            matrix = build_price_matrix(tickers, params["start"], params["end"], params["freq"])
+            payload = portfolio_chart_data(matrix, portfolio, params["index"], params["points"], params["method"])
+
+        # Building may have filled the history store, which moves the version on
+        key = _chart_key(strategy_id, params, portfolio)
+        body = json.dumps(payload, separators=(",", ":")).encode()
+        PAYLOADS.set(key, body)
+    return key, body
+
+
+# api/dashboard/chart/<strategy_id>/?kind=&index=&start=&end=&freq=&points=&method=
+@login_required
+@condition(etag_func=_chart_etag)
+def chart_data(request, strategy_id):
+    """
+    Compact JSON series for the client-side chart. Unchanged charts are
+    answered 304 from the ETag alone; a changed ETag that was already built
+    is served from the payload cache.
+    """
+    try:
+        params = _chart_params(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    portfolio = _load_portfolio(request.user.id, strategy_id)
+    if portfolio is None:
+        return JsonResponse({"error": "Strategy not found"}, status=404)
+
+    try:
+        key, body = _chart_body(strategy_id, params, portfolio)
+    except (ValueError, RuntimeError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = f'"{key}"'
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _image_spec(strategy_id, params, portfolio, fmt):
+    _, body = _chart_body(strategy_id, params, portfolio)
+    width = params["points"] or IMAGE_SIZE[0]
+    return {**json.loads(body), "format": fmt, "width": width, "height": IMAGE_SIZE[1]}
+
+
+# api/dashboard/chart/<strategy_id>/image/?format=png|svg&(same as chart_data)
+@login_required
+async def chart_image(request, strategy_id):
+    """
+    The same chart as a PNG or SVG. The image file is content-addressed, so
+    it is rendered once per distinct chart, in the render worker pool, and
+    the request thread only waits on the result.
+    """
+    fmt = request.GET.get("format", "png")
+    try:
+        params = _chart_params(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if fmt not in FORMATS:
+        return JsonResponse({"error": f"format must be one of {list(FORMATS)}"}, status=400)
+    user = await request.auser()
+    portfolio = await sync_to_async(_load_portfolio)(user.id, strategy_id)
+    if portfolio is None:
+        return JsonResponse({"error": "Strategy not found"}, status=404)
+
+    try:
+        spec = await sync_to_async(_image_spec, thread_sensitive=False)(strategy_id, params, portfolio, fmt)
+    except (ValueError, RuntimeError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    etag = f'"{spec_key(spec)}"'
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponse(status=304)
+    else:
+        _, data = await asyncio.wrap_future(submit_render(spec))
+        response = HttpResponse(data, content_type=FORMATS[fmt])
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
@@ -3,5 +3,5 @@ from ..models import Watchlist
 
 # dashboard/
 def dashboard(request):
-    watchlists = Watchlist.objects.filter(user_id=request.user.id)
+    watchlists = Watchlist.objects.filter(user_id=request.user.id).order_by("-last_modified")
     return render(request, "dashboard.html", {"watchlists": watchlists})
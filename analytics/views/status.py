@@ -0,0 +1,15 @@
+from django.http import JsonResponse
+
+from ..utils.quotes_api import CACHE, INFLIGHT
+from ..utils.upstream import UPSTREAM
+
+# api/status/market-data/
+def market_data_status(request):
+    """Counters for this worker process: upstream client, quote cache and coalesced fetches."""
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Forbidden"}, status=403)
+    return JsonResponse({
+        "upstream": UPSTREAM.metrics(),
+        "quote_cache": CACHE.stats(),
+        "inflight": INFLIGHT.stats(),
+    })
@@ -1,9 +1,22 @@
 from datetime import datetime
+import asyncio
+import csv
+import io
 import json
-from django.http import JsonResponse
+import re
+import time
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
 
 from ..models import Watchlist, WatchlistStock, Stock
-from ..utils.quotes_api import check_stock, lookup
+from ..utils.config import setting
+from ..utils.quotes_api import async_lookup, async_lookup_many, check_stock, check_stocks
+
+STREAM_INTERVAL = setting("QUOTE_STREAM_INTERVAL_SECONDS", 15)  # seconds between delta checks
+STREAM_LIFETIME = setting("QUOTE_STREAM_LIFETIME_SECONDS", 600)  # seconds before the client reconnects
+MAX_BULK_TICKERS = 500
+TICKER_PATTERN = re.compile(r"^[A-Z0-9.^=-]{1,10}$")  # fits Stock.ticker
 
 ## ============================================================
 ## WATCHLIST SELECTION/CREATION/DELETION VIEWS
@@ -14,7 +27,7 @@ from django.http import JsonResponse
 
 def watchlist(request):
     if request.method == "GET":
-        watchlists = Watchlist.objects.filter(user=request.user).values_list("id", "name", "last_modified")
+        watchlists = Watchlist.objects.filter(user=request.user).order_by("-last_modified").values_list("id", "name", "last_modified")
 
         # Build a list of properly formatted dicts
         data = []
@@ -31,35 +44,21 @@ def watchlist(request):
 def watchlist_select(request, watchlist_id):
     watchlist_id = int(watchlist_id)
 
-    # Get stocks quotes for selected watchlist
+    # Get stocks for selected watchlist in a single joined query
     watchlist_stocks = WatchlistStock.objects.filter(
         watchlist_id=watchlist_id,
         watchlist__user_id=request.user.id
-    )
-    stocks = []
-    for ws in watchlist_stocks:
-        stock = Stock.objects.filter(id=ws.stock_id, user_id=request.user.id).first()
-        if stock:
-            stocks.append({
-                    "id": stock.id,
-                    "ticker": stock.ticker
-            })
+    ).order_by("id").values_list("stock_id", "stock__ticker")
+    stocks = [{"id": stock_id, "ticker": ticker} for stock_id, ticker in watchlist_stocks]
     return JsonResponse(stocks, safe=False)
 
 # api/dashboard/watchlist/data/<watchlist_id>/
-def watchlist_data(request, watchlist_id):
-
-    watchlist_id = int(watchlist_id)
-    watchlist = Watchlist.objects.filter(
-        id=watchlist_id,
-        user__id=request.user.id
-    )
-    
-    # Get date of last modification and stock tickers
-    modification_date = watchlist.filter(id=watchlist_id).first().last_modified
-    modification_date = modification_date.strftime("%Y-%m-%d %H:%M:%S")
-
-    watchlist_stocks = list(WatchlistStock.objects.filter(watchlist__id=watchlist_id).values_list("stock_id", "stock__ticker"))
+async def watchlist_data(request, watchlist_id):
+    user = await request.auser()
+    rows = await _watchlist_rows(user.id, int(watchlist_id))
+    if rows is None:
+        return JsonResponse({"error": "Watchlist not found"}, status=404)
+    modification_date, watchlist_stocks = rows
 
     if watchlist_stocks == []:
         return JsonResponse({"quotes": [], "meta_data": {"length": 0, "last_modified": modification_date}}, safe=False)
@@ -67,21 +66,116 @@ def watchlist_data(request, watchlist_id):
     # Meta data on watchlist
     meta_data = {"length": len(watchlist_stocks), "last_modified": modification_date}
 
-    # Get stock quotes and ID's
-    quotes = []
-    for ws in watchlist_stocks:
-        quotes.append([ws[0], lookup(ws[1])])
+    # Get stock quotes and ID's (fetched concurrently without blocking the event loop)
+    tickers = [ticker for _, ticker in watchlist_stocks]
+    quotes = [[ws[0], quote] for ws, quote in zip(watchlist_stocks, await async_lookup_many(tickers))]
 
     return JsonResponse({"quotes": quotes, "meta_data": meta_data}, safe=False)
 
 
+# api/dashboard/watchlist/stream/<watchlist_id>/
+async def watchlist_stream(request, watchlist_id):
+    """
+    Server-Sent Events: a `meta` event, then one `quote` event per stock as soon
+    as it resolves, then only quotes that changed on each refresh cycle.
+    Under WSGI (runserver) the events are sent from a plain iterator, since
+    Django would buffer an async one until the stream ends.
+    """
+    user = await request.auser()
+    rows = await _watchlist_rows(user.id, int(watchlist_id))
+    if rows is None:
+        return JsonResponse({"error": "Watchlist not found"}, status=404)
+
+    events = _quote_events(*rows)
+    if not isinstance(request, ASGIRequest):
+        events = _iterate_in_loop(events)
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let a proxy buffer the stream
+    return response
+
+
+async def _watchlist_rows(user_id, watchlist_id):
+    """(last modified, [(stock_id, ticker), ...]) for a user's watchlist, or None if not theirs."""
+    # Get date of last modification (also checks ownership)
+    modification_date = await Watchlist.objects.filter(
+        id=watchlist_id,
+        user_id=user_id
+    ).values_list("last_modified", flat=True).afirst()
+    if modification_date is None:
+        return None
+
+    watchlist_stocks = [
+        ws async for ws in WatchlistStock.objects.filter(watchlist_id=watchlist_id)
+        .order_by("id").values_list("stock_id", "stock__ticker")
+    ]
+    return modification_date.strftime("%Y-%m-%d %H:%M:%S"), watchlist_stocks
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _quote_events(modification_date, watchlist_stocks):
+    yield _sse("meta", {
+        "length": len(watchlist_stocks),
+        "last_modified": modification_date,
+        "stocks": watchlist_stocks,
+    })
+
+    async def resolve(stock_id, ticker):
+        return stock_id, await async_lookup(ticker)
+
+    # First paint: each quote goes out as soon as it resolves
+    sent = {}
+    for next_quote in asyncio.as_completed([resolve(*ws) for ws in watchlist_stocks]):
+        stock_id, quote = await next_quote
+        sent[stock_id] = _quote_state(quote)
+        yield _sse("quote", [stock_id, quote])
+
+    # Then deltas from the shared cache; the browser reconnects once the stream ends
+    tickers = [ticker for _, ticker in watchlist_stocks]
+    deadline = time.monotonic() + STREAM_LIFETIME
+    while time.monotonic() < deadline:
+        await asyncio.sleep(STREAM_INTERVAL)
+        changed = False
+        for (stock_id, _), quote in zip(watchlist_stocks, await async_lookup_many(tickers)):
+            state = _quote_state(quote)
+            if state != sent.get(stock_id):
+                sent[stock_id] = state
+                changed = True
+                yield _sse("quote", [stock_id, quote])
+        if not changed:
+            yield ": keep-alive\n\n"
+
+
+def _iterate_in_loop(events):
+    """Drive an async generator from a WSGI thread on its own event loop, one item at a time."""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(events.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        loop.run_until_complete(events.aclose())
+        loop.close()
+
+
+def _quote_state(quote):
+    """The parts of a quote a client displays (ignores cache bookkeeping)."""
+    return {k: v for k, v in quote.items() if k != "cached"}
+
+
 # api/dashboard/stock/<stock_id>
-def stock_data(request, stock_id):
-    stock = Stock.objects.filter(id=stock_id, user_id=request.user.id).first()
+async def stock_data(request, stock_id):
+    user = await request.auser()
+    stock = await Stock.objects.filter(id=stock_id, user=user.id).afirst()
     if not stock:
         return JsonResponse({"error": "Stock not found"}, status=404)
 
-    quote = lookup(stock.ticker)
+    quote = await async_lookup(stock.ticker)
     return JsonResponse(quote, safe=False)
 
 # api/dashboard/watchlist/rename/<watchlist_id>/
@@ -159,7 +253,10 @@ def watchlist_add_stock(request):
     if not ticker or not watchlist_id:
         return JsonResponse({"error": "Missing ticker or watchlist ID."}, status=400)
 
-    if not check_stock(ticker):
+    valid = check_stock(ticker)
+    if valid is None:
+        return JsonResponse({"error": "Market data provider unavailable, try again shortly."}, status=503)
+    if not valid:
         return JsonResponse({"error": "Invalid stock symbol."}, status=400)
 
     # Get the watchlist
@@ -175,16 +272,13 @@ def watchlist_add_stock(request):
     if watchlist.stocks.filter(id=stock.id).exists():
         return JsonResponse({"error": "Stock already in watchlist."}, status=400)
     
-    # Create WatchlistStock entry
-    addStock = WatchlistStock.objects.create(
+    # Create WatchlistStock entry (this is what adds the stock to the watchlist)
+    WatchlistStock.objects.create(
         watchlist=watchlist,
         stock=stock,
         user=request.user
     )
 
-    # Add stock to the watchlist
-    watchlist.stocks.add(stock)
-
     # Change last modified date
     watchlist.last_modified = datetime.now()
     watchlist.save()
@@ -192,6 +286,73 @@ def watchlist_add_stock(request):
     return JsonResponse({"message": f"{ticker} added successfully.", "loading": f"{ticker} is being added..."}, status=200)
 
 
+# /api/dashboard/watchlist/add/stocks/
+def watchlist_add_stocks(request):
+    """
+    Bulk add from a pasted list or CSV text: {"watchlist_id", "text"} or
+    {"watchlist_id", "tickers": [...]}. Tickers are validated concurrently
+    and all rows are inserted in one transaction.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method"}, status=400)
+
+    data = json.loads(request.body)
+    watchlist_id = data.get("watchlist_id")
+    tickers = data.get("tickers")
+    if tickers is not None and not (isinstance(tickers, list) and all(isinstance(t, str) for t in tickers)):
+        return JsonResponse({"error": "tickers must be a list of strings."}, status=400)
+    if not isinstance(data.get("text", ""), str):
+        return JsonResponse({"error": "text must be a string."}, status=400)
+    tickers = tickers or _parse_tickers(data.get("text", ""))
+    tickers = list(dict.fromkeys(t.strip().upper() for t in tickers))
+    if not tickers or not watchlist_id:
+        return JsonResponse({"error": "Missing tickers or watchlist ID."}, status=400)
+    if len(tickers) > MAX_BULK_TICKERS:
+        return JsonResponse({"error": f"At most {MAX_BULK_TICKERS} tickers per request."}, status=400)
+
+    try:
+        watchlist = Watchlist.objects.get(id=watchlist_id, user=request.user)
+    except Watchlist.DoesNotExist:
+        return JsonResponse({"error": "Watchlist not found."}, status=404)
+
+    well_formed = [t for t in tickers if TICKER_PATTERN.match(t)]
+    validity = check_stocks(well_formed) if well_formed else {}
+    valid = [t for t in well_formed if validity[t]]
+    # Tickers the provider could not be asked about are not invalid, just not checked yet
+    unavailable = [t for t in well_formed if validity[t] is None]
+    invalid = [t for t in tickers if validity.get(t) is False or t not in validity]
+
+    added, present = [], []
+    if valid:
+        with transaction.atomic():
+            Stock.objects.bulk_create([Stock(ticker=t) for t in valid], ignore_conflicts=True)
+            stock_ids = dict(Stock.objects.filter(ticker__in=valid).values_list("ticker", "id"))
+            existing = set(
+                WatchlistStock.objects.filter(watchlist=watchlist, stock_id__in=stock_ids.values())
+                .values_list("stock_id", flat=True)
+            )
+            for t in valid:
+                (present if stock_ids[t] in existing else added).append(t)
+            WatchlistStock.objects.bulk_create([
+                WatchlistStock(watchlist=watchlist, stock_id=stock_ids[t], user=request.user) for t in added
+            ])
+            if added:
+                watchlist.save(update_fields=["last_modified"])
+
+    return JsonResponse(
+        {"added": added, "already_present": present, "invalid": invalid, "unavailable": unavailable}, status=200
+    )
+
+
+def _parse_tickers(text):
+    """Tickers from pasted text or CSV: any cell, split on commas, semicolons or whitespace."""
+    tickers = []
+    for row in csv.reader(io.StringIO(text.replace(";", ","))):
+        for cell in row:
+            tickers.extend(token for token in cell.split() if token.upper() not in ("TICKER", "SYMBOL"))
+    return tickers
+
+
 # /api/dashboard/watchlist/remove/stock/<stock_id>&<watchlist_id>/
 def watchlist_remove_stock(request, stock_id, watchlist_id):
     if request.method == "DELETE":
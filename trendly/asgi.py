@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'trendly.settings')
+# Read by settings: ASGI requests run sync ORM code on per-request threads
+os.environ['TRENDLY_ASGI'] = '1'
 
 application = get_asgi_application()
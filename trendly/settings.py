@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent # Goes from settings.py to trendly/ to project root
@@ -70,6 +71,9 @@ ROOT_URLCONF = 'trendly.urls'
 
 WSGI_APPLICATION = 'trendly.wsgi.application'
 
+# Set by trendly/asgi.py when the project is served over ASGI
+ASGI = os.environ.get('TRENDLY_ASGI') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -78,6 +82,23 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse connections across requests instead of reopening per request (WSGI only: under
+        # ASGI each request's sync ORM work may run on a fresh thread, so persistent per-thread
+        # connections would pile up and never be closed)
+        'CONN_MAX_AGE': 0 if ASGI else 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # WAL lets readers proceed during writes; 64 MB page cache, 256 MB mmap
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA cache_size=-65536;'
+                'PRAGMA mmap_size=268435456;'
+                'PRAGMA temp_store=MEMORY'
+            ),
+            # Take the write lock up front to avoid "database is locked" upgrade failures
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -123,6 +144,72 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# Market data
+# Quotes for an open market are refetched once older than this many seconds
+QUOTE_FRESHNESS_SECONDS = 60
+
+# Upper bound on concurrent upstream quote requests per event loop (async views)
+QUOTE_ASYNC_CONCURRENCY = 32
+
+# Watchlist quote stream (SSE): delta check interval and connection lifetime, in seconds
+QUOTE_STREAM_INTERVAL_SECONDS = 15
+QUOTE_STREAM_LIFETIME_SECONDS = 600
+
+# Also coalesce quote refreshes across worker processes with a per-ticker file lock
+# (needs a QUOTE_CACHE backend backed by a file: "sqlite" or "snapshot")
+QUOTE_CROSS_PROCESS_LOCK = False
+
+# Live FX rates are refreshed in the background once older than this many seconds
+FX_REFRESH_SECONDS = 300
+
+# Tickers that failed validation are rejected without a network call for this many seconds
+SYMBOL_NEGATIVE_TTL_SECONDS = 6 * 3600
+
+# Market data source: "yfinance" (live) or "synthetic" (deterministic random walks, offline;
+# LATENCY_SECONDS + up to JITTER_SECONDS per call, failing with probability ERROR_RATE;
+# quotes and spot FX are those of the fixed date TODAY, 2024-06-28 unless set)
+MARKET_DATA_PROVIDER = {
+    "BACKEND": "yfinance",
+}
+
+# Every market data provider call goes through one client per process: token bucket (RATE calls/s,
+# bursts of BURST, callers wait at most MAX_WAIT_SECONDS for a slot), RETRIES with jittered
+# exponential backoff, and a circuit breaker that stops calling for RESET_SECONDS after
+# FAILURE_THRESHOLD failed calls in a row (stale cached data is served meanwhile).
+# RATE and BURST keep the batch paths (16-32 concurrent lookups) from queueing: a cold
+# 200-ticker watchlist fits in one burst plus two seconds
+MARKET_DATA_UPSTREAM = {
+    "RATE": 50,
+    "BURST": 100,
+    "MAX_WAIT_SECONDS": 10,
+    "RETRIES": 2,
+    "BACKOFF_SECONDS": 0.5,
+    "MAX_BACKOFF_SECONDS": 8,
+    "FAILURE_THRESHOLD": 5,
+    "RESET_SECONDS": 30,
+}
+
+# Quote cache backend: "lru" (per process), "snapshot" (per process, written through
+# to a local file and reloaded after a restart) or "sqlite" (shared by all workers on the box)
+QUOTE_CACHE = {
+    "BACKEND": "snapshot",
+    "MAX_ENTRIES": 5000,
+}
+
+# Start method for worker processes: rebalancing sweeps and chart rendering ("spawn", "forkserver" or "fork")
+SWEEP_START_METHOD = "spawn"
+
+# Chart image rendering pool; each worker is replaced after CHART_RENDERS_PER_WORKER renders
+CHART_RENDER_WORKERS = 2
+CHART_RENDERS_PER_WORKER = 500
+
+# On-disk chart image cache: images unused for MAX_AGE_SECONDS are dropped, and the least
+# recently used beyond MAX_ENTRIES are pruned after every new render
+CHART_IMAGE_CACHE = {
+    "MAX_ENTRIES": 2000,
+    "MAX_AGE_SECONDS": 7 * 86400,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 